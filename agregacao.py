@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+# Dimensões do cubo de contagens. Categoria2Motivo entra inteira (e não só a marca de
+# "desconsiderado") porque a aba de motivos de cancelamento também sai do cubo.
+DIMENSOES_CUBO = ["Operação", "Login", "DataCriacao", "Status", "Categoria2Motivo", "Desconsiderado", "TipoRetido", "Franquia"]
+
+
+# Contagem de linhas por combinação de DIMENSOES_CUBO, montada numa única passada sobre o frame
+# processado. As linhas do cubo ficam na ordem da primeira ocorrência de cada combinação (coluna
+# PrimeiraLinha, posição no frame completo), então agrupamentos com sort=False sobre ele preservam
+# a ordem de empate que o value_counts teria sobre as linhas originais.
+class CuboRetencao:
+    __slots__ = ("contagens", "total_linhas", "_indice_datas")
+
+    def __init__(self, contagens, total_linhas):
+        self.contagens = contagens
+        self.total_linhas = total_linhas
+        self._indice_datas = None
+
+    @property
+    def empty(self):
+        return self.total_linhas == 0
+
+    # Índice das linhas do cubo ordenadas por DataCriacao (montado na primeira consulta por período)
+    def indice_datas(self):
+        if self._indice_datas is None:
+            datas = self.contagens["DataCriacao"].to_numpy()
+            ordem = np.argsort(datas, kind="stable")
+            self._indice_datas = (datas[ordem], ordem)
+        return self._indice_datas
+
+    # Cubo só com as datas entre `inicio` e `fim` (inclusive; None = sem limite). A busca binária no
+    # índice de datas acha a faixa sem varrer o cubo, e as linhas voltam à ordem de primeira ocorrência.
+    def recortar_periodo(self, inicio=None, fim=None):
+        if inicio is None and fim is None:
+            return self
+        datas, ordem = self.indice_datas()
+        de = 0 if inicio is None else np.searchsorted(datas, np.datetime64(inicio, "D"), side="left")
+        ate = len(datas) if fim is None else np.searchsorted(datas, np.datetime64(fim, "D"), side="right")
+        contagens = self.contagens.take(np.sort(ordem[de:ate]))
+        return CuboRetencao(contagens.reset_index(drop=True), int(contagens["Quantidade"].sum()))
+
+
+# `posicoes`: posição de cada linha de `df` no frame completo, quando `df` é um subconjunto dele
+def montar_cubo(df, motivos_desconsiderar, posicoes=None):
+    if posicoes is None:
+        posicoes = np.arange(len(df), dtype=np.int32)
+    df = df.assign(
+        Desconsiderado=df["Categoria2Motivo"].isin(motivos_desconsiderar),
+        PrimeiraLinha=posicoes,
+    )
+    contagens = (
+        df.groupby(DIMENSOES_CUBO, observed=True, sort=False)["PrimeiraLinha"]
+        .agg(Quantidade="size", PrimeiraLinha="min")
+        .reset_index()
+    )
+    return CuboRetencao(contagens, len(df))
+
+
+# Junta cubos de subconjuntos disjuntos de linhas (ex.: um por grupo de operação). As combinações
+# não se repetem entre eles, então basta concatenar e reordenar pela primeira ocorrência.
+def combinar_cubos(cubos):
+    if len(cubos) == 1:
+        return cubos[0]
+    contagens = pd.concat([cubo.contagens for cubo in cubos], ignore_index=True)
+    for coluna in DIMENSOES_CUBO:
+        if isinstance(cubos[0].contagens[coluna].dtype, pd.CategoricalDtype):
+            # Os parciais vêm do mesmo frame e compartilham as categorias; o concat as preserva,
+            # mas garante o dtype caso algum parcial esteja vazio
+            contagens[coluna] = contagens[coluna].astype(cubos[0].contagens[coluna].dtype)
+    contagens = contagens.sort_values("PrimeiraLinha", kind="stable", ignore_index=True)
+    return CuboRetencao(contagens, sum(cubo.total_linhas for cubo in cubos))
+
+
+# Soma ao `cubo` o cubo `novas`, de linhas que vêm depois de todas as dele no frame (mesmas
+# categorias). Uma combinação das linhas novas só pode já existir no cubo numa das datas delas,
+# então só as linhas do cubo nessas datas (achadas pelo índice de datas) são comparadas; as
+# combinações que não existiam vão para o fim, que é a ordem de primeira ocorrência. O resultado é
+# o mesmo de montar o cubo com todas as linhas.
+def acrescentar_ao_cubo(cubo, novas):
+    if novas.empty:
+        return cubo
+    datas, ordem = cubo.indice_datas()
+    datas_novas = np.unique(novas.contagens["DataCriacao"].to_numpy())
+    de = np.searchsorted(datas, datas_novas, side="left")
+    ate = np.searchsorted(datas, datas_novas, side="right")
+    candidatas = np.concatenate([ordem[a:b] for a, b in zip(de, ate)])
+    existentes = cubo.contagens[DIMENSOES_CUBO].take(candidatas).assign(Posicao=candidatas)
+    juntas = novas.contagens.merge(existentes, on=DIMENSOES_CUBO, how="left")
+
+    existe = juntas["Posicao"].notna().to_numpy()
+    quantidade = cubo.contagens["Quantidade"].to_numpy().copy()
+    quantidade[juntas["Posicao"].to_numpy()[existe].astype(np.int64)] += juntas["Quantidade"].to_numpy()[existe]
+    contagens = pd.concat([cubo.contagens.assign(Quantidade=quantidade), novas.contagens[~existe]], ignore_index=True)
+    return CuboRetencao(contagens, cubo.total_linhas + novas.total_linhas)
+
+
+# Aceita tanto o frame processado quanto um cubo já montado
+def como_cubo(dados, motivos_desconsiderar):
+    if isinstance(dados, CuboRetencao):
+        return dados
+    return montar_cubo(dados, motivos_desconsiderar)
@@ -0,0 +1,498 @@
+# Regras de negócio do painel (leitura, classificação e apuração das tabelas), sem depender do
+# Streamlit: usadas pelo app (retencao_app.py) e pela linha de comando (retencao_cli.py)
+import json
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from agregacao import como_cubo
+from armazenamento import ler_alteracoes, ler_base
+from faixas import TabelaFaixas, localizar_em_lote
+from ingestao import COLUNAS_POSICIONAIS, carregar_planilha_normalizada
+from resultados import ConversaoUsuario, Cruzamento, DetalheLogin, DetalheStatus, Distribuicao, ResumoRetencao, SimulacaoFaixas
+
+# --- VALORES DE CONFIGURAÇÃO PADRÃO ---
+DEFAULT_USUARIOS_OFICIAIS = ['DEJESF5', 'EDUARM11', 'LEMESAM', 'MARTIE90', 'CHRISA13', 'SILVAJ49', 'AFONSS1', 'LARAQA', 'ALVESM30', 'VITORJ11']
+DEFAULT_USUARIOS_BACKUP = ['HENRIM12', 'BARBOC20', 'ROBERE16', 'CAROLA12', 'FERNAM40']
+DEFAULT_USUARIOS_STAFF = ['OLIVEA34', 'SSILVA']
+
+DEFAULT_RETENTION_BANDS = [
+    (0.00, 0.55, 27.59),
+    (0.5501, 0.59, 31.58),
+    (0.5901, 0.65, 36.12),
+    (0.6501, 1.00, 41.54)
+]
+# --- FIM DOS VALORES DE CONFIGURAÇÃO PADRÃO ---
+
+# Caminhos relativos para os arquivos dentro do repositório
+CONFIG_FILE = "config.json"
+EXCEL_FILE_PATH = "Retenção - Macro.xlsx"
+
+MOTIVOS_A_DESCONSIDERAR_PADRAO = ["FALECIMENTO DO TITULAR", "AQUISIÇÃO DE BBLEND"]
+
+# Grupos de operação, na ordem alfabética usada nas tabelas por usuário
+GRUPO_PADRAO = "Demais Operações"
+GRUPOS_OPERACAO = ["Backup", "Demais Operações", "Retenção", "Supervisão"]
+
+# Colunas de texto guardadas como categóricas (dicionário de valores + códigos inteiros)
+COLUNAS_CATEGORICAS = ["Login", "Status", "Categoria2Motivo", "TipoRetido", "Franquia"]
+
+# Períodos do seletor de datas, contados a partir da data mais recente dos dados
+PERIODO_TUDO = "Todo o período"
+# Período padrão do painel quando a base tem meses anteriores à planilha principal (ver periodo_planilha)
+PERIODO_PLANILHA = "Planilha atual"
+PERIODO_PERSONALIZADO = "Personalizado"
+PERIODOS_PREDEFINIDOS = [PERIODO_TUDO, "Esta semana", "Este mês", "Últimos 7 dias", "Últimos 30 dias", PERIODO_PERSONALIZADO]
+
+# Categorias exibidas e exportadas nas distribuições (motivos, tipos de retido, franquias); as
+# demais vão para "Outros". 0 ou None = todas
+TOP_K_PADRAO = 15
+# Dimensões disponíveis no cruzamento de distribuições (rótulo -> coluna do cubo)
+DIMENSOES_CRUZAMENTO = {
+    "Motivo": "Categoria2Motivo",
+    "Franquia": "Franquia",
+    "Tipo de Retido": "TipoRetido",
+    "Login": "Login",
+    "Operação": "Operação",
+}
+
+# Configuração salva (usuários de cada grupo e faixas de conversão); arquivo ausente = valores padrão.
+# Um arquivo corrompido gera json.JSONDecodeError, para quem chama decidir como avisar.
+def ler_config(config_file=CONFIG_FILE):
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config_data = json.load(f)
+    except FileNotFoundError:
+        return config_padrao()
+    usuarios_oficiais = config_data.get('usuarios_oficiais', DEFAULT_USUARIOS_OFICIAIS)
+    usuarios_backup = config_data.get('usuarios_backup', DEFAULT_USUARIOS_BACKUP)
+    usuarios_staff = config_data.get('usuarios_staff', DEFAULT_USUARIOS_STAFF)
+    loaded_bands = config_data.get('retention_bands', DEFAULT_RETENTION_BANDS)
+    retention_bands = [(float(b[0]), float(b[1]), float(b[2])) for b in loaded_bands]
+    return usuarios_oficiais, usuarios_backup, usuarios_staff, retention_bands
+
+def config_padrao():
+    return list(DEFAULT_USUARIOS_OFICIAIS), list(DEFAULT_USUARIOS_BACKUP), \
+           list(DEFAULT_USUARIOS_STAFF), [list(band) for band in DEFAULT_RETENTION_BANDS]
+
+def gravar_config(usuarios_oficiais, usuarios_backup, usuarios_staff, retention_bands, config_file=CONFIG_FILE):
+    serializable_retention_bands = [list(band) for band in retention_bands]
+    config_data = {
+        'usuarios_oficiais': usuarios_oficiais,
+        'usuarios_backup': usuarios_backup,
+        'usuarios_staff': usuarios_staff,
+        'retention_bands': serializable_retention_bands
+    }
+    with open(config_file, 'w', encoding='utf-8') as f:
+        json.dump(config_data, f, indent=4)
+
+# Data processing functions (minimal changes needed)
+# Renomeia as colunas posicionais de uma planilha lida inteira (pd.read_excel) e limpa os valores
+def normalizar_dados(df):
+    df.columns = df.columns.str.strip()
+    df = df.rename(columns={df.columns[posicao]: nome for posicao, nome in COLUNAS_POSICIONAIS.items()})
+    return limpar_dados(df)
+
+def _texto_num_os(valor):
+    if isinstance(valor, str):
+        return valor.strip() or None
+    if pd.isna(valor):
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+# Número da OS como texto, igual venha a célula como número ou como texto: um bloco com alguma
+# célula vazia chega como float (8005000001.0), e sem isso a mesma OS teria duas chaves na base.
+# Células vazias ficam None (ver armazenamento._chaves_registro).
+def texto_num_os(serie):
+    return serie.astype(object).map(_texto_num_os)
+
+# Limpa as colunas já nomeadas; não depende da configuração de usuários, por isso o resultado
+# pode ser guardado no cache persistente (ver ingestao.py).
+# Textos viram categóricas e DataCriacao vira datetime64 truncado no dia.
+def limpar_dados(df):
+    df["Login"] = df["Login"].astype(str).str.strip().str.upper()
+    df["DataCriacao"] = pd.to_datetime(df["DataCriacao"], errors='coerce').dt.normalize()
+    df = df.dropna(subset=["DataCriacao"])
+
+    if "Categoria2Motivo" not in df.columns:
+        df["Categoria2Motivo"] = ""
+    else:
+        df["Categoria2Motivo"] = df["Categoria2Motivo"].astype(str).str.strip().str.upper()
+
+    if "TipoRetido" not in df.columns:
+        df["TipoRetido"] = ""
+    else:
+        df["TipoRetido"] = df["TipoRetido"].astype(str).str.strip()
+
+    if "Franquia" not in df.columns:
+        df["Franquia"] = ""
+    else:
+        df["Franquia"] = df["Franquia"].astype(str).str.strip().str.upper()
+
+    colunas = ["Login", "Status", "DataCriacao", "Categoria2Motivo", "TipoRetido", "Franquia"]
+    # Número da OS, presente só quando a planilha é lida para a base local (ver armazenamento.py)
+    if "NumOS" in df.columns:
+        df["NumOS"] = texto_num_os(df["NumOS"])
+        colunas.append("NumOS")
+
+    df = df[colunas].copy()
+    for coluna in COLUNAS_CATEGORICAS:
+        df[coluna] = df[coluna].astype("category")
+    return df
+
+# Mapa login -> grupo; um login listado em mais de um grupo fica com o de maior prioridade
+# (Oficiais, depois Backup, depois Staff), como na classificação linha a linha original
+def montar_tabela_grupos(usuarios_oficiais, usuarios_backup, usuarios_staff):
+    tabela = {}
+    for grupo, usuarios in (("Supervisão", usuarios_staff), ("Backup", usuarios_backup), ("Retenção", usuarios_oficiais)):
+        for login in usuarios:
+            tabela[login] = grupo
+    return tabela
+
+# Código (em GRUPOS_OPERACAO) do grupo de cada login distinto
+def classificar_logins(logins, usuarios_oficiais, usuarios_backup, usuarios_staff):
+    tabela = montar_tabela_grupos(usuarios_oficiais, usuarios_backup, usuarios_staff)
+    grupo_por_login = pd.Series(logins).map(tabela).fillna(GRUPO_PADRAO)
+    return pd.Categorical(grupo_por_login, categories=GRUPOS_OPERACAO).codes
+
+# Classifica cada login distinto uma única vez e espalha o resultado pelos códigos da categórica
+def classificar_operacoes(df, usuarios_oficiais, usuarios_backup, usuarios_staff):
+    logins = df["Login"].astype("category")
+    codigo_por_login = classificar_logins(logins.cat.categories, usuarios_oficiais, usuarios_backup, usuarios_staff)
+
+    df = df.copy()
+    df["Operação"] = pd.Categorical.from_codes(codigo_por_login[logins.cat.codes.to_numpy()], categories=GRUPOS_OPERACAO)
+    return df
+
+def process_data(df, usuarios_oficiais, usuarios_backup, usuarios_staff):
+    return classificar_operacoes(normalizar_dados(df), usuarios_oficiais, usuarios_backup, usuarios_staff)
+
+# Carrega a planilha usando o sidecar em cache quando o arquivo não mudou e aplica os grupos atuais
+def carregar_dados(file_path, usuarios_oficiais, usuarios_backup, usuarios_staff):
+    df_normalizado = carregar_planilha_normalizada(file_path, limpar_dados)
+    return classificar_operacoes(df_normalizado, usuarios_oficiais, usuarios_backup, usuarios_staff)
+
+# Mesmo resultado de carregar_dados, lido da base local acumulada (ver armazenamento.py)
+def carregar_dados_base(db_path, usuarios_oficiais, usuarios_backup, usuarios_staff):
+    return classificar_operacoes(ler_base(db_path), usuarios_oficiais, usuarios_backup, usuarios_staff)
+
+# Só as linhas da base novas ou alteradas desde a versão `fingerprint`, já com os grupos
+# (ver armazenamento.ler_alteracoes e DatasetCompartilhado.acrescentar); None = reler tudo
+def carregar_alteracoes_base(db_path, fingerprint, usuarios_oficiais, usuarios_backup, usuarios_staff):
+    alteracoes = ler_alteracoes(fingerprint, db_path)
+    if alteracoes is None:
+        return None
+    posicoes, df, total = alteracoes
+    return posicoes, classificar_operacoes(df, usuarios_oficiais, usuarios_backup, usuarios_staff), total
+
+# Período da planilha principal: da primeira data dela em diante. A base local acumula todas as
+# exportações já importadas, e sem esse recorte os meses anteriores continuariam nos indicadores.
+# (None, None) quando a base não tem nada antes dessa data (ou ela é desconhecida).
+def periodo_planilha(inicio_planilha, data_inicial):
+    if inicio_planilha is None or data_inicial is None or inicio_planilha <= data_inicial:
+        return None, None
+    return inicio_planilha, None
+
+# Intervalo (inicio, fim) de um período predefinido; None nas pontas significa sem limite
+def intervalo_periodo(periodo, referencia):
+    if periodo == "Esta semana":
+        return referencia - timedelta(days=referencia.weekday()), referencia
+    if periodo == "Este mês":
+        return referencia.replace(day=1), referencia
+    if periodo == "Últimos 7 dias":
+        return referencia - timedelta(days=6), referencia
+    if periodo == "Últimos 30 dias":
+        return referencia - timedelta(days=29), referencia
+    return None, None
+
+# Soma as quantidades do cubo por uma dimensão e ordena de forma decrescente; a ordenação é estável,
+# então empates ficam na ordem em que o valor apareceu primeiro na planilha
+def _contar_valores(contagens, coluna):
+    soma = contagens.groupby(coluna, observed=True, sort=False)["Quantidade"].sum()
+    return soma.sort_values(ascending=False, kind="stable")
+
+# Valor por intenção e nome da faixa de uma taxa (percentual); ver faixas.TabelaFaixas
+def _get_value_for_conversion_rate(conversion_rate, retention_bands):
+    valores, nomes = TabelaFaixas(retention_bands).localizar([conversion_rate])
+    return valores[0], nomes[0]
+
+# As funções apurar_* aceitam o frame filtrado ou o cubo de contagens (agregacao.montar_cubo) e
+# devolvem os objetos numéricos de resultados.py; com o cubo, cada tabela é só um reagrupamento dele.
+# As funções calcular_* mantêm o formato antigo (tabelas já formatadas para exibição).
+def apurar_resumo_retencao(df_filtrado, retention_bands):
+    cubo = como_cubo(df_filtrado, MOTIVOS_A_DESCONSIDERAR_PADRAO).contagens
+    all_dates = sorted(cubo["DataCriacao"].unique())
+    indice_datas = pd.Index(all_dates)
+
+    agrupado_por_data_status = cubo.groupby(["DataCriacao", "Status"], observed=True)["Quantidade"].sum().unstack(fill_value=0)
+
+    def contagem_diaria(status):
+        if status not in agrupado_por_data_status.columns:
+            return pd.Series(0, index=indice_datas)
+        return agrupado_por_data_status[status].reindex(indice_datas, fill_value=0)
+
+    retido_diario = contagem_diaria("Retido")
+    nao_retido_diario = contagem_diaria("Não Retido")
+
+    df_nao_retido_excluir = cubo[(cubo["Status"] == "Não Retido") & cubo["Desconsiderado"]]
+    nao_retido_a_desconsiderar_diario = df_nao_retido_excluir.groupby("DataCriacao")["Quantidade"].sum().reindex(indice_datas, fill_value=0)
+
+    return resumo_de_contagens(all_dates, retido_diario, nao_retido_diario, nao_retido_a_desconsiderar_diario, retention_bands)
+
+# Resumo a partir das contagens diárias (séries indexadas pelas datas), venham elas do cubo ou das
+# visões materializadas por combinação de grupos (visoes.VisoesGrupos)
+def resumo_de_contagens(all_dates, retido_diario, nao_retido_diario, nao_retido_a_desconsiderar_diario, retention_bands):
+    # Dias sem intenção de cancelamento ficam com 0% de conversão
+    denominador_conversao_diario = retido_diario + nao_retido_diario
+    conversao_ecohouse_diaria = ((retido_diario / denominador_conversao_diario.where(denominador_conversao_diario > 0)) * 100).fillna(0.0)
+
+    nao_retido_ajustado_diario = (nao_retido_diario - nao_retido_a_desconsiderar_diario).clip(lower=0)
+    denominador_faturamento_diario = retido_diario + nao_retido_ajustado_diario
+    faturamento_percent_diario = ((retido_diario / denominador_faturamento_diario.where(denominador_faturamento_diario > 0)) * 100).fillna(0.0)
+
+    total_retido_geral_abs = retido_diario.sum()
+    total_nao_retido_geral_abs = nao_retido_diario.sum()
+
+    denominador_conversao_geral = total_retido_geral_abs + total_nao_retido_geral_abs
+    if denominador_conversao_geral > 0:
+        percent_conversao_geral_sum = (total_retido_geral_abs / denominador_conversao_geral) * 100
+    else:
+        percent_conversao_geral_sum = 0.00
+
+    total_nao_retido_geral_ajustado = max(0, total_nao_retido_geral_abs - nao_retido_a_desconsiderar_diario.sum())
+    denominador_faturamento_geral = total_retido_geral_abs + total_nao_retido_geral_ajustado
+    if denominador_faturamento_geral > 0:
+        consolidado_faturamento_percent = (total_retido_geral_abs / denominador_faturamento_geral) * 100
+    else:
+        consolidado_faturamento_percent = 0.00
+
+    consolidated_value_per_intent, consolidated_band_name = _get_value_for_conversion_rate(consolidado_faturamento_percent, retention_bands)
+    total_intencoes_cancelamento_ajustado_geral = max(0, (denominador_conversao_diario - nao_retido_a_desconsiderar_diario).sum())
+    final_total_payment_consolidado = total_intencoes_cancelamento_ajustado_geral * consolidated_value_per_intent
+
+    return ResumoRetencao(
+        all_dates, retido_diario, nao_retido_diario, nao_retido_a_desconsiderar_diario,
+        conversao_ecohouse_diaria, faturamento_percent_diario,
+        percent_conversao_geral_sum, consolidado_faturamento_percent,
+        consolidated_value_per_intent, consolidated_band_name, final_total_payment_consolidado,
+    )
+
+# Resumo de uma seleção de grupos e período a partir das visões materializadas do dataset
+# (visoes.VisoesGrupos), sem passar pelo cubo
+def apurar_resumo_grupos(visoes, grupos, retention_bands, periodo=(None, None)):
+    return resumo_de_contagens(*visoes.consultar(grupos, *periodo), retention_bands)
+
+# Resumo de todas as combinações de grupos para uma configuração de faixas, por combinação
+# (frozenset dos grupos): com ele os indicadores de qualquer seleção são uma consulta ao dicionário
+def apurar_resumos_grupos(visoes, retention_bands):
+    return {grupos: apurar_resumo_grupos(visoes, grupos, retention_bands) for grupos in visoes.combinacoes}
+
+def calcular_resumo_retencao(df_filtrado, retention_bands):
+    return apurar_resumo_retencao(df_filtrado, retention_bands).como_tupla()
+
+def apurar_detalhe_por_status(df_filtrado, status_filter):
+    cubo = como_cubo(df_filtrado, MOTIVOS_A_DESCONSIDERAR_PADRAO).contagens
+    df_filtered = cubo[cubo["Status"] == status_filter]
+    all_dates_detalhe = sorted(cubo["DataCriacao"].unique())
+
+    agrupado = df_filtered.groupby(["Operação", "Login", "DataCriacao"], observed=True)["Quantidade"].sum().unstack(fill_value=0)
+    agrupado = agrupado.reindex(columns=all_dates_detalhe, fill_value=0)
+    agrupado.columns.name = None
+    return DetalheStatus(status_filter, all_dates_detalhe, agrupado)
+
+def calcular_detalhe_por_status(df_filtrado, status_filter):
+    return apurar_detalhe_por_status(df_filtrado, status_filter).formatar()
+
+# Monta a matriz usuário x dia inteira de uma vez: retidos e não retidos viram duas tabelas
+# dinâmicas alinhadas e a conversão é a divisão delas (NaN nos dias sem intenção)
+def apurar_conversao_por_usuario(df_filtrado):
+    cubo = como_cubo(df_filtrado, MOTIVOS_A_DESCONSIDERAR_PADRAO).contagens
+    all_dates_conversao = sorted(cubo["DataCriacao"].unique())
+
+    usuarios = pd.MultiIndex.from_frame(
+        cubo[["Operação", "Login"]].drop_duplicates().sort_values(by=["Operação", "Login"]).astype(str)
+    )
+
+    def matriz_status(status):
+        contagens_status = cubo[cubo["Status"] == status]
+        matriz = pd.pivot_table(contagens_status, values="Quantidade", index=["Operação", "Login"],
+                                columns="DataCriacao", aggfunc="sum", fill_value=0, observed=True)
+        matriz.index = matriz.index.set_levels([nivel.astype(str) for nivel in matriz.index.levels])
+        return matriz.reindex(index=usuarios, columns=all_dates_conversao, fill_value=0)
+
+    retido = matriz_status("Retido")
+    nao_retido = matriz_status("Não Retido")
+    denominador = retido + nao_retido
+
+    percentual = (retido / denominador.where(denominador > 0)) * 100
+    retido_total = retido.sum(axis=1)
+    denominador_total = denominador.sum(axis=1)
+    percentual["Consolidado"] = (retido_total / denominador_total.where(denominador_total > 0)) * 100
+    return ConversaoUsuario(all_dates_conversao, retido, nao_retido, percentual)
+
+def calcular_conversao_por_usuario(df_filtrado):
+    return apurar_conversao_por_usuario(df_filtrado).formatar()
+
+# As `top_k` categorias mais frequentes e o que sobra: (contagens do topo, soma e número de
+# categorias da cauda). Sem `top_k` tudo fica no topo.
+def _separar_top_k(contagens, top_k):
+    if not top_k or len(contagens) <= top_k:
+        return contagens, 0, 0
+    cauda = contagens.iloc[top_k:]
+    return contagens.iloc[:top_k], int(cauda.sum()), len(cauda)
+
+# Motor comum das distribuições: contagem de `coluna` nas linhas do cubo que passam em `filtro`,
+# cortada em `top_k` categorias mais "Outros"
+def _apurar_distribuicao(df_filtrado, rotulo, coluna, filtro, mensagem_sem_coluna, mensagem_vazia, top_k):
+    cubo = como_cubo(df_filtrado, MOTIVOS_A_DESCONSIDERAR_PADRAO).contagens
+    if coluna not in cubo.columns:
+        return Distribuicao(rotulo, None, mensagem_sem_coluna)
+
+    selecionadas = cubo[filtro(cubo)]
+    if selecionadas.empty:
+        return Distribuicao(rotulo, None, mensagem_vazia)
+
+    topo, outros, categorias_outros = _separar_top_k(_contar_valores(selecionadas, coluna), top_k)
+    return Distribuicao(rotulo, topo, outros=outros, categorias_outros=categorias_outros)
+
+def apurar_motivos_cancelamento(df_filtrado, top_k=None):
+    return _apurar_distribuicao(
+        df_filtrado, "Motivo", "Categoria2Motivo", lambda cubo: cubo["Status"] == "Não Retido",
+        "Coluna 'Categoria 2' não encontrada.", "Nenhum 'Não Retido' encontrado.", top_k,
+    )
+
+def calcular_motivos_cancelamento(df_filtrado, top_k=None):
+    return apurar_motivos_cancelamento(df_filtrado, top_k).formatar()
+
+def apurar_tipos_retido(df_filtrado, top_k=None):
+    return _apurar_distribuicao(
+        df_filtrado, "Tipo de Retido", "TipoRetido",
+        lambda cubo: (cubo["Status"] == "Retido") & cubo["TipoRetido"].astype(str).str.startswith("Retido"),
+        "Coluna 'Tipo de Retido' não encontrada.", "Nenhum 'Retido' com tipo específico encontrado.", top_k,
+    )
+
+def calcular_tipos_retido(df_filtrado, top_k=None):
+    return apurar_tipos_retido(df_filtrado, top_k).formatar()
+
+def apurar_franquias_nao_retido(df_filtrado, top_k=None):
+    return _apurar_distribuicao(
+        df_filtrado, "Franquia", "Franquia", lambda cubo: cubo["Status"] == "Não Retido",
+        "Coluna 'Franquias' não encontrada.", "Nenhum 'Não Retido' por franquia encontrado.", top_k,
+    )
+
+def calcular_franquias_nao_retido(df_filtrado, top_k=None):
+    return apurar_franquias_nao_retido(df_filtrado, top_k).formatar()
+
+# Cruzamento de duas dimensões (rótulos de DIMENSOES_CRUZAMENTO) nas linhas de um status, lido do
+# cubo de contagens. Cada eixo fica com as `top_k` categorias de maior total e o resto em "Outros".
+def apurar_cruzamento(df_filtrado, linhas, colunas, status="Não Retido", top_k=TOP_K_PADRAO):
+    cubo = como_cubo(df_filtrado, MOTIVOS_A_DESCONSIDERAR_PADRAO).contagens
+    coluna_linhas, coluna_colunas = DIMENSOES_CRUZAMENTO[linhas], DIMENSOES_CRUZAMENTO[colunas]
+    selecionadas = cubo[cubo["Status"] == status] if status else cubo
+    pares = selecionadas.groupby([coluna_linhas, coluna_colunas], observed=True, sort=False)["Quantidade"].sum()
+    if pares.empty:
+        return Cruzamento(linhas, colunas, pd.DataFrame())
+
+    def eixo(nivel):
+        totais = pares.groupby(level=nivel, sort=False).sum().sort_values(ascending=False, kind="stable")
+        topo = totais.index[:top_k] if top_k else totais.index
+        rotulos = pares.index.get_level_values(nivel).astype(str)
+        return rotulos.where(pares.index.get_level_values(nivel).isin(topo), "Outros"), [str(v) for v in topo]
+
+    rotulos_linhas, ordem_linhas = eixo(0)
+    rotulos_colunas, ordem_colunas = eixo(1)
+    matriz = pares.groupby([rotulos_linhas, rotulos_colunas]).sum().unstack(fill_value=0)
+    ordem_linhas += ["Outros"] if "Outros" in matriz.index else []
+    ordem_colunas += ["Outros"] if "Outros" in matriz.columns else []
+    return Cruzamento(linhas, colunas, matriz.reindex(index=ordem_linhas, columns=ordem_colunas, fill_value=0))
+
+# Drill-down de um login a partir dos índices do dataset compartilhado (DatasetCompartilhado):
+# a série diária já vem pronta da carga e o mix de motivos só lê as linhas do login (sem montar
+# cubo, que para poucas linhas custaria mais que a própria contagem)
+def apurar_detalhe_login(dataset, login, periodo=(None, None), top_k=TOP_K_PADRAO):
+    linhas = dataset.linhas_login(login, periodo)
+    nao_retido = linhas.loc[linhas["Status"] == "Não Retido", ["Categoria2Motivo"]].assign(Quantidade=1)
+    if nao_retido.empty:
+        motivos = Distribuicao("Motivo", None, "Nenhum 'Não Retido' encontrado.")
+    else:
+        topo, outros, categorias_outros = _separar_top_k(_contar_valores(nao_retido, "Categoria2Motivo"), top_k)
+        motivos = Distribuicao("Motivo", topo, outros=outros, categorias_outros=categorias_outros)
+    return DetalheLogin(login, dataset.grupo_login(login), dataset.serie_login(login, periodo), motivos)
+
+# Tabelas das abas de análise do painel, na ordem das abas: (nome no cache, se depende do top-k,
+# cálculo sobre o cubo da seleção). O painel e o preaquecimento usam a mesma lista.
+def tabelas_abas(cubo, top_k):
+    return [
+        ("detalhe_nao_retido", False, lambda: apurar_detalhe_por_status(cubo, "Não Retido")),
+        ("detalhe_retido", False, lambda: apurar_detalhe_por_status(cubo, "Retido")),
+        ("conversao_usuario", False, lambda: apurar_conversao_por_usuario(cubo)),
+        ("motivos", True, lambda: apurar_motivos_cancelamento(cubo, top_k)),
+        ("tipos_retido", True, lambda: apurar_tipos_retido(cubo, top_k)),
+        ("franquias", True, lambda: apurar_franquias_nao_retido(cubo, top_k)),
+    ]
+
+# Todas as tabelas da análise completa, na ordem dos argumentos de exportacao.gerar_planilha_analise
+def apurar_analise_completa(df_filtrado, retention_bands, top_k=None):
+    cubo = como_cubo(df_filtrado, MOTIVOS_A_DESCONSIDERAR_PADRAO)
+    return (
+        apurar_resumo_retencao(cubo, retention_bands),
+        apurar_detalhe_por_status(cubo, "Não Retido"),
+        apurar_detalhe_por_status(cubo, "Retido"),
+        apurar_conversao_por_usuario(cubo),
+        apurar_motivos_cancelamento(cubo, top_k),
+        apurar_tipos_retido(cubo, top_k),
+        apurar_franquias_nao_retido(cubo, top_k),
+    )
+
+# Níveis avaliados na simulação de faixas e as dimensões do cubo de cada um
+NIVEIS_SIMULACAO = {
+    "Consolidado": [],
+    "Dia": ["DataCriacao"],
+    "Grupo": ["Operação"],
+    "Login": ["Operação", "Login"],
+}
+
+# Retidos, não retidos e não retidos desconsiderados de cada entidade de um nível
+def _contagens_faturamento(cubo, dimensoes):
+    quantidade = cubo["Quantidade"]
+    colunas = {
+        "Retido": quantidade.where(cubo["Status"] == "Retido", 0),
+        "Não Retido": quantidade.where(cubo["Status"] == "Não Retido", 0),
+        "Desconsiderado": quantidade.where((cubo["Status"] == "Não Retido") & cubo["Desconsiderado"], 0),
+    }
+    contagens = cubo[dimensoes].assign(**colunas)
+    if not dimensoes:
+        return contagens.sum().to_frame().T.assign(Entidade="Total")
+    agrupado = contagens.groupby(dimensoes, observed=True, sort=True).sum().reset_index()
+    entidade = agrupado[dimensoes[-1]]
+    if dimensoes[-1] == "DataCriacao":
+        entidade = entidade.dt.strftime("%d/%m/%Y")
+    return agrupado.assign(Entidade=entidade.astype(str))[["Entidade", "Retido", "Não Retido", "Desconsiderado"]]
+
+# Compara cenários de faixas ({nome: retention_bands}) no consolidado e por dia, grupo e login.
+# As taxas de todas as entidades de todos os níveis vão numa única busca em lote
+# (faixas.localizar_em_lote), então o custo quase não cresce com o número de cenários.
+# A conversão e as intenções seguem o mesmo cálculo do resumo (conversão de faturamento,
+# intenções sem os motivos desconsiderados).
+def apurar_simulacao_faixas(df_filtrado, cenarios):
+    cubo = como_cubo(df_filtrado, MOTIVOS_A_DESCONSIDERAR_PADRAO).contagens
+    entidades = pd.concat(
+        [_contagens_faturamento(cubo, dimensoes).assign(Nível=nivel) for nivel, dimensoes in NIVEIS_SIMULACAO.items()],
+        ignore_index=True,
+    )
+    retido = entidades["Retido"].to_numpy(dtype=float)
+    nao_retido = entidades["Não Retido"].to_numpy(dtype=float)
+    desconsiderado = entidades["Desconsiderado"].to_numpy(dtype=float)
+
+    denominador = retido + np.clip(nao_retido - desconsiderado, 0, None)
+    conversao = np.divide(retido * 100, denominador, out=np.zeros_like(retido), where=denominador > 0)
+    intencoes = np.clip(retido + nao_retido - desconsiderado, 0, None)
+
+    nomes_cenarios = list(cenarios)
+    valores, faixas = localizar_em_lote([TabelaFaixas(cenarios[nome]) for nome in nomes_cenarios], conversao)
+    entidades = entidades.assign(**{"Conversão Faturamento": conversao, "Intenções Ajustadas": intencoes})
+    return SimulacaoFaixas(nomes_cenarios, entidades[["Nível", "Entidade", "Conversão Faturamento", "Intenções Ajustadas"]], valores, faixas)
+
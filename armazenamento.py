@@ -0,0 +1,282 @@
+import contextlib
+import hashlib
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from ingestao import COLUNA_CHAVE_REGISTRO, COLUNAS_POSICIONAIS, fingerprint_arquivo, ler_planilha_projetada
+from instrumentacao import medir_etapa
+
+# Base local (SQLite) com o histórico acumulado das exportações importadas
+BASE_PADRAO = "retencao.sqlite"
+# Pasta opcional para exportações diárias ou parciais, importadas junto com a planilha principal
+PASTA_IMPORTACOES = "importacoes"
+
+COLUNAS_BASE = ["Login", "Status", "DataCriacao", "Categoria2Motivo", "TipoRetido", "Franquia"]
+COLUNAS_CATEGORICAS_BASE = ["Login", "Status", "Categoria2Motivo", "TipoRetido", "Franquia"]
+# Prefixo de fingerprint_base, seguido do número da versão
+PREFIXO_FINGERPRINT = "base-v"
+# Prefixo da chave das linhas sem número da OS
+PREFIXO_SEM_OS = "SEM-OS:"
+
+# Cada registro é identificado pelo número da OS e pela ordem em que aparece na exportação:
+# a mesma OS repetida numa planilha continua contando como linhas distintas (como no painel),
+# mas reimportar a mesma exportação ou uma que se sobrepõe não duplica nada. Linhas sem número
+# da OS usam uma chave derivada do conteúdo (ver _chaves_registro).
+# Versao é a versão da base em que a linha foi gravada ou alterada pela última vez: com ela o
+# painel lê só o que mudou desde a versão que já tem carregada (ver ler_alteracoes).
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS atendimentos (
+    NumOS TEXT NOT NULL,
+    Ocorrencia INTEGER NOT NULL,
+    Login TEXT,
+    Status TEXT,
+    DataCriacao TEXT NOT NULL,
+    Categoria2Motivo TEXT,
+    TipoRetido TEXT,
+    Franquia TEXT,
+    Versao INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (NumOS, Ocorrencia)
+);
+CREATE INDEX IF NOT EXISTS idx_atendimentos_data ON atendimentos (DataCriacao);
+CREATE INDEX IF NOT EXISTS idx_atendimentos_login ON atendimentos (Login);
+CREATE INDEX IF NOT EXISTS idx_atendimentos_status ON atendimentos (Status);
+CREATE TABLE IF NOT EXISTS importacoes (
+    Fingerprint TEXT PRIMARY KEY,
+    Arquivo TEXT NOT NULL,
+    Linhas INTEGER NOT NULL,
+    Alteradas INTEGER NOT NULL,
+    ImportadoEm REAL NOT NULL,
+    DataInicial TEXT,
+    DataFinal TEXT
+);
+CREATE TABLE IF NOT EXISTS metadados (
+    Chave TEXT PRIMARY KEY,
+    Valor TEXT NOT NULL
+);
+"""
+
+# Insere registros novos e atualiza só os que mudaram (o WHERE evita contar reescritas idênticas)
+_UPSERT = """
+INSERT INTO atendimentos (NumOS, Ocorrencia, Login, Status, DataCriacao, Categoria2Motivo, TipoRetido, Franquia, Versao)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (NumOS, Ocorrencia) DO UPDATE SET
+    Login = excluded.Login,
+    Status = excluded.Status,
+    DataCriacao = excluded.DataCriacao,
+    Categoria2Motivo = excluded.Categoria2Motivo,
+    TipoRetido = excluded.TipoRetido,
+    Franquia = excluded.Franquia,
+    Versao = excluded.Versao
+WHERE atendimentos.Login IS NOT excluded.Login
+   OR atendimentos.Status IS NOT excluded.Status
+   OR atendimentos.DataCriacao IS NOT excluded.DataCriacao
+   OR atendimentos.Categoria2Motivo IS NOT excluded.Categoria2Motivo
+   OR atendimentos.TipoRetido IS NOT excluded.TipoRetido
+   OR atendimentos.Franquia IS NOT excluded.Franquia
+"""
+
+# Importações são serializadas dentro do processo; entre processos o SQLite cuida do lock
+_lock_escrita = threading.Lock()
+
+
+@contextlib.contextmanager
+def conectar(db_path=BASE_PADRAO):
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        conn.executescript(_ESQUEMA)
+        _migrar(conn)
+        yield conn
+    finally:
+        conn.close()
+
+
+# Bases criadas antes da coluna Versao: as linhas existentes ficam com a versão 0. Importações
+# registradas antes de DataInicial/DataFinal ficam sem datas e são relidas uma vez (ver
+# importar_planilha).
+def _migrar(conn):
+    colunas = {linha[1] for linha in conn.execute("PRAGMA table_info(atendimentos)")}
+    if "Versao" not in colunas:
+        conn.execute("ALTER TABLE atendimentos ADD COLUMN Versao INTEGER NOT NULL DEFAULT 0")
+    colunas = {linha[1] for linha in conn.execute("PRAGMA table_info(importacoes)")}
+    for coluna in ("DataInicial", "DataFinal"):
+        if coluna not in colunas:
+            conn.execute(f"ALTER TABLE importacoes ADD COLUMN {coluna} TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_atendimentos_versao ON atendimentos (Versao)")
+    conn.commit()
+
+
+def _textos(serie):
+    return serie.astype(object).where(serie.notna(), None).tolist()
+
+
+# Chave de cada linha: o número da OS ou, para linhas sem ele, PREFIXO_SEM_OS mais um hash das
+# colunas gravadas. Reimportar a mesma linha sem OS não a duplica; se ela mudar numa exportação
+# posterior, entra como um registro novo (não há como saber qual linha ela substitui).
+def _chaves_registro(df):
+    chaves = df["NumOS"].astype(object)
+    sem_os = chaves.isna().to_numpy()
+    if sem_os.any():
+        linhas = df.loc[sem_os, COLUNAS_BASE]
+        conteudos = zip(*(
+            linhas[coluna].dt.strftime("%Y-%m-%d").tolist() if coluna == "DataCriacao" else _textos(linhas[coluna])
+            for coluna in COLUNAS_BASE
+        ))
+        chaves = chaves.copy()
+        chaves[sem_os] = [
+            PREFIXO_SEM_OS + hashlib.sha1(repr(conteudo).encode("utf-8")).hexdigest()[:16] for conteudo in conteudos
+        ]
+    return chaves
+
+
+def _registros(df, versao):
+    chaves = _chaves_registro(df)
+    ocorrencia = chaves.groupby(chaves.to_numpy(), sort=False).cumcount()
+    return zip(
+        chaves.tolist(),
+        ocorrencia.tolist(),
+        _textos(df["Login"]),
+        _textos(df["Status"]),
+        df["DataCriacao"].dt.strftime("%Y-%m-%d").tolist(),
+        _textos(df["Categoria2Motivo"]),
+        _textos(df["TipoRetido"]),
+        _textos(df["Franquia"]),
+        itertools.repeat(versao),
+    )
+
+
+def _versao(conn):
+    linha = conn.execute("SELECT Valor FROM metadados WHERE Chave = 'versao'").fetchone()
+    return int(linha[0]) if linha else 0
+
+
+def versao_base(db_path=BASE_PADRAO):
+    with conectar(db_path) as conn:
+        return _versao(conn)
+
+
+# Identifica o conteúdo da base para as chaves de cache (muda a cada importação com alterações)
+def fingerprint_base(db_path=BASE_PADRAO):
+    return f"{PREFIXO_FINGERPRINT}{versao_base(db_path)}"
+
+
+# Versão da base de um fingerprint de fingerprint_base; None se não for um deles
+def versao_do_fingerprint(fingerprint):
+    versao = fingerprint[len(PREFIXO_FINGERPRINT):] if fingerprint.startswith(PREFIXO_FINGERPRINT) else ""
+    return int(versao) if versao.isdigit() else None
+
+
+# Importa uma exportação (completa, diária ou parcial) para a base. `limpar` é a mesma limpeza
+# aplicada à planilha no painel. Arquivos já importados (mesmo fingerprint) são ignorados sem
+# serem lidos. A importação guarda a primeira e a última data de criação do arquivo (ver
+# intervalo_importado). Devolve o número de registros novos ou alterados.
+def importar_planilha(file_path, limpar, db_path=BASE_PADRAO):
+    fingerprint = fingerprint_arquivo(file_path)
+    with _lock_escrita, conectar(db_path) as conn:
+        importado = conn.execute("SELECT DataInicial FROM importacoes WHERE Fingerprint = ?", (fingerprint,)).fetchone()
+        if importado is not None and importado[0] is not None:
+            return 0
+
+        with medir_etapa("leitura_planilha") as etapa:
+            df = ler_planilha_projetada(file_path, limpar, colunas={**COLUNAS_POSICIONAIS, **COLUNA_CHAVE_REGISTRO})
+            etapa.linhas = len(df)
+        with medir_etapa("gravacao_base", linhas=len(df)):
+            # A versão é lida dentro da transação de escrita, para duas importações nunca usarem a mesma
+            conn.execute("BEGIN IMMEDIATE")
+            versao = _versao(conn) + 1
+            antes = conn.total_changes
+            conn.executemany(_UPSERT, _registros(df, versao))
+            alteradas = conn.total_changes - antes
+
+        datas = df["DataCriacao"]
+        # Arquivo sem linhas fica com datas vazias (e não NULL), para não ser relido a cada sincronização
+        data_inicial, data_final = ("", "") if datas.empty else (f"{datas.min():%Y-%m-%d}", f"{datas.max():%Y-%m-%d}")
+        # Uma importação anterior às colunas de datas só as recebe (as contagens dela não mudam)
+        conn.execute(
+            "INSERT INTO importacoes (Fingerprint, Arquivo, Linhas, Alteradas, ImportadoEm, DataInicial, DataFinal) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (Fingerprint) DO UPDATE SET DataInicial = excluded.DataInicial, DataFinal = excluded.DataFinal",
+            (fingerprint, os.path.abspath(file_path), len(df), alteradas, time.time(), data_inicial, data_final),
+        )
+        if alteradas:
+            conn.execute(
+                "INSERT INTO metadados (Chave, Valor) VALUES ('versao', ?) "
+                "ON CONFLICT (Chave) DO UPDATE SET Valor = excluded.Valor",
+                (str(versao),),
+            )
+        conn.commit()
+    return alteradas
+
+
+# Planilha principal mais as exportações de PASTA_IMPORTACOES, na ordem em que devem ser aplicadas
+def arquivos_para_importar(planilha_principal, pasta=PASTA_IMPORTACOES):
+    arquivos = [planilha_principal] if os.path.exists(planilha_principal) else []
+    if os.path.isdir(pasta):
+        arquivos += sorted(
+            os.path.join(pasta, nome) for nome in os.listdir(pasta)
+            if nome.lower().endswith(".xlsx") and not nome.startswith("~$")
+        )
+    return arquivos
+
+
+def sincronizar_base(arquivos, limpar, db_path=BASE_PADRAO):
+    return sum(importar_planilha(arquivo, limpar, db_path) for arquivo in arquivos)
+
+
+# Primeira e última data de criação (date) de um arquivo já importado, identificado pelo
+# conteúdo; None se ele não foi importado ou não tem linhas. A base acumula todas as exportações
+# já importadas, e o painel usa isto para começar, por padrão, na primeira data da planilha
+# principal atual.
+def intervalo_importado(file_path, db_path=BASE_PADRAO):
+    fingerprint = fingerprint_arquivo(file_path)
+    with conectar(db_path) as conn:
+        linha = conn.execute(
+            "SELECT DataInicial, DataFinal FROM importacoes WHERE Fingerprint = ?", (fingerprint,),
+        ).fetchone()
+    if linha is None or not linha[0]:
+        return None
+    return date.fromisoformat(linha[0]), date.fromisoformat(linha[1])
+
+
+# Lê a base no mesmo formato do frame normalizado (categóricas e DataCriacao em datetime64),
+# na ordem de importação
+def ler_base(db_path=BASE_PADRAO):
+    consulta = f"SELECT {', '.join(COLUNAS_BASE)} FROM atendimentos ORDER BY rowid"
+    with medir_etapa("leitura_base") as etapa, conectar(db_path) as conn:
+        df = pd.read_sql_query(consulta, conn)
+        etapa.linhas = len(df)
+    return _normalizar_base(df)
+
+
+def _normalizar_base(df):
+    df["DataCriacao"] = pd.to_datetime(df["DataCriacao"])
+    for coluna in COLUNAS_CATEGORICAS_BASE:
+        df[coluna] = df[coluna].astype("category")
+    return df
+
+
+# Linhas gravadas ou alteradas depois da versão do `fingerprint` (de fingerprint_base), para
+# atualizar um frame de ler_base sem reler a tabela inteira. Devolve (posições, linhas, total):
+# a posição de cada linha no frame de ler_base (linhas alteradas ficam onde estavam, as novas vão
+# para o fim) e o total de linhas da base. Posição é rowid - 1, o que vale enquanto a tabela não
+# tem lacunas de rowid (a base só recebe inserções e atualizações); se tiver, ou se o fingerprint
+# não for de fingerprint_base, devolve None e quem chama relê a base inteira.
+def ler_alteracoes(fingerprint, db_path=BASE_PADRAO):
+    versao = versao_do_fingerprint(fingerprint)
+    if versao is None:
+        return None
+    consulta = f"SELECT rowid, {', '.join(COLUNAS_BASE)} FROM atendimentos WHERE Versao > ? ORDER BY rowid"
+    with medir_etapa("leitura_alteracoes_base") as etapa, conectar(db_path) as conn:
+        total, ultimo = conn.execute("SELECT COUNT(*), COALESCE(MAX(rowid), 0) FROM atendimentos").fetchone()
+        if total != ultimo:
+            return None
+        df = pd.read_sql_query(consulta, conn, params=(versao,))
+        etapa.linhas = len(df)
+    posicoes = df.pop("rowid").to_numpy(dtype=np.int64) - 1
+    return posicoes, _normalizar_base(df), total
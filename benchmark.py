@@ -0,0 +1,180 @@
+# Mede tempo e pico de memória das etapas do painel com planilhas sintéticas (dados_sinteticos.py):
+# leitura da planilha, process_data, cada calcular_* e a exportação completa. Cada execução é
+# acrescentada a um arquivo JSON lines, e --comparar mostra a diferença para a execução anterior.
+#
+#   python benchmark.py                         # 10k, 100k e 1M linhas
+#   python benchmark.py --linhas 10000 --comparar
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from analise import (
+    apurar_analise_completa, calcular_conversao_por_usuario, calcular_detalhe_por_status,
+    calcular_franquias_nao_retido, calcular_motivos_cancelamento, calcular_resumo_retencao, calcular_tipos_retido,
+    config_padrao, limpar_dados, process_data,
+)
+from dados_sinteticos import gerar_frame_macro, gravar_planilha_macro
+from exportacao import gerar_planilha_analise
+from ingestao import carregar_planilha_normalizada
+from instrumentacao import memoria_residente_mb
+
+TAMANHOS_PADRAO = [10_000, 100_000, 1_000_000]
+ARQUIVO_RESULTADOS = "benchmarks.jsonl"
+# Planilhas geradas ficam guardadas aqui e são reaproveitadas entre execuções
+PASTA_PLANILHAS = os.path.join(".cache", "benchmark")
+
+
+# Intervalo entre as amostras de memória durante uma etapa
+INTERVALO_AMOSTRAGEM = 0.05
+
+
+# Executa `funcao` e devolve (resultado, segundos, pico de memória em MB acima do início da etapa).
+# A memória é amostrada numa thread em vez de usar tracemalloc, que deixa a leitura da planilha
+# várias vezes mais lenta e não enxerga buffers alocados fora do Python (pyarrow, por exemplo).
+def medir(funcao):
+    gc.collect()
+    base = memoria_residente_mb()
+    pico = [base]
+    terminou = threading.Event()
+
+    def amostrar():
+        while not terminou.wait(INTERVALO_AMOSTRAGEM):
+            pico[0] = max(pico[0], memoria_residente_mb())
+
+    amostrador = threading.Thread(target=amostrar, daemon=True) if base is not None else None
+    if amostrador:
+        amostrador.start()
+    inicio = time.perf_counter()
+    try:
+        resultado = funcao()
+        segundos = time.perf_counter() - inicio
+    finally:
+        terminou.set()
+        if amostrador:
+            amostrador.join()
+    if base is None:
+        return resultado, segundos, None
+    return resultado, segundos, max(pico[0], memoria_residente_mb()) - base
+
+
+def _versao_codigo():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def planilha_sintetica(linhas, logins, dias, pasta=PASTA_PLANILHAS):
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, f"macro_{linhas}_{logins}_{dias}.xlsx")
+    if not os.path.exists(caminho):
+        gravar_planilha_macro(caminho, gerar_frame_macro(linhas, logins=logins, dias=dias))
+    return caminho
+
+
+# Etapas medidas para um tamanho; cada uma recebe o que as anteriores produziram
+def executar_tamanho(linhas, logins, dias):
+    usuarios_oficiais, usuarios_backup, usuarios_staff, retention_bands = config_padrao()
+    usuarios = (usuarios_oficiais, usuarios_backup, usuarios_staff)
+    caminho = planilha_sintetica(linhas, logins, dias)
+    medicoes = []
+
+    def etapa(nome, funcao):
+        resultado, segundos, pico_mb = medir(funcao)
+        medicoes.append({"etapa": nome, "segundos": round(segundos, 4), "pico_mb": None if pico_mb is None else round(pico_mb, 2)})
+        print(f"  {nome:<32} {segundos:9.3f} s {pico_mb if pico_mb is not None else float('nan'):10.1f} MB", flush=True)
+        return resultado
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        etapa("leitura_planilha", lambda: carregar_planilha_normalizada(caminho, limpar_dados, cache_dir))
+        etapa("leitura_sidecar", lambda: carregar_planilha_normalizada(caminho, limpar_dados, cache_dir))
+    bruto = etapa("leitura_pd_read_excel", lambda: pd.read_excel(caminho))
+    df = etapa("process_data", lambda: process_data(bruto, *usuarios))
+    bruto = None
+
+    etapa("calcular_resumo_retencao", lambda: calcular_resumo_retencao(df, retention_bands))
+    etapa("calcular_detalhe_nao_retido", lambda: calcular_detalhe_por_status(df, "Não Retido"))
+    etapa("calcular_detalhe_retido", lambda: calcular_detalhe_por_status(df, "Retido"))
+    etapa("calcular_conversao_por_usuario", lambda: calcular_conversao_por_usuario(df))
+    etapa("calcular_motivos_cancelamento", lambda: calcular_motivos_cancelamento(df))
+    etapa("calcular_tipos_retido", lambda: calcular_tipos_retido(df))
+    etapa("calcular_franquias_nao_retido", lambda: calcular_franquias_nao_retido(df))
+    etapa("exportacao_completa", lambda: gerar_planilha_analise(*apurar_analise_completa(df, retention_bands)))
+    return medicoes
+
+
+def ler_resultados(arquivo=ARQUIVO_RESULTADOS):
+    if not os.path.exists(arquivo):
+        return []
+    with open(arquivo, encoding="utf-8") as f:
+        return [json.loads(linha) for linha in f if linha.strip()]
+
+
+# Tabela (linhas, etapa) com os tempos e picos da execução atual e da anterior com os mesmos parâmetros
+def comparar(atual, anterior):
+    def indexar(execucao):
+        return {(m["linhas"], m["etapa"]): m for m in execucao["medicoes"]}
+
+    antes = indexar(anterior)
+    linhas = []
+    for (tamanho, nome), medicao in indexar(atual).items():
+        base = antes.get((tamanho, nome))
+        linhas.append({
+            "linhas": tamanho,
+            "etapa": nome,
+            "segundos": medicao["segundos"],
+            "segundos_antes": base["segundos"] if base else None,
+            "variacao_tempo_%": round((medicao["segundos"] / base["segundos"] - 1) * 100, 1) if base and base["segundos"] else None,
+            "pico_mb": medicao["pico_mb"],
+            "pico_mb_antes": base["pico_mb"] if base else None,
+        })
+    return pd.DataFrame(linhas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do painel de retenção com planilhas sintéticas.")
+    parser.add_argument("--linhas", type=int, nargs="+", default=TAMANHOS_PADRAO, help="tamanhos medidos (padrão: %(default)s)")
+    parser.add_argument("--logins", type=int, default=24, help="logins distintos (padrão: %(default)s)")
+    parser.add_argument("--dias", type=int, default=20, help="dias distintos de DataCriacao (padrão: %(default)s)")
+    parser.add_argument("--saida", default=ARQUIVO_RESULTADOS, help="arquivo JSON lines dos resultados (padrão: %(default)s)")
+    parser.add_argument("--comparar", action="store_true", help="compara com a execução anterior de mesmos parâmetros")
+    args = parser.parse_args(argv)
+
+    execucao = {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "commit": _versao_codigo(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "logins": args.logins,
+        "dias": args.dias,
+        "medicoes": [],
+    }
+    for linhas in args.linhas:
+        print(f"{linhas} linhas", flush=True)
+        for medicao in executar_tamanho(linhas, args.logins, args.dias):
+            execucao["medicoes"].append({"linhas": linhas, **medicao})
+
+    anteriores = [r for r in ler_resultados(args.saida) if (r["logins"], r["dias"]) == (args.logins, args.dias)]
+    with open(args.saida, "a", encoding="utf-8") as f:
+        f.write(json.dumps(execucao, ensure_ascii=False) + "\n")
+
+    if args.comparar:
+        if anteriores:
+            print(comparar(execucao, anteriores[-1]).to_string(index=False))
+        else:
+            print("Nenhuma execução anterior com os mesmos parâmetros para comparar.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
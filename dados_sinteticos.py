@@ -0,0 +1,94 @@
+# Dados sintéticos no layout da exportação "Retenção - Macro" (mesmas 19 colunas, na mesma posição),
+# para medir desempenho com volumes maiores que o da planilha real. Os logins configurados por padrão
+# entram primeiro, para que todos os grupos de operação tenham linhas.
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+from analise import (
+    DEFAULT_USUARIOS_BACKUP, DEFAULT_USUARIOS_OFICIAIS, DEFAULT_USUARIOS_STAFF, MOTIVOS_A_DESCONSIDERAR_PADRAO,
+)
+
+COLUNAS_MACRO = [
+    "Contrato", "OS Criada por", "Núm. OS", "Motivo Status", "Tipo de Retido", "Motivo Status Item",
+    "Tipo de Transação", "Status", "Data Criação OS", "Data de Instalação", "Filial Contrato", "Franquias",
+    "Data Desinstalação", "Forma jurídica", "OS Modificada em", "Categoria 1", "Categoria 2", "Categoria 3",
+    "Desconto",
+]
+
+TIPOS_RETIDO = ["Retido-Argumentação", "Retido-Desconto", "Retido-Troca de Produto", "Retido-Upgrade"]
+TIPOS_NAO_RETIDO = ["Não Retido-Sem fidel", "Não Retido-Isento de", "Não Retido-Multa"]
+MOTIVOS_CANCELAMENTO = [
+    "SEM CONDIÇÕES FINANCEIRAS", "PREÇO CARO CUSTO BENEFÍCIO", "JÁ COMPROU OU GANHOU OUTRO PURIFICADOR",
+    "DESEJA DESCONTO", "MUDANÇA DE ENDEREÇO", "INSATISFAÇÃO COM ATENDIMENTO",
+] + MOTIVOS_A_DESCONSIDERAR_PADRAO
+# Proporção de retidos na planilha real (927 de 1454)
+TAXA_RETENCAO = 0.64
+
+
+# Frame cru (como o pd.read_excel devolveria) com `linhas` atendimentos de `logins` usuários
+# distintos, espalhados por `dias` dias a partir de `inicio`
+def gerar_frame_macro(linhas, logins=24, dias=20, franquias=40, inicio=date(2025, 6, 2), semente=0):
+    rng = np.random.default_rng(semente)
+    conhecidos = DEFAULT_USUARIOS_OFICIAIS + DEFAULT_USUARIOS_BACKUP + DEFAULT_USUARIOS_STAFF
+    nomes_login = (conhecidos + [f"USUARIO{i:05d}" for i in range(max(0, logins - len(conhecidos)))])[:logins]
+    nomes_franquia = [f"FRQ_ECO_SP_{i:03d}" for i in range(franquias)]
+
+    retido = rng.random(linhas) < TAXA_RETENCAO
+    tipo_retido = np.where(
+        retido,
+        np.array(TIPOS_RETIDO, dtype=object)[rng.integers(len(TIPOS_RETIDO), size=linhas)],
+        np.array(TIPOS_NAO_RETIDO, dtype=object)[rng.integers(len(TIPOS_NAO_RETIDO), size=linhas)],
+    )
+    datas = pd.Timestamp(inicio) + pd.to_timedelta(rng.integers(dias, size=linhas), unit="D")
+    horas = pd.to_timedelta(rng.integers(8 * 3600, 20 * 3600, size=linhas), unit="s")
+    num_os = 8005000000 + np.arange(linhas, dtype=np.int64)
+
+    return pd.DataFrame({
+        "Contrato": rng.integers(1_000_000, 9_999_999, size=linhas),
+        "OS Criada por": np.array(nomes_login, dtype=object)[rng.integers(len(nomes_login), size=linhas)],
+        "Núm. OS": num_os,
+        "Motivo Status": "Cancelamento",
+        "Tipo de Retido": tipo_retido,
+        "Motivo Status Item": "",
+        "Tipo de Transação": "Retenção",
+        "Status": np.where(retido, "Retido", "Não Retido"),
+        "Data Criação OS": datas + horas,
+        "Data de Instalação": "",
+        "Filial Contrato": rng.integers(1, 50, size=linhas),
+        "Franquias": np.array(nomes_franquia, dtype=object)[rng.integers(len(nomes_franquia), size=linhas)],
+        "Data Desinstalação": "",
+        "Forma jurídica": "PF",
+        "OS Modificada em": datas + horas,
+        "Categoria 1": "CANCELAMENTO",
+        "Categoria 2": np.array(MOTIVOS_CANCELAMENTO, dtype=object)[rng.integers(len(MOTIVOS_CANCELAMENTO), size=linhas)],
+        "Categoria 3": "",
+        "Desconto": 0,
+    }, columns=COLUNAS_MACRO)
+
+
+# Grava o frame como .xlsx no modo streaming do xlsxwriter (linha a linha; suporta 1M de linhas
+# sem montar a planilha inteira na memória). Datas vão como número serial do Excel com formato de
+# data na coluna, o que evita converter célula a célula.
+def gravar_planilha_macro(caminho, df):
+    workbook = xlsxwriter.Workbook(caminho, {"constant_memory": True})
+    worksheet = workbook.add_worksheet("Planilha1")
+    formato_data = workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+
+    colunas = {}
+    for i, coluna in enumerate(df.columns):
+        serie = df[coluna]
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            worksheet.set_column(i, i, 19, formato_data)
+            serie = (serie - pd.Timestamp("1899-12-30")) / pd.Timedelta(days=1)
+        elif serie.dtype == object:
+            serie = serie.where(serie != "", None)
+        colunas[coluna] = serie.tolist()
+
+    worksheet.write_row(0, 0, list(df.columns))
+    for linha, valores in enumerate(zip(*colunas.values()), start=1):
+        worksheet.write_row(linha, 0, valores)
+    workbook.close()
+    return caminho
@@ -0,0 +1,489 @@
+import itertools
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from agregacao import CuboRetencao, acrescentar_ao_cubo, combinar_cubos, montar_cubo
+from memoizacao import CacheLRU
+from visoes import VisoesGrupos
+
+# Com Copy-on-Write, fatias e filtros do frame compartilhado nunca alteram o original; no pandas 3
+# ele já é o comportamento padrão, nas versões anteriores precisa ser ligado
+if int(pd.__version__.split(".")[0]) < 3:
+    try:
+        pd.set_option("mode.copy_on_write", True)
+    except (KeyError, pd.errors.OptionError):
+        pass
+
+# Quantas versões do dataset ficam em memória ao mesmo tempo (ex.: antes e depois de uma troca
+# de configuração de usuários, enquanto sessões antigas ainda usam a versão anterior)
+MAX_VERSOES_DATASET = 2
+
+
+# Frame processado de uma planilha, carregado uma vez por processo e usado por todas as sessões.
+# Deve ser tratado como somente leitura: as sessões usam máscaras ou posições de linhas em vez de
+# guardar cópias próprias.
+# Na carga também são montados as posições das linhas de cada login, o mapa login -> grupo, um
+# cubo parcial por grupo, as contagens do resumo de cada combinação de grupos e a série diária de
+# cada login; o cubo de qualquer seleção de grupos é só a junção dos parciais, então as posições
+# das linhas de cada grupo só existem enquanto o cubo dele é montado. Cada grupo tem uma versão,
+# que só muda quando as linhas dele mudam.
+class DatasetCompartilhado:
+    __slots__ = (
+        "file_path", "fingerprint", "usuarios", "df", "carregado_em", "motivos_desconsiderar",
+        "posicoes_por_login", "grupo_por_login", "cubos_por_grupo", "versoes_grupo",
+        "visoes_grupos", "series_por_login", "dias_alterados",
+    )
+
+    def __init__(self, file_path, fingerprint, usuarios, df, motivos_desconsiderar=(),
+                 posicoes_por_login=None, cubos_por_grupo=None, versoes_grupo=None,
+                 series_por_login=None, dias_alterados=None):
+        self.file_path = file_path
+        self.fingerprint = fingerprint
+        self.usuarios = usuarios
+        self.df = df
+        self.carregado_em = time.time()
+        self.motivos_desconsiderar = tuple(motivos_desconsiderar)
+
+        codigos_login = df["Login"].cat.codes.to_numpy()
+        codigos_operacao = df["Operação"].cat.codes.to_numpy()
+        if posicoes_por_login is None:
+            posicoes_por_login = _particionar(codigos_login, len(df["Login"].cat.categories))
+        self.posicoes_por_login = posicoes_por_login
+
+        # Código do grupo de cada login (posição = código do login na categórica); -1 se não tem linhas
+        self.grupo_por_login = np.full(len(df["Login"].cat.categories), -1, dtype=codigos_operacao.dtype)
+        self.grupo_por_login[codigos_login] = codigos_operacao
+
+        # Só os grupos sem cubo são montados (numa reclassificação, os que ganharam ou perderam linhas)
+        cubos_por_grupo = dict(cubos_por_grupo or {})
+        grupos = df["Operação"].cat.categories
+        if any(grupo not in cubos_por_grupo for grupo in grupos):
+            for grupo, posicoes in zip(grupos, _particionar(codigos_operacao, len(grupos))):
+                if len(posicoes) and grupo not in cubos_por_grupo:
+                    cubos_por_grupo[grupo] = montar_cubo(df.take(posicoes), self.motivos_desconsiderar, posicoes)
+        self.cubos_por_grupo = cubos_por_grupo
+
+        if versoes_grupo is None:
+            versoes_grupo = {grupo: next(_contador_versoes) for grupo in df["Operação"].cat.categories}
+        self.versoes_grupo = versoes_grupo
+        self.visoes_grupos = VisoesGrupos(self.cubos_por_grupo)
+
+        # Não depende do grupo dos logins, então reclassificações reaproveitam a mesma série
+        if series_por_login is None:
+            series_por_login = montar_series(self.cubos_por_grupo.values(), len(df["Login"].cat.categories))
+        self.series_por_login = series_por_login
+
+        # (fingerprint da versão anterior, dias com linhas novas ou alteradas) quando esta versão
+        # veio de uma carga incremental; permite atualizar só esses dias nos rollups de tendências
+        self.dias_alterados = dias_alterados
+
+    # Identifica o conteúdo de uma seleção de grupos: serve de chave de cache e não muda quando a
+    # configuração de usuários muda só em outros grupos
+    def chave_grupos(self, grupos):
+        return tuple(sorted((g, self.versoes_grupo.get(g, 0)) for g in grupos))
+
+    # `periodo`: (inicio, fim) de DataCriacao; cada cubo parcial é recortado antes da junção
+    def cubo_grupos(self, grupos, periodo=(None, None)):
+        cubos = [self.cubos_por_grupo[g].recortar_periodo(*periodo) for g in grupos if g in self.cubos_por_grupo]
+        cubos = [cubo for cubo in cubos if not cubo.empty]
+        if not cubos:
+            return self._cubo_vazio()
+        return combinar_cubos(cubos)
+
+    # Primeira e última data dos dados (limites do seletor de período)
+    @property
+    def intervalo_datas(self):
+        datas = self.df["DataCriacao"]
+        if datas.empty:
+            return None, None
+        return datas.min().date(), datas.max().date()
+
+    # Códigos (na categórica de Login) dos logins com linhas nos grupos
+    def _codigos_logins(self, grupos):
+        operacoes = self.df["Operação"].cat.categories
+        return np.flatnonzero(np.isin(self.grupo_por_login, [operacoes.get_loc(g) for g in grupos if g in operacoes]))
+
+    # Logins com linhas nos grupos, em ordem alfabética
+    def logins(self, grupos):
+        return sorted(self.df["Login"].cat.categories[self._codigos_logins(grupos)])
+
+    def _codigo_login(self, login):
+        return self.df["Login"].cat.categories.get_loc(login)
+
+    def grupo_login(self, login):
+        codigo = self.grupo_por_login[self._codigo_login(login)]
+        return None if codigo < 0 else self.df["Operação"].cat.categories[codigo]
+
+    # Linhas de um login no período (só as posições dele são lidas)
+    def linhas_login(self, login, periodo=(None, None)):
+        linhas = self.df.take(self.posicoes_por_login[self._codigo_login(login)])
+        inicio, fim = periodo
+        if inicio is not None:
+            linhas = linhas[linhas["DataCriacao"] >= pd.Timestamp(inicio)]
+        if fim is not None:
+            linhas = linhas[linhas["DataCriacao"] < pd.Timestamp(fim) + pd.Timedelta(days=1)]
+        return linhas
+
+    # Retido, Não Retido e Não Retido desconsiderado por dia de um login, já pré-calculados
+    def serie_login(self, login, periodo=(None, None)):
+        return self.series_por_login.consultar(self._codigo_login(login), *periodo)
+
+    # Séries diárias de todos os logins dos grupos no período, com o grupo e o login de cada linha
+    # (colunas DataCriacao, Operação, Login, Retido, Não Retido e Desconsiderado); `dias` limita a
+    # esses dias
+    def series_grupos(self, grupos, periodo=(None, None), dias=None):
+        codigos, contagens = self.series_por_login.consultar_logins(self._codigos_logins(grupos), *periodo, dias)
+        return contagens.reset_index().assign(
+            Operação=self.df["Operação"].cat.categories[self.grupo_por_login[codigos]],
+            Login=self.df["Login"].cat.categories[codigos],
+        )
+
+    def _cubo_vazio(self):
+        cubo = next(iter(self.cubos_por_grupo.values()), None)
+        if cubo is None:
+            return montar_cubo(self.df.iloc[:0], ())
+        return type(cubo)(cubo.contagens.iloc[:0], 0)
+
+    # Nova versão do dataset para outra configuração de usuários. `novo_grupo_por_login` traz o
+    # código do grupo de cada login (na ordem das categorias de Login); só as linhas dos logins que
+    # mudaram de grupo são reescritas, e só os grupos de origem e destino delas têm cubo parcial e
+    # versão refeitos.
+    def reclassificar(self, usuarios, novo_grupo_por_login):
+        novo_grupo_por_login = np.asarray(novo_grupo_por_login, dtype=self.grupo_por_login.dtype)
+        mudaram = np.flatnonzero((self.grupo_por_login != novo_grupo_por_login) & (self.grupo_por_login >= 0))
+        if not len(mudaram):
+            return DatasetCompartilhado(
+                self.file_path, self.fingerprint, usuarios, self.df, self.motivos_desconsiderar,
+                self.posicoes_por_login, self.cubos_por_grupo, self.versoes_grupo, self.series_por_login,
+            )
+
+        linhas = np.sort(np.concatenate([self.posicoes_por_login[codigo] for codigo in mudaram]))
+        operacao = self.df["Operação"]
+        codigos_operacao = operacao.cat.codes.to_numpy().copy()
+        codigos_antigos = codigos_operacao[linhas]
+        codigos_novos = novo_grupo_por_login[self.df["Login"].cat.codes.to_numpy()[linhas]]
+        codigos_operacao[linhas] = codigos_novos
+        df = self.df.assign(Operação=pd.Categorical.from_codes(codigos_operacao, dtype=operacao.dtype))
+
+        grupos = operacao.cat.categories
+        afetados = set(np.unique(codigos_antigos)) | set(np.unique(codigos_novos))
+        cubos_por_grupo = dict(self.cubos_por_grupo)
+        versoes_grupo = dict(self.versoes_grupo)
+        for codigo in afetados:
+            cubos_por_grupo.pop(grupos[codigo], None)
+            versoes_grupo[grupos[codigo]] = next(_contador_versoes)
+
+        return DatasetCompartilhado(
+            self.file_path, self.fingerprint, usuarios, df, self.motivos_desconsiderar,
+            self.posicoes_por_login, cubos_por_grupo, versoes_grupo, self.series_por_login,
+        )
+
+    # Nova versão do dataset com as linhas que a base gravou depois desta (ver
+    # analise.carregar_alteracoes_base): `posicoes` diz onde fica cada linha de `alteracoes` no
+    # frame; as que passam do fim são acrescentadas, as outras substituem a linha daquela posição.
+    # As linhas novas de um grupo são somadas ao cubo parcial dele (agregacao.acrescentar_ao_cubo);
+    # um grupo com linhas alteradas tem o cubo refeito, e os grupos sem mudanças mantêm cubo e
+    # versão. Devolve None se as posições não continuam o frame, e então quem chama relê tudo.
+    def acrescentar(self, fingerprint, posicoes, alteracoes, total_linhas):
+        anteriores = len(self.df)
+        novas = posicoes >= anteriores
+        if total_linhas != anteriores + int(novas.sum()) \
+                or not np.array_equal(posicoes[novas], np.arange(anteriores, total_linhas)):
+            return None
+        alteradas = posicoes[~novas]
+
+        colunas = {}
+        for coluna in self.df.columns:
+            atual, entra = self.df[coluna], alteracoes[coluna]
+            if isinstance(atual.dtype, pd.CategoricalDtype):
+                dtype = pd.CategoricalDtype(atual.cat.categories.union(entra.cat.categories))
+                valores = atual.cat.set_categories(dtype.categories).cat.codes.to_numpy()
+                valores_entra = entra.cat.set_categories(dtype.categories).cat.codes.to_numpy()
+            else:
+                valores, valores_entra = atual.to_numpy(), entra.to_numpy()
+            valores = np.concatenate([valores, valores_entra[novas]])
+            valores[alteradas] = valores_entra[~novas]
+            if isinstance(atual.dtype, pd.CategoricalDtype):
+                valores = pd.Categorical.from_codes(valores, dtype=dtype)
+                # Uma linha alterada pode ter levado o último uso de um valor; como na leitura
+                # da base inteira, só ficam as categorias que aparecem (Operação tem todos os grupos)
+                if len(alteradas) and coluna != "Operação":
+                    valores = valores.remove_unused_categories()
+            colunas[coluna] = valores
+        df = pd.DataFrame(colunas)
+
+        # Logins que ganharam ou perderam linhas alteradas (nos códigos novos da categórica)
+        logins = df["Login"].cat
+        mapa_logins = logins.categories.get_indexer(self.df["Login"].cat.categories)
+        codigos_login = logins.codes.to_numpy()
+        logins_alterados = np.union1d(mapa_logins[self.df["Login"].cat.codes.to_numpy()[alteradas]], codigos_login[alteradas])
+        posicoes_por_login = _acrescentar_posicoes(
+            self.posicoes_por_login, mapa_logins, codigos_login, len(logins.categories), anteriores,
+            logins_alterados[logins_alterados >= 0],
+        )
+
+        operacao = df["Operação"].cat
+        codigos_operacao = operacao.codes.to_numpy()
+        refeitos = set(self.df["Operação"].cat.codes.to_numpy()[alteradas]) | set(codigos_operacao[alteradas])
+        linhas_novas = np.arange(anteriores, total_linhas, dtype=np.int32)
+        cubos_por_grupo = {}
+        versoes_grupo = dict(self.versoes_grupo)
+        # Cubos com contagens que a série por login ainda não tem: os refeitos inteiros e, nos
+        # outros grupos, os das linhas novas
+        cubos_series = []
+        for codigo, grupo in enumerate(operacao.categories):
+            entram = linhas_novas[codigos_operacao[anteriores:] == codigo]
+            if codigo in refeitos or len(entram):
+                versoes_grupo[grupo] = next(_contador_versoes)
+            cubo = self.cubos_por_grupo.get(grupo)
+            if codigo in refeitos or cubo is None:
+                posicoes_grupo = np.flatnonzero(codigos_operacao == codigo).astype(np.int32)
+                if len(posicoes_grupo):
+                    cubos_por_grupo[grupo] = montar_cubo(df.take(posicoes_grupo), self.motivos_desconsiderar, posicoes_grupo)
+                    cubos_series.append(cubos_por_grupo[grupo])
+                continue
+            cubo = _com_categorias(cubo, df)
+            if len(entram):
+                cubo_novas = montar_cubo(df.take(entram), self.motivos_desconsiderar, entram)
+                cubo = acrescentar_ao_cubo(cubo, cubo_novas)
+                cubos_series.append(cubo_novas)
+            cubos_por_grupo[grupo] = cubo
+
+        removidos = np.flatnonzero(np.isin(self.grupo_por_login, list(refeitos)))
+        series_por_login = self.series_por_login.acrescentar(mapa_logins, len(logins.categories), removidos, cubos_series)
+
+        datas_antes, datas = self.df["DataCriacao"].to_numpy(), df["DataCriacao"].to_numpy()
+        dias_alterados = np.unique(np.concatenate([datas_antes[alteradas], datas[alteradas], datas[anteriores:]]))
+        return DatasetCompartilhado(
+            self.file_path, fingerprint, self.usuarios, df, self.motivos_desconsiderar,
+            posicoes_por_login, cubos_por_grupo, versoes_grupo, series_por_login, (self.fingerprint, dias_alterados),
+        )
+
+    @property
+    def memoria_bytes(self):
+        total = int(self.df.memory_usage(deep=True).sum())
+        total += sum(posicoes.nbytes for posicoes in self.posicoes_por_login)
+        total += sum(int(cubo.contagens.memory_usage(deep=True).sum()) for cubo in self.cubos_por_grupo.values())
+        total += self.visoes_grupos.memoria_bytes
+        total += self.series_por_login.memoria_bytes
+        return total
+
+
+# Série diária de cada login (Retido, Não Retido e Não Retido desconsiderado), montada uma vez na
+# carga a partir dos cubos parciais (montar_series) e atualizada numa carga incremental
+# (acrescentar). As linhas ficam ordenadas por (código do login, data) e `limites` guarda onde
+# começa cada login, então a série de um login é um fatiamento e o recorte por período é uma busca
+# binária nas datas dele.
+class SeriesPorLogin:
+    __slots__ = ("contagens", "datas", "limites")
+
+    # `codigos`: código do login de cada linha de `contagens` (indexado por DataCriacao)
+    def __init__(self, codigos, contagens, quantidade_logins):
+        self.contagens = contagens
+        self.datas = contagens.index.to_numpy()
+        self.limites = np.searchsorted(codigos, np.arange(quantidade_logins + 1))
+
+    # Série da próxima versão dos dados (ver DatasetCompartilhado.acrescentar). `mapa` leva o
+    # código antigo de cada login ao novo; as linhas dos logins em `removidos` (códigos antigos)
+    # saem e as contagens dos `cubos` (nos códigos novos) são somadas às do mesmo login e dia ou
+    # entram na posição delas, sem reagrupar a série inteira.
+    def acrescentar(self, mapa, quantidade_logins, removidos, cubos):
+        codigos = np.repeat(np.arange(len(self.limites) - 1), np.diff(self.limites))
+        mantidas = ~np.isin(codigos, removidos)
+        codigos = mapa[codigos[mantidas]]
+        if np.any(np.diff(codigos) < 0):
+            # As categorias de Login mudaram de ordem: a série não continua ordenada
+            return None
+        datas = self.datas[mantidas]
+        valores = self.contagens.to_numpy()[mantidas]
+
+        codigos_novos, novas = _contagens_diarias(cubos)
+        chaves = _chave_login_dia(codigos, datas)
+        chaves_novas = _chave_login_dia(codigos_novos, novas.index.to_numpy())
+        onde = np.searchsorted(chaves, chaves_novas)
+        existe = onde < len(chaves)
+        existe[existe] = chaves[onde[existe]] == chaves_novas[existe]
+        valores_novos = novas.to_numpy()
+        valores[onde[existe]] += valores_novos[existe]
+
+        onde, entram = onde[~existe], ~existe
+        codigos = np.insert(codigos, onde, codigos_novos[entram])
+        datas = np.insert(datas, onde, novas.index.to_numpy()[entram])
+        valores = np.insert(valores, onde, valores_novos[entram], axis=0)
+        contagens = pd.DataFrame(valores, index=pd.Index(datas, name="DataCriacao"), columns=self.contagens.columns)
+        return SeriesPorLogin(codigos, contagens, quantidade_logins)
+
+    def consultar(self, codigo_login, inicio=None, fim=None):
+        de, ate = self.limites[codigo_login], self.limites[codigo_login + 1]
+        datas = self.datas[de:ate]
+        if inicio is not None:
+            de += np.searchsorted(datas, np.datetime64(inicio, "D"), side="left")
+        if fim is not None:
+            ate = self.limites[codigo_login] + np.searchsorted(datas, np.datetime64(fim, "D"), side="right")
+        return self.contagens.iloc[de:max(de, ate)]
+
+    # Linhas de vários logins de uma vez: (código do login de cada linha, contagens), na ordem do
+    # índice (login, data); `dias`, se dado, restringe a esses dias
+    def consultar_logins(self, codigos_login, inicio=None, fim=None, dias=None):
+        login = np.repeat(np.arange(len(self.limites) - 1), np.diff(self.limites))
+        selecionadas = np.isin(login, codigos_login)
+        if inicio is not None:
+            selecionadas &= self.datas >= np.datetime64(inicio, "D")
+        if fim is not None:
+            selecionadas &= self.datas <= np.datetime64(fim, "D")
+        if dias is not None:
+            selecionadas &= np.isin(self.datas, dias)
+        return login[selecionadas], self.contagens[selecionadas]
+
+    @property
+    def memoria_bytes(self):
+        return int(self.contagens.memory_usage(deep=True).sum())
+
+
+# Contagens por (login, dia) dos cubos: (código do login de cada linha, contagens indexadas por
+# DataCriacao), ordenadas por login e data
+def _contagens_diarias(cubos):
+    partes = [cubo.contagens for cubo in cubos]
+    if partes:
+        cubo = pd.concat(partes, ignore_index=True)
+        codigos, datas = cubo["Login"].cat.codes.to_numpy(), cubo["DataCriacao"].to_numpy()
+        status, quantidade = cubo["Status"], cubo["Quantidade"].to_numpy()
+        retido = np.where(status == "Retido", quantidade, 0)
+        nao_retido = np.where(status == "Não Retido", quantidade, 0)
+        desconsiderado = np.where((status == "Não Retido") & cubo["Desconsiderado"], quantidade, 0)
+    else:
+        codigos = retido = nao_retido = desconsiderado = np.empty(0, dtype=np.int64)
+        datas = np.empty(0, dtype="datetime64[ns]")
+    contagens = pd.DataFrame({
+        "Login": codigos, "DataCriacao": datas, "Retido": retido, "Não Retido": nao_retido, "Desconsiderado": desconsiderado,
+    }).groupby(["Login", "DataCriacao"], sort=True).sum()
+    return contagens.index.get_level_values("Login").to_numpy(), contagens.reset_index(level="Login", drop=True)
+
+
+def montar_series(cubos, quantidade_logins):
+    return SeriesPorLogin(*_contagens_diarias(cubos), quantidade_logins)
+
+
+# Chave inteira de (login, dia), crescente na mesma ordem da série
+def _chave_login_dia(codigos, datas):
+    return codigos.astype(np.int64) * (1 << 32) + datas.astype("datetime64[D]").astype(np.int64)
+
+
+# Cubo com as colunas categóricas nas categorias do frame `df` (quando uma carga incremental
+# acrescentou ou removeu valores); as linhas do cubo não mudam
+def _com_categorias(cubo, df):
+    recodificadas = {
+        coluna: cubo.contagens[coluna].cat.set_categories(df[coluna].cat.categories)
+        for coluna in cubo.contagens.columns
+        if coluna in df.columns and isinstance(cubo.contagens[coluna].dtype, pd.CategoricalDtype)
+        and not cubo.contagens[coluna].cat.categories.equals(df[coluna].cat.categories)
+    }
+    if not recodificadas:
+        return cubo
+    return CuboRetencao(cubo.contagens.assign(**recodificadas), cubo.total_linhas)
+
+
+# Versões dos grupos são únicas no processo, para que chaves de cache de datasets diferentes
+# nunca coincidam
+_contador_versoes = itertools.count(1)
+
+
+# Partição das linhas por código de categoria: uma ordenação estável dos códigos e um corte por
+# contagem. Devolve, para cada código, as posições (ordenadas) das suas linhas, em int32: metade
+# da memória das posições int64 do argsort, e uma planilha não chega perto de 2^31 linhas.
+def _particionar(codigos, quantidade_categorias):
+    ordem = np.argsort(codigos, kind="stable").astype(np.int32)
+    contagens = np.bincount(codigos[codigos >= 0], minlength=quantidade_categorias)
+    inicio = int((codigos < 0).sum())
+    particoes = []
+    for quantidade in contagens:
+        particoes.append(ordem[inicio:inicio + quantidade])
+        inicio += quantidade
+    return particoes
+
+
+# Posições por login depois de uma carga incremental (ver DatasetCompartilhado.acrescentar), sem
+# particionar a coluna Login inteira. `mapa` leva o código antigo de cada login ao novo (-1 se o
+# login saiu), `codigos` são os códigos novos de todas as linhas (`quantidade` logins) e as linhas
+# a partir de `anteriores` são as acrescentadas. Só as linhas dos logins em `alterados` (códigos
+# novos) são particionadas de novo; os outros mantêm as posições e ganham as das acrescentadas.
+def _acrescentar_posicoes(posicoes_por_login, mapa, codigos, quantidade, anteriores, alterados):
+    posicoes = [np.empty(0, dtype=np.int32)] * quantidade
+    for antigo, codigo in enumerate(mapa):
+        if codigo >= 0:
+            posicoes[codigo] = posicoes_por_login[antigo]
+    for codigo, linhas in enumerate(_particionar(codigos[anteriores:], quantidade)):
+        if len(linhas):
+            posicoes[codigo] = np.concatenate([posicoes[codigo], linhas + np.int32(anteriores)])
+    linhas = np.flatnonzero(np.isin(codigos, alterados)).astype(np.int32)
+    particoes = _particionar(codigos[linhas], quantidade)
+    for codigo in alterados:
+        posicoes[codigo] = linhas[particoes[codigo]]
+    return posicoes
+
+
+class RepositorioDatasets:
+    __slots__ = ("_versoes", "_lock_carga")
+
+    def __init__(self, max_versoes=MAX_VERSOES_DATASET):
+        self._versoes = CacheLRU(max_versoes)
+        self._lock_carga = threading.Lock()
+
+    # Devolve o dataset da planilha para a configuração de usuários informada, carregando-o
+    # só se nenhuma sessão já o fez. O lock evita que várias sessões abertas ao mesmo tempo
+    # processem a mesma planilha em paralelo.
+    # Com `classificar_logins` (categorias de Login -> códigos de grupo), uma troca de configuração
+    # reaproveita a versão já carregada da mesma planilha e só reclassifica o que mudou.
+    # Com `carregar_alteracoes` (fingerprint anterior -> argumentos de DatasetCompartilhado.acrescentar,
+    # ou None), uma versão nova dos dados parte da anterior carregada e só lê o que mudou.
+    def obter(self, file_path, fingerprint, usuarios, carregar, motivos_desconsiderar=(), classificar_logins=None,
+              carregar_alteracoes=None):
+        usuarios = tuple(tuple(lista) for lista in usuarios)
+        chave = (file_path, fingerprint, usuarios)
+        dataset = self._versoes.consultar(chave)
+        if dataset is not None:
+            return dataset
+
+        def montar():
+            anterior = self._versao_da_planilha(file_path, fingerprint, motivos_desconsiderar)
+            if anterior is not None and classificar_logins is not None:
+                return anterior.reclassificar(usuarios, classificar_logins(anterior.df["Login"].cat.categories))
+            anterior = self._versao_anterior(file_path, usuarios, motivos_desconsiderar)
+            if anterior is not None and carregar_alteracoes is not None:
+                alteracoes = carregar_alteracoes(anterior.fingerprint)
+                dataset = None if alteracoes is None else anterior.acrescentar(fingerprint, *alteracoes)
+                if dataset is not None:
+                    return dataset
+            return DatasetCompartilhado(file_path, fingerprint, usuarios, carregar(), motivos_desconsiderar)
+
+        with self._lock_carga:
+            return self._versoes.obter(chave, montar)
+
+    def _versao_da_planilha(self, file_path, fingerprint, motivos_desconsiderar):
+        for dataset in reversed(self.datasets()):
+            if (dataset.file_path, dataset.fingerprint) == (file_path, fingerprint) \
+                    and dataset.motivos_desconsiderar == tuple(motivos_desconsiderar):
+                return dataset
+        return None
+
+    # Versão mais recente já carregada do mesmo arquivo, com a mesma configuração de usuários
+    def _versao_anterior(self, file_path, usuarios, motivos_desconsiderar):
+        for dataset in reversed(self.datasets()):
+            if (dataset.file_path, dataset.usuarios) == (file_path, usuarios) \
+                    and dataset.motivos_desconsiderar == tuple(motivos_desconsiderar):
+                return dataset
+        return None
+
+    def datasets(self):
+        return self._versoes.valores()
+
+    @property
+    def memoria_bytes(self):
+        return sum(dataset.memoria_bytes for dataset in self.datasets())
+
+
+# Repositório único do processo, compartilhado por todas as sessões do Streamlit
+REPOSITORIO_DATASETS = RepositorioDatasets()
@@ -0,0 +1,70 @@
+import io
+import math
+
+# Percentuais são gravados como número (escala 0-100) e só exibidos com o sinal de %,
+# para que a planilha exportada possa ser usada em fórmulas e gráficos
+FORMATO_PERCENTUAL = '0.00"%"'
+
+# Estilo de cabeçalho do to_excel do pandas (negrito, com borda)
+FORMATO_CABECALHO = {"bold": True, "border": 1, "align": "center", "valign": "top"}
+
+
+# Texto seguro para nome de arquivo (nomes de aba, logins, franquias)
+def nome_arquivo(texto):
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in texto).strip("_").lower()
+
+
+# Grava a tabela linha a linha, como o modo constant_memory do xlsxwriter exige (cada linha vai para
+# o disco assim que a próxima começa, então abas grandes não ficam inteiras na memória). Os
+# formatos de percentual vão em cada célula: no modo streaming não dá para formatar linhas já gravadas.
+def _escrever_aba(workbook, formatos, nome_aba, df, colunas_percentuais=(), linhas_percentuais=(), na_rep=""):
+    worksheet = workbook.add_worksheet(nome_aba)
+    worksheet.write_row(0, 0, [str(coluna) for coluna in df.columns], formatos["cabecalho"])
+
+    colunas_percentuais = set(colunas_percentuais)
+    linhas_percentuais = set(linhas_percentuais)
+    for linha, valores in enumerate(df.itertuples(index=False, name=None)):
+        linha_percentual = linha in linhas_percentuais
+        for coluna, valor in enumerate(valores):
+            formato = formatos["percentual"] if linha_percentual or coluna in colunas_percentuais else None
+            if valor is None or (isinstance(valor, float) and math.isnan(valor)):
+                valor = na_rep
+            if valor != "":
+                worksheet.write(linha + 1, coluna, valor, formato)
+
+
+# Abas da análise completa, na ordem da planilha: (nome da aba, tabela numérica, opções de escrita)
+def tabelas_exportacao(resumo, detalhe_nao_retido, detalhe_retido, conversao, motivos, tipos, franquias):
+    df_conversao = conversao.tabela()
+    abas = [
+        # As duas primeiras linhas do resumo são as conversões
+        ('Resumo de Retenção', resumo.tabela(), {"linhas_percentuais": (0, 1)}),
+        ('Nao Retidos', detalhe_nao_retido.tabela(), {}),
+        ('Retidos', detalhe_retido.tabela(), {}),
+        ('Conversao', df_conversao, {"colunas_percentuais": range(2, len(df_conversao.columns)), "na_rep": "-"}),
+    ]
+    # Sem a linha de Total nas distribuições
+    for nome_aba, distribuicao in (('Motivos Cancelamento', motivos), ('Tipos Retido', tipos), ('Franquias Nao Retido', franquias)):
+        abas.append((nome_aba, distribuicao.tabela(com_total=False), {"colunas_percentuais": (2,), "na_rep": "-"}))
+    return abas
+
+
+# Gera o .xlsx da análise completa a partir dos objetos de resultados.py (valores numéricos)
+def gerar_planilha_analise(resumo, detalhe_nao_retido, detalhe_retido, conversao, motivos, tipos, franquias):
+    # Importado só aqui: abrir o painel não precisa do xlsxwriter, só exportar
+    import xlsxwriter
+
+    excel_buffer = io.BytesIO()
+
+    workbook = xlsxwriter.Workbook(excel_buffer, {"constant_memory": True})
+    formatos = {
+        "cabecalho": workbook.add_format(FORMATO_CABECALHO),
+        "percentual": workbook.add_format({"num_format": FORMATO_PERCENTUAL}),
+    }
+    abas = tabelas_exportacao(resumo, detalhe_nao_retido, detalhe_retido, conversao, motivos, tipos, franquias)
+    for nome_aba, df, opcoes in abas:
+        _escrever_aba(workbook, formatos, nome_aba, df, **opcoes)
+
+    workbook.close()
+    excel_buffer.seek(0) # Volta ao início do buffer para leitura
+    return excel_buffer
@@ -0,0 +1,93 @@
+import os
+import uuid
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from agregacao import CuboRetencao
+from analise import apurar_analise_completa
+from exportacao import gerar_planilha_analise, nome_arquivo
+from ingestao import CACHE_DIR
+
+# Dimensões da exportação em lote (rótulo -> coluna do cubo): uma planilha por valor
+DIMENSOES_LOTE = {"Operação": "Operação", "Franquia": "Franquia", "Login": "Login"}
+# Processos que montam as planilhas das entidades
+MAX_PROCESSOS_LOTE = 4
+# Planilhas em andamento por processo; limita quantas ficam na memória antes de irem para o ZIP
+PLANILHAS_POR_PROCESSO = 2
+PASTA_LOTES = os.path.join(CACHE_DIR, "lotes")
+# ZIPs gerados mantidos em disco (os mais antigos são apagados ao gerar um novo)
+MAX_LOTES_EM_DISCO = 8
+
+
+# Divide o cubo filtrado em um cubo por valor da dimensão, numa única passada. As linhas do cubo
+# mantêm a ordem de primeira ocorrência, então cada parte dá as mesmas tabelas que o cubo das
+# linhas daquela entidade.
+def dividir_cubo(cubo, coluna):
+    partes = {}
+    for valor, contagens in cubo.contagens.groupby(coluna, observed=True, sort=True):
+        partes[str(valor)] = CuboRetencao(contagens.reset_index(drop=True), int(contagens["Quantidade"].sum()))
+    return partes
+
+
+# Executado nos processos filhos: as mesmas abas do botão de exportação, para uma entidade
+def _planilha_entidade(cubo, retention_bands, top_k):
+    return gerar_planilha_analise(*apurar_analise_completa(cubo, retention_bands, top_k)).getvalue()
+
+
+def _nomes_unicos(entidades):
+    nomes, usados = {}, set()
+    for entidade in entidades:
+        base = nome_arquivo(entidade) or "sem_nome"
+        nome, sufixo = base, 2
+        while nome in usados:
+            nome, sufixo = f"{base}_{sufixo}", sufixo + 1
+        usados.add(nome)
+        nomes[entidade] = f"{nome}.xlsx"
+    return nomes
+
+
+# Caminho para um ZIP novo em `pasta`, apagando os mais antigos além de `manter`
+def novo_caminho_lote(prefixo, pasta=PASTA_LOTES, manter=MAX_LOTES_EM_DISCO):
+    os.makedirs(pasta, exist_ok=True)
+    existentes = sorted((os.path.join(pasta, nome) for nome in os.listdir(pasta) if nome.endswith(".zip")), key=os.path.getmtime)
+    for antigo in existentes[:max(0, len(existentes) - manter + 1)]:
+        try:
+            os.remove(antigo)
+        except OSError:
+            pass
+    return os.path.join(pasta, f"{nome_arquivo(prefixo)}-{uuid.uuid4().hex[:12]}.zip")
+
+
+# Gera um ZIP em `caminho` com uma planilha por entidade da dimensão. As planilhas são montadas em
+# paralelo e cada uma vai para o ZIP (em disco) assim que fica pronta; só as que estão em andamento
+# ficam na memória. `progresso(concluidas, total)` é chamado a cada planilha gravada. `contexto` é o
+# contexto de multiprocessing dos processos filhos (None: o padrão da plataforma).
+def gerar_zip_lote(cubo, dimensao, retention_bands, caminho, top_k=None, max_processos=MAX_PROCESSOS_LOTE, progresso=None,
+                   contexto=None):
+    partes = dividir_cubo(cubo, DIMENSOES_LOTE[dimensao])
+    nomes = _nomes_unicos(partes)
+    pendentes = iter(partes.items())
+    limite = max(1, max_processos) * PLANILHAS_POR_PROCESSO
+    temporario = f"{caminho}.parcial"
+
+    with ProcessPoolExecutor(max_workers=max(1, min(max_processos, len(partes))), mp_context=contexto) as executor, \
+            zipfile.ZipFile(temporario, "w", zipfile.ZIP_DEFLATED) as arquivo_zip:
+        em_andamento = {}
+        concluidas = 0
+        while True:
+            while len(em_andamento) < limite:
+                proxima = next(pendentes, None)
+                if proxima is None:
+                    break
+                entidade, parte = proxima
+                em_andamento[executor.submit(_planilha_entidade, parte, retention_bands, top_k)] = entidade
+            if not em_andamento:
+                break
+            prontos, _ = wait(em_andamento, return_when=FIRST_COMPLETED)
+            for futuro in prontos:
+                arquivo_zip.writestr(nomes[em_andamento.pop(futuro)], futuro.result())
+                concluidas += 1
+                if progresso is not None:
+                    progresso(concluidas, len(partes))
+    os.replace(temporario, caminho)
+    return caminho, len(partes)
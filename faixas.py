@@ -0,0 +1,98 @@
+import numpy as np
+
+# Sem faixa correspondente (taxa fora de todas as faixas)
+FAIXA_AUSENTE = "N/A"
+# Folga no limite superior, para que ele seja inclusivo mesmo com arredondamento
+TOLERANCIA_LIMITE = 1e-9
+# Distância entre cenários na busca em lote: as taxas (0 a 1) de cada cenário ficam num intervalo
+# próprio [c * DESLOCAMENTO_CENARIO, c * DESLOCAMENTO_CENARIO + 1], sem sobreposição
+DESLOCAMENTO_CENARIO = 1000.0
+
+
+def _formatar_limite(valor):
+    return f"{valor * 100:.2f}%".replace(".", ",")
+
+
+# Rótulo da faixa a partir dos limites (ex.: "55,01% a 59,00%"); a última faixa, quando vai até
+# 100%, é "a Acima"
+def nome_faixa(inferior, superior, ultima=False):
+    if ultima and superior >= 1.0:
+        return f"{_formatar_limite(inferior)} a Acima"
+    return f"{_formatar_limite(inferior)} a {_formatar_limite(superior)}"
+
+
+# Tabela de faixas de conversão (limites em decimal, valor em R$ por intenção), com qualquer
+# número de faixas. Como na versão original, vale a primeira faixa da lista que contém a taxa.
+# Quando as faixas não se sobrepõem (caso normal), no máximo uma contém cada taxa: elas ficam
+# ordenadas pelo limite inferior e a busca é binária (np.searchsorted) sobre o array inteiro.
+class TabelaFaixas:
+    __slots__ = ("inferiores", "superiores", "valores", "nomes", "disjuntas")
+
+    def __init__(self, retention_bands):
+        faixas = [(float(inf), float(sup), float(valor)) for inf, sup, valor in retention_bands]
+        ordenadas = sorted(faixas)
+        # Disjuntas inclusive pela folga do limite superior; senão a ordem da lista decide
+        self.disjuntas = all(a[1] + TOLERANCIA_LIMITE < b[0] for a, b in zip(ordenadas, ordenadas[1:]))
+        if self.disjuntas:
+            faixas = ordenadas
+        self.inferiores = np.array([f[0] for f in faixas])
+        self.superiores = np.array([f[1] for f in faixas])
+        self.valores = np.array([f[2] for f in faixas])
+        # "a Acima" vai na faixa que chega mais longe (a última, quando são disjuntas)
+        maior = max((f[1] for f in faixas), default=None)
+        self.nomes = np.array([nome_faixa(inf, sup, ultima=sup == maior) for inf, sup, _ in faixas], dtype=object)
+
+    def __len__(self):
+        return len(self.valores)
+
+    # (valores por intenção, nomes das faixas) de cada taxa (percentual 0-100); 0.0 e "N/A" fora das faixas
+    def localizar(self, taxas_percentuais):
+        valores, nomes = localizar_em_lote([self], taxas_percentuais)
+        return valores[0], nomes[0]
+
+
+# Avalia vários cenários de faixas sobre as mesmas taxas numa única busca: os limites de todos os
+# cenários com faixas disjuntas são concatenados com um deslocamento por cenário e as consultas
+# (cenário, taxa) vão todas para um único np.searchsorted. Cenários com faixas sobrepostas
+# percorrem as faixas na ordem da lista sobre as taxas distintas. Devolve matrizes
+# (cenários x taxas) de valor e de nome.
+def localizar_em_lote(tabelas, taxas_percentuais):
+    taxas = np.atleast_1d(np.asarray(taxas_percentuais, dtype=float)) / 100.0
+    matriz_valores = np.zeros((len(tabelas), len(taxas)))
+    matriz_nomes = np.full((len(tabelas), len(taxas)), FAIXA_AUSENTE, dtype=object)
+
+    sobrepostas = [c for c, tabela in enumerate(tabelas) if not tabela.disjuntas and len(tabela)]
+    if sobrepostas:
+        unicas, inversa = np.unique(taxas, return_inverse=True)
+    for c in sobrepostas:
+        tabela = tabelas[c]
+        faixa = np.full(len(unicas), -1)
+        for i in range(len(tabela)):
+            livres = (faixa < 0) & (tabela.inferiores[i] <= unicas) & (unicas <= tabela.superiores[i] + TOLERANCIA_LIMITE)
+            faixa[livres] = i
+        indices = faixa[inversa]
+        achadas = indices >= 0
+        matriz_valores[c, achadas] = tabela.valores[indices[achadas]]
+        matriz_nomes[c, achadas] = tabela.nomes[indices[achadas]]
+
+    cenarios = [c for c, tabela in enumerate(tabelas) if tabela.disjuntas and len(tabela)]
+    if not cenarios:
+        return matriz_valores, matriz_nomes
+    disjuntas = [tabelas[c] for c in cenarios]
+    tamanhos = np.array([len(tabela) for tabela in disjuntas], dtype=int)
+    deslocamentos = np.arange(len(disjuntas)) * DESLOCAMENTO_CENARIO
+    primeira_faixa = np.cumsum(tamanhos) - tamanhos
+    inferiores = np.concatenate([t.inferiores + d for t, d in zip(disjuntas, deslocamentos)])
+    superiores = np.concatenate([t.superiores + d for t, d in zip(disjuntas, deslocamentos)])
+    valores = np.concatenate([t.valores for t in disjuntas])
+
+    consultas = deslocamentos[:, None] + taxas[None, :]
+    indices = np.searchsorted(inferiores, consultas, side="right") - 1
+    seguros = np.clip(indices, 0, None)
+    # A faixa encontrada precisa ser do próprio cenário e conter a taxa
+    dentro = (indices >= primeira_faixa[:, None]) & (consultas <= superiores[seguros] + TOLERANCIA_LIMITE)
+
+    for linha, (c, tabela) in enumerate(zip(cenarios, disjuntas)):
+        matriz_valores[c, dentro[linha]] = valores[seguros[linha, dentro[linha]]]
+        matriz_nomes[c, dentro[linha]] = tabela.nomes[indices[linha, dentro[linha]] - primeira_faixa[linha]]
+    return matriz_valores, matriz_nomes
@@ -0,0 +1,102 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from analise import GRUPOS_OPERACAO, apurar_resumo_retencao, classificar_operacoes, limpar_dados
+from ingestao import carregar_planilha_normalizada, concatenar_frames, fingerprint_arquivo
+from memoizacao import CACHE_CALCULOS, CacheLRU
+from resultados import EvolucaoMensal
+
+# Pasta com uma exportação "Retenção - Macro" por mês, usada no modo histórico
+PASTA_HISTORICO = "historico"
+# Processos usados para ler as planilhas que ainda não estão em cache
+MAX_PROCESSOS_HISTORICO = 4
+
+# Partições mensais de cada planilha já lida neste processo, por (caminho, fingerprint)
+_particoes_por_planilha = CacheLRU(64)
+
+
+def planilhas_historico(pasta=PASTA_HISTORICO):
+    if not os.path.isdir(pasta):
+        return []
+    return sorted(
+        os.path.join(pasta, nome) for nome in os.listdir(pasta)
+        if nome.lower().endswith(".xlsx") and not nome.startswith("~$")
+    )
+
+
+# Executado nos processos filhos: cada um lê (ou pega do sidecar Parquet) uma planilha
+def _normalizar_planilha(file_path):
+    return carregar_planilha_normalizada(file_path, limpar_dados)
+
+
+# Frame normalizado -> {mês (primeiro dia): linhas do mês, na ordem da planilha}
+def _separar_por_mes(df):
+    meses = df["DataCriacao"].dt.to_period("M").dt.to_timestamp()
+    return {mes: parte.reset_index(drop=True) for mes, parte in df.groupby(meses, sort=True)}
+
+
+# Histórico particionado por mês. Cada partição lembra os fingerprints das planilhas de onde veio:
+# é a chave de cache dela, então trocar só a planilha do mês atual mantém os outros meses em cache.
+class HistoricoParticionado:
+    __slots__ = ("particoes", "origens")
+
+    def __init__(self, particoes, origens):
+        self.particoes = particoes
+        self.origens = origens
+
+    @property
+    def meses(self):
+        return sorted(self.particoes)
+
+    @property
+    def empty(self):
+        return not self.particoes
+
+
+# Lê as planilhas do histórico; só as que mudaram desde a última leitura são processadas, em
+# paralelo. Uma planilha com mais de um mês contribui para cada partição correspondente.
+# `contexto`: contexto de multiprocessing dos processos filhos (None: o padrão da plataforma).
+def carregar_historico(arquivos, max_processos=MAX_PROCESSOS_HISTORICO, contexto=None):
+    chaves = {arquivo: (os.path.abspath(arquivo), fingerprint_arquivo(arquivo)) for arquivo in arquivos}
+    faltando = [arquivo for arquivo in arquivos if chaves[arquivo] not in _particoes_por_planilha]
+    if len(faltando) > 1 and max_processos > 1:
+        with ProcessPoolExecutor(max_workers=min(max_processos, len(faltando)), mp_context=contexto) as executor:
+            frames = list(executor.map(_normalizar_planilha, faltando))
+    else:
+        frames = [_normalizar_planilha(arquivo) for arquivo in faltando]
+    particoes_por_planilha = {arquivo: _particoes_por_planilha.consultar(chaves[arquivo]) for arquivo in arquivos}
+    for arquivo, df in zip(faltando, frames):
+        particoes_por_planilha[arquivo] = _separar_por_mes(df)
+        _particoes_por_planilha.guardar(chaves[arquivo], particoes_por_planilha[arquivo])
+
+    partes_por_mes = {}
+    origens = {}
+    for arquivo in arquivos:
+        chave = chaves[arquivo]
+        for mes, parte in particoes_por_planilha[arquivo].items():
+            partes_por_mes.setdefault(mes, []).append(parte)
+            origens.setdefault(mes, []).append(chave[1])
+
+    particoes = {mes: concatenar_frames(partes) for mes, partes in partes_por_mes.items()}
+    return HistoricoParticionado(particoes, {mes: tuple(fps) for mes, fps in origens.items()})
+
+
+# Resumo de cada mês para os grupos e a configuração informados. Cada mês é memoizado à parte
+# (chave: origens da partição, usuários, grupos e faixas).
+def apurar_evolucao_mensal(historico, usuarios, grupos_selecionados, retention_bands):
+    usuarios = tuple(tuple(lista) for lista in usuarios)
+    grupos = tuple(g for g in GRUPOS_OPERACAO if g in grupos_selecionados)
+    faixas = tuple(tuple(band) for band in retention_bands)
+
+    def resumo_do_mes(mes):
+        df = classificar_operacoes(historico.particoes[mes], *usuarios)
+        return apurar_resumo_retencao(df[df["Operação"].isin(grupos)], retention_bands)
+
+    meses, resumos = [], []
+    for mes in historico.meses:
+        chave = ("historico", mes, historico.origens[mes], usuarios, grupos, faixas)
+        resumo = CACHE_CALCULOS.obter(chave, lambda: resumo_do_mes(mes))
+        if resumo.datas:
+            meses.append(mes)
+            resumos.append(resumo)
+    return EvolucaoMensal(meses, resumos)
@@ -0,0 +1,159 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Pasta onde ficam os arquivos auxiliares (sidecars) gerados a partir das planilhas
+CACHE_DIR = ".cache"
+# Quantos sidecars manter por planilha (os mais antigos são removidos)
+CACHE_MAX_ENTRADAS = 2
+# Incrementar quando o formato do frame normalizado mudar, para invalidar os sidecars antigos
+CACHE_VERSAO = 2
+
+# Posição (base 0) de cada coluna usada pela análise na planilha "Retenção - Macro"
+COLUNAS_POSICIONAIS = {
+    1: "Login",
+    4: "TipoRetido",
+    7: "Status",
+    8: "DataCriacao",
+    11: "Franquia",
+    16: "Categoria2Motivo",
+}
+# Coluna que identifica o registro (número da OS); só é lida na importação para a base local
+COLUNA_CHAVE_REGISTRO = {2: "NumOS"}
+# Linhas lidas por bloco no modo streaming
+TAMANHO_BLOCO_LEITURA = 50000
+
+# Hash do conteúdo memorizado por (caminho, mtime, tamanho), para não reler o arquivo a cada rerun
+_hash_por_stat = {}
+
+
+def fingerprint_arquivo(file_path):
+    stat = os.stat(file_path)
+    chave_stat = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    conteudo_hash = _hash_por_stat.get(chave_stat)
+    if conteudo_hash is None:
+        sha1 = hashlib.sha1()
+        with open(file_path, "rb") as f:
+            for bloco in iter(lambda: f.read(1024 * 1024), b""):
+                sha1.update(bloco)
+        conteudo_hash = sha1.hexdigest()[:16]
+        _hash_por_stat[chave_stat] = conteudo_hash
+    return f"v{CACHE_VERSAO}-{stat.st_mtime_ns}-{stat.st_size}-{conteudo_hash}"
+
+
+def _prefixo_sidecar(file_path):
+    nome = os.path.splitext(os.path.basename(file_path))[0]
+    return hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()[:8] + "-" + nome.replace(" ", "_")
+
+
+def _caminho_sidecar(file_path, fingerprint, cache_dir):
+    return os.path.join(cache_dir, f"{_prefixo_sidecar(file_path)}--{fingerprint}.parquet")
+
+
+def _evictar_sidecars_antigos(file_path, cache_dir, manter):
+    prefixo = _prefixo_sidecar(file_path) + "--"
+    try:
+        candidatos = [os.path.join(cache_dir, nome) for nome in os.listdir(cache_dir)
+                      if nome.startswith(prefixo) and nome.endswith(".parquet")]
+    except FileNotFoundError:
+        return
+    candidatos.sort(key=os.path.getmtime, reverse=True)
+    for caminho in candidatos[manter:]:
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+
+def _bloco_para_frame(colunas):
+    dados = {}
+    for nome, valores in colunas.items():
+        serie = pd.Series(valores, dtype="object")
+        # Células vazias chegam como None; usa NaN como o pd.read_excel faria
+        dados[nome] = serie.where(serie.notna(), np.nan).infer_objects()
+    return pd.DataFrame(dados)
+
+
+# Lê a primeira aba em modo read-only do openpyxl, linha a linha, mantendo apenas as colunas
+# de `colunas` (posição -> nome; por padrão COLUNAS_POSICIONAIS). Cada bloco de `tamanho_bloco`
+# linhas é convertido em DataFrame e passado por `normalizar` antes do próximo ser lido, então a
+# memória cresce com as colunas usadas e não com a largura da exportação.
+def iterar_blocos_planilha(file_path, normalizar=None, tamanho_bloco=TAMANHO_BLOCO_LEITURA, colunas=COLUNAS_POSICIONAIS):
+    from openpyxl import load_workbook
+
+    posicoes = sorted(colunas)
+    max_col = posicoes[-1] + 1
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        linhas = ws.iter_rows(min_row=2, max_col=max_col, values_only=True)
+        valores = {colunas[p]: [] for p in posicoes}
+        n = 0
+        for linha in linhas:
+            if linha is None or all(v is None for v in linha):
+                continue
+            for p in posicoes:
+                valores[colunas[p]].append(linha[p] if p < len(linha) else None)
+            n += 1
+            if n >= tamanho_bloco:
+                bloco = _bloco_para_frame(valores)
+                yield normalizar(bloco) if normalizar else bloco
+                valores = {colunas[p]: [] for p in posicoes}
+                n = 0
+        if n:
+            bloco = _bloco_para_frame(valores)
+            yield normalizar(bloco) if normalizar else bloco
+    finally:
+        wb.close()
+
+
+def ler_planilha_projetada(file_path, normalizar=None, tamanho_bloco=TAMANHO_BLOCO_LEITURA, colunas=COLUNAS_POSICIONAIS):
+    blocos = list(iterar_blocos_planilha(file_path, normalizar, tamanho_bloco, colunas))
+    if not blocos:
+        vazio = pd.DataFrame({nome: pd.Series(dtype="object") for nome in colunas.values()})
+        return normalizar(vazio) if normalizar else vazio
+    return concatenar_frames(blocos)
+
+
+# Junta blocos (ou frames normalizados de planilhas diferentes) preservando as colunas categóricas:
+# os dicionários de cada parte são unidos em vez de o pd.concat convertê-las de volta para texto
+def concatenar_frames(blocos):
+    if len(blocos) == 1:
+        return blocos[0].reset_index(drop=True)
+    df = pd.concat(blocos, ignore_index=True)
+    for coluna in blocos[0].columns:
+        if isinstance(blocos[0][coluna].dtype, pd.CategoricalDtype):
+            df[coluna] = union_categoricals([b[coluna] for b in blocos], sort_categories=True)
+    return df
+
+
+# Lê a planilha e devolve o frame normalizado (sem a classificação de grupos, que depende da configuração).
+# `normalizar` recebe blocos já projetados (colunas de COLUNAS_POSICIONAIS).
+# Na primeira leitura grava um sidecar Parquet identificado pelo fingerprint do arquivo; as próximas
+# leituras (de qualquer sessão) carregam o sidecar e só voltam ao Excel quando a planilha mudar.
+def carregar_planilha_normalizada(file_path, normalizar, cache_dir=CACHE_DIR):
+    fingerprint = fingerprint_arquivo(file_path)
+    sidecar = _caminho_sidecar(file_path, fingerprint, cache_dir)
+
+    if os.path.exists(sidecar):
+        try:
+            return pd.read_parquet(sidecar)
+        except Exception:
+            # Sidecar corrompido ou ilegível: reprocessa a planilha e sobrescreve
+            pass
+
+    df = ler_planilha_projetada(file_path, normalizar)
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{sidecar}.{os.getpid()}.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, sidecar)
+        _evictar_sidecars_antigos(file_path, cache_dir, CACHE_MAX_ENTRADAS)
+    except (ImportError, OSError):
+        # Sem pyarrow ou sem permissão de escrita: segue sem cache persistente
+        pass
+    return df
@@ -0,0 +1,137 @@
+# Partida do painel: arquivos estáticos e configuração em cache por mtime, e o preaquecimento
+# (carga dos dados e dos caches de agregados da seleção padrão) numa thread assim que o processo
+# sobe. Executado direto, só importa as planilhas para a base local, antes de subir o Streamlit,
+# para o primeiro acesso não pagar por isso (os caches de agregados ficam na memória do processo
+# do painel, então são preaquecidos por ele):
+#
+#   python inicializacao.py
+import base64
+import copy
+import os
+import sys
+import threading
+import time
+
+from analise import (
+    CONFIG_FILE, GRUPOS_OPERACAO, TOP_K_PADRAO, apurar_resumo_grupos, apurar_resumos_grupos, ler_config, limpar_dados,
+    periodo_planilha, tabelas_abas,
+)
+from armazenamento import arquivos_para_importar, fingerprint_base, sincronizar_base
+from memoizacao import CACHE_CALCULOS, ChavesPainel
+from monitoramento import MONITOR_DADOS
+
+# Arquivos lidos já processados, por caminho e função de leitura: (mtime, tamanho, valor)
+_lidos = {}
+_lock_lidos = threading.Lock()
+
+
+# Resultado de `ler(caminho)`, refeito só quando o mtime ou o tamanho do arquivo mudam
+def _ler_com_cache(caminho, ler):
+    stat = os.stat(caminho)
+    chave = (os.path.abspath(caminho), ler)
+    with _lock_lidos:
+        lido = _lidos.get(chave)
+    if lido is not None and lido[:2] == (stat.st_mtime_ns, stat.st_size):
+        return lido[2]
+    valor = ler(caminho)
+    with _lock_lidos:
+        _lidos[chave] = (stat.st_mtime_ns, stat.st_size, valor)
+    return valor
+
+
+def _ler_base64(caminho):
+    with open(caminho, "rb") as f:
+        return base64.b64encode(f.read()).decode()
+
+
+# Imagem em base64 para embutir no HTML; None se o arquivo não existe
+def imagem_base64(caminho):
+    if not os.path.exists(caminho):
+        return None
+    return _ler_com_cache(caminho, _ler_base64)
+
+
+# ler_config em cache por mtime; cada chamada recebe uma cópia, que a sessão pode alterar à vontade.
+# Salvar a configuração muda o mtime, então a próxima leitura já vê o arquivo novo.
+def config_em_cache(config_file=CONFIG_FILE):
+    if not os.path.exists(config_file):
+        return ler_config(config_file)
+    return copy.deepcopy(_ler_com_cache(config_file, ler_config))
+
+
+# Tempos da partida do processo: do início (primeira importação deste módulo) ao fim do
+# preaquecimento e ao fim da primeira execução do painel
+class PartidaFria:
+    __slots__ = ("inicio", "preaquecimento", "primeira_execucao", "erro", "_thread", "_lock")
+
+    def __init__(self):
+        self.inicio = time.time()
+        self.preaquecimento = None
+        self.primeira_execucao = None
+        self.erro = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # Inicia o preaquecimento uma vez por processo, numa thread. Sessões que chegarem antes do fim
+    # esperam a carga dos dados no próprio monitor, e os agregados que o preaquecimento estiver
+    # calculando, no CacheLRU (que não calcula em dobro uma chave em andamento)
+    def iniciar_preaquecimento(self, config_file=CONFIG_FILE):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._preaquecer, args=(config_file,), name="preaquecimento", daemon=True)
+                self._thread.start()
+
+    def _preaquecer(self, config_file):
+        inicio = time.perf_counter()
+        try:
+            preaquecer(config_file)
+        except Exception as e:
+            self.erro = e
+        self.preaquecimento = time.perf_counter() - inicio
+
+    # Marca o fim da primeira execução do painel; devolve True só nessa primeira vez
+    def registrar_execucao(self):
+        with self._lock:
+            if self.primeira_execucao is not None:
+                return False
+            self.primeira_execucao = time.time() - self.inicio
+            return True
+
+
+# Carrega os dados com a configuração salva e calcula o que a primeira página mostra na seleção
+# padrão (todos os grupos, período padrão de analise.periodo_planilha, top-k padrão), com as
+# chaves e as tabelas do painel (memoizacao.ChavesPainel e analise.tabelas_abas)
+def preaquecer(config_file=CONFIG_FILE):
+    *usuarios, retention_bands = config_em_cache(config_file)
+    snapshot = MONITOR_DADOS.obter(usuarios)
+    if not snapshot.arquivos:
+        return None
+    dataset = MONITOR_DADOS.dataset(snapshot, usuarios)
+    periodo = periodo_planilha(snapshot.inicio_planilha, dataset.intervalo_datas[0])
+    chave_grupos = dataset.chave_grupos(GRUPOS_OPERACAO)
+    chaves = ChavesPainel(snapshot.fingerprint, chave_grupos, chave_grupos, periodo, TOP_K_PADRAO, retention_bands)
+
+    cubo = CACHE_CALCULOS.obter(chaves.cubo, lambda: dataset.cubo_grupos(GRUPOS_OPERACAO, periodo))
+    if periodo == (None, None):
+        CACHE_CALCULOS.obter(chaves.resumos_grupos, lambda: apurar_resumos_grupos(dataset.visoes_grupos, retention_bands))
+    else:
+        CACHE_CALCULOS.obter(chaves.resumo,
+                             lambda: apurar_resumo_grupos(dataset.visoes_grupos, GRUPOS_OPERACAO, retention_bands, periodo))
+    for nome, usa_top_k, calcular in tabelas_abas(cubo, TOP_K_PADRAO):
+        CACHE_CALCULOS.obter(chaves.tabela(nome, usa_top_k), calcular)
+    return dataset
+
+
+# Única por processo
+PARTIDA_FRIA = PartidaFria()
+
+
+if __name__ == "__main__":
+    inicio = time.perf_counter()
+    arquivos = arquivos_para_importar(MONITOR_DADOS.planilha, MONITOR_DADOS.pasta)
+    if not arquivos:
+        print("Nenhuma planilha encontrada para importar.", file=sys.stderr)
+        sys.exit(1)
+    alteradas = sincronizar_base(arquivos, limpar_dados, MONITOR_DADOS.db_path)
+    print(f"Base {fingerprint_base(MONITOR_DADOS.db_path)} pronta: {alteradas} registros novos ou alterados "
+          f"em {time.perf_counter() - inicio:.2f} s")
@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+# Log local das medições (uma linha JSON por etapa), gravado só com o diagnóstico ligado
+ARQUIVO_LOG = "diagnostico.jsonl"
+
+_coleta_da_thread = threading.local()
+_lock_log = threading.Lock()
+
+
+# Memória residente do processo em MB (Linux); None onde /proc não existe
+def memoria_residente_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError):
+        return None
+
+
+class Etapa:
+    __slots__ = ("nome", "linhas", "cache", "inicio", "segundos", "memoria_antes", "memoria_depois")
+
+    def __init__(self, nome, linhas=None):
+        self.nome = nome
+        self.linhas = linhas
+        self.cache = None
+        self.segundos = None
+        self.memoria_antes = None
+        self.memoria_depois = None
+
+    def __enter__(self):
+        self.memoria_antes = memoria_residente_mb()
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.segundos = time.perf_counter() - self.inicio
+        self.memoria_depois = memoria_residente_mb()
+        _coleta_da_thread.atual.etapas.append(self)
+        return False
+
+    def como_dict(self):
+        delta = None
+        if self.memoria_antes is not None and self.memoria_depois is not None:
+            delta = round(self.memoria_depois - self.memoria_antes, 2)
+        return {
+            "etapa": self.nome,
+            "ms": round(self.segundos * 1000, 2),
+            "linhas": self.linhas,
+            "cache": self.cache,
+            "memoria_mb": None if self.memoria_depois is None else round(self.memoria_depois, 1),
+            "delta_memoria_mb": delta,
+        }
+
+
+# Usada quando o diagnóstico está desligado: aceita as mesmas operações e não mede nada
+class _EtapaInativa:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, nome, valor):
+        pass
+
+
+_ETAPA_INATIVA = _EtapaInativa()
+
+
+# Medições de uma execução (um rerun do painel) na thread atual
+class Coleta:
+    __slots__ = ("inicio", "etapas")
+
+    def __init__(self):
+        self.inicio = datetime.now()
+        self.etapas = []
+
+    def registros(self):
+        return [etapa.como_dict() for etapa in self.etapas]
+
+
+# Com `ativa=False` só garante que nenhuma coleta anterior (ex.: interrompida por uma exceção)
+# continue ligada nesta thread
+def iniciar_coleta(ativa=True):
+    coleta = Coleta() if ativa else None
+    _coleta_da_thread.atual = coleta
+    return coleta
+
+
+# Encerra a coleta da thread e acrescenta as medições ao log (contexto extra vai em cada linha)
+def finalizar_coleta(coleta, arquivo_log=ARQUIVO_LOG, **contexto):
+    _coleta_da_thread.atual = None
+    execucao = coleta.inicio.isoformat(timespec="milliseconds")
+    linhas = [json.dumps({"execucao": execucao, **contexto, **registro}, ensure_ascii=False, default=str)
+              for registro in coleta.registros()]
+    if not linhas or arquivo_log is None:
+        return
+    try:
+        with _lock_log, open(arquivo_log, "a", encoding="utf-8") as f:
+            f.write("\n".join(linhas) + "\n")
+    except OSError:
+        pass
+
+
+# Mede o bloco se houver uma coleta ativa nesta thread; sem ela o custo é só uma consulta ao
+# threading.local. Atribuições como `etapa.linhas = n` são ignoradas quando não há coleta.
+def medir_etapa(nome, linhas=None):
+    if getattr(_coleta_da_thread, "atual", None) is None:
+        return _ETAPA_INATIVA
+    return Etapa(nome, linhas)
+
+
+# Acrescenta à coleta da thread (se houver) uma etapa medida fora dela, como o preaquecimento
+# feito em outra thread antes da primeira execução
+def registrar_etapa(nome, segundos, linhas=None):
+    coleta = getattr(_coleta_da_thread, "atual", None)
+    if coleta is None:
+        return
+    etapa = Etapa(nome, linhas)
+    etapa.segundos = segundos
+    etapa.memoria_depois = memoria_residente_mb()
+    coleta.etapas.append(etapa)
+
+
+# CacheLRU.obter medido, registrando se o resultado veio do cache; `contar_linhas` (opcional)
+# extrai do resultado a contagem de linhas da etapa
+def obter_medido(cache, chave, nome, calcular, contar_linhas=None):
+    if getattr(_coleta_da_thread, "atual", None) is None:
+        return cache.obter(chave, calcular)
+
+    calculou = []
+
+    def calcular_e_marcar():
+        calculou.append(True)
+        return calcular()
+
+    with Etapa(nome) as etapa:
+        valor = cache.obter(chave, calcular_e_marcar)
+        etapa.cache = "falha" if calculou else "acerto"
+        if contar_linhas is not None:
+            etapa.linhas = contar_linhas(valor)
+    return valor
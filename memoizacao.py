@@ -0,0 +1,140 @@
+import threading
+from collections import OrderedDict
+
+# Tamanho padrão do cache de cálculos (número de resultados guardados)
+MAX_ENTRADAS_PADRAO = 256
+
+# Marca para diferenciar "não está no cache" de um resultado None
+_AUSENTE = object()
+
+
+# Cache LRU limitado, compartilhado entre as sessões do Streamlit (que rodam em threads).
+# O cálculo acontece fora do lock; quem pede uma chave que outra thread está calculando espera
+# esse cálculo terminar em vez de repeti-lo (se ele falhar, quem esperava calcula por conta própria).
+class CacheLRU:
+    __slots__ = ("max_entradas", "acertos", "falhas", "_dados", "_lock", "_em_calculo")
+
+    def __init__(self, max_entradas=MAX_ENTRADAS_PADRAO):
+        self.max_entradas = max_entradas
+        self.acertos = 0
+        self.falhas = 0
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+        # Chave -> (thread que está calculando, evento sinalizado ao fim do cálculo)
+        self._em_calculo = {}
+
+    def __len__(self):
+        return len(self._dados)
+
+    def __contains__(self, chave):
+        with self._lock:
+            return chave in self._dados
+
+    # Consulta sem calcular; devolve `padrao` se a chave não estiver no cache
+    def consultar(self, chave, padrao=None):
+        with self._lock:
+            valor = self._dados.get(chave, _AUSENTE)
+            if valor is _AUSENTE:
+                return padrao
+            self._dados.move_to_end(chave)
+            self.acertos += 1
+            return valor
+
+    def valores(self):
+        with self._lock:
+            return list(self._dados.values())
+
+    def obter(self, chave, calcular):
+        while True:
+            with self._lock:
+                valor = self._dados.get(chave, _AUSENTE)
+                if valor is not _AUSENTE:
+                    self._dados.move_to_end(chave)
+                    self.acertos += 1
+                    return valor
+                thread, pronto = self._em_calculo.get(chave, (None, None))
+                # A própria thread pedindo de novo a chave que calcula não espera por si mesma
+                if pronto is None or thread == threading.get_ident():
+                    self.falhas += 1
+                    pronto = threading.Event()
+                    self._em_calculo[chave] = (threading.get_ident(), pronto)
+                    break
+            pronto.wait()
+
+        try:
+            valor = calcular()
+            self.guardar(chave, valor)
+        finally:
+            with self._lock:
+                if self._em_calculo.get(chave, (None, None))[1] is pronto:
+                    del self._em_calculo[chave]
+            pronto.set()
+        return valor
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._dados[chave] = valor
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_entradas:
+                self._dados.popitem(last=False)
+
+    # Remove as entradas cuja chave satisfaz `condicao` (ex.: tudo de um fingerprint antigo)
+    def invalidar(self, condicao=None):
+        with self._lock:
+            if condicao is None:
+                removidas = len(self._dados)
+                self._dados.clear()
+                return removidas
+            chaves = [chave for chave in self._dados if condicao(chave)]
+            for chave in chaves:
+                del self._dados[chave]
+            return len(chaves)
+
+
+# Cache dos cálculos do painel (dados processados, cubo e tabelas de cada aba)
+CACHE_CALCULOS = CacheLRU()
+
+
+# Chaves dos resultados do painel para uma seleção (dados, grupos, período, top-k e faixas), usadas
+# pelo painel e pelo preaquecimento (inicializacao.py), que precisa acertar as mesmas entradas.
+# `chave_grupos` é DatasetCompartilhado.chave_grupos da seleção e `chave_todos_grupos` a de todos
+# os grupos (o resumo do período inteiro é guardado para todas as combinações de uma vez).
+class ChavesPainel:
+    __slots__ = ("filtro", "faixas", "distribuicoes", "todos_grupos")
+
+    def __init__(self, fingerprint, chave_grupos, chave_todos_grupos, periodo, top_k, retention_bands):
+        # Tudo o que não depende das faixas de conversão usa `filtro`; as distribuições dependem
+        # também do top-k
+        self.filtro = chave_estado(fingerprint, chave_grupos, periodo=periodo)
+        self.faixas = chave_estado(fingerprint, chave_grupos, retention_bands=retention_bands, periodo=periodo)
+        self.distribuicoes = self.filtro + (top_k,)
+        self.todos_grupos = chave_estado(fingerprint, chave_todos_grupos, retention_bands=retention_bands)
+
+    @property
+    def cubo(self):
+        return self.filtro + ("cubo",)
+
+    @property
+    def resumos_grupos(self):
+        return self.todos_grupos + ("resumos_grupos",)
+
+    # Resumo da seleção num período (sem período, ele sai de resumos_grupos)
+    @property
+    def resumo(self):
+        return self.faixas + ("resumo",)
+
+    # Chave de uma tabela das abas (ver analise.tabelas_abas)
+    def tabela(self, nome, usa_top_k):
+        return (self.distribuicoes if usa_top_k else self.filtro) + (nome,)
+
+
+# Chave que identifica o estado dos filtros: dados, grupos selecionados, configuração de usuários,
+# faixas de conversão e período. Listas viram tuplas para serem hasheáveis.
+def chave_estado(fingerprint, grupos_selecionados=(), usuarios=(), retention_bands=(), periodo=()):
+    return (
+        fingerprint,
+        tuple(sorted(grupos_selecionados)),
+        tuple(tuple(lista) for lista in usuarios),
+        tuple(tuple(band) for band in retention_bands),
+        tuple(periodo),
+    )
@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+
+from analise import (
+    EXCEL_FILE_PATH, MOTIVOS_A_DESCONSIDERAR_PADRAO, carregar_alteracoes_base, carregar_dados_base, classificar_logins,
+    limpar_dados,
+)
+from armazenamento import (
+    BASE_PADRAO, PASTA_IMPORTACOES, arquivos_para_importar, fingerprint_base, intervalo_importado, sincronizar_base,
+)
+from dataset_compartilhado import REPOSITORIO_DATASETS
+from instrumentacao import medir_etapa
+
+# Segundos entre verificações da planilha principal e da pasta de importações
+INTERVALO_VERIFICACAO = 30
+
+
+# Versão dos dados servida às sessões: fingerprint da base (chave do dataset e dos caches), os
+# arquivos de origem, a modificação mais recente entre eles, a primeira data da planilha principal
+# (início do período padrão do painel; None se não há planilha principal) e quando a versão foi
+# publicada
+class SnapshotDados:
+    __slots__ = ("fingerprint", "arquivos", "modificado_em", "inicio_planilha", "publicado_em")
+
+    def __init__(self, fingerprint, arquivos, modificado_em, inicio_planilha=None):
+        self.fingerprint = fingerprint
+        self.arquivos = tuple(arquivos)
+        self.modificado_em = modificado_em
+        self.inicio_planilha = inicio_planilha
+        self.publicado_em = time.time()
+
+
+# (caminho, mtime, tamanho) de cada arquivo de entrada: barato de calcular a cada verificação e
+# muda quando uma planilha é trocada, acrescentada ou removida
+def _assinatura(arquivos):
+    assinatura = []
+    for arquivo in arquivos:
+        try:
+            stat = os.stat(arquivo)
+        except OSError:
+            continue
+        assinatura.append((os.path.abspath(arquivo), stat.st_mtime_ns, stat.st_size))
+    return tuple(assinatura)
+
+
+# Observa as planilhas de entrada numa thread em segundo plano (stale-while-revalidate): quando
+# algo muda, importa para a base e carrega o dataset novo enquanto as sessões continuam recebendo
+# o snapshot anterior; só depois o snapshot publicado é trocado, numa única atribuição.
+# O dataset novo parte do anterior e só lê da base as linhas gravadas desde a versão dele.
+# Só a primeira carga do processo acontece na sessão que a pediu.
+class MonitorDados:
+    __slots__ = (
+        "planilha", "pasta", "db_path", "intervalo", "snapshot", "atualizando", "erro",
+        "_assinatura", "_usuarios", "_lock", "_thread",
+    )
+
+    def __init__(self, planilha=EXCEL_FILE_PATH, pasta=PASTA_IMPORTACOES, db_path=BASE_PADRAO,
+                 intervalo=INTERVALO_VERIFICACAO):
+        self.planilha = planilha
+        self.pasta = pasta
+        self.db_path = db_path
+        self.intervalo = intervalo
+        self.snapshot = None
+        self.atualizando = False
+        self.erro = None
+        self._assinatura = None
+        self._usuarios = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    # Snapshot atual, carregando-o na primeira chamada e iniciando a thread de verificação.
+    # `usuarios` é a configuração da sessão: a última informada é a pré-carregada nas atualizações.
+    def obter(self, usuarios):
+        self._usuarios = tuple(tuple(lista) for lista in usuarios)
+        if self.snapshot is None:
+            with self._lock:
+                if self.snapshot is None:
+                    self._revalidar()
+        self._iniciar()
+        return self.snapshot
+
+    def _iniciar(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._verificar_sempre, name="monitor-dados", daemon=True)
+                self._thread.start()
+
+    def _verificar_sempre(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.verificar()
+            except Exception as e:
+                self.erro = e
+
+    # Revalida se a assinatura dos arquivos mudou desde o snapshot publicado; devolve True quando
+    # um snapshot novo foi publicado
+    def verificar(self):
+        if _assinatura(arquivos_para_importar(self.planilha, self.pasta)) == self._assinatura:
+            return False
+        with self._lock:
+            self.atualizando = True
+            try:
+                self._revalidar()
+            finally:
+                self.atualizando = False
+        return True
+
+    def _revalidar(self):
+        arquivos = arquivos_para_importar(self.planilha, self.pasta)
+        assinatura = _assinatura(arquivos)
+        with medir_etapa("importacao_base") as etapa:
+            etapa.linhas = sincronizar_base(arquivos, limpar_dados, self.db_path)
+        fingerprint = fingerprint_base(self.db_path)
+        if arquivos and self._usuarios is not None and (self.snapshot is None or self.snapshot.fingerprint != fingerprint):
+            self._carregar_dataset(fingerprint, self._usuarios)
+        modificado_em = max((os.path.getmtime(arquivo) for arquivo in arquivos), default=None)
+        intervalo = intervalo_importado(self.planilha, self.db_path) if os.path.exists(self.planilha) else None
+        self.snapshot = SnapshotDados(fingerprint, arquivos, modificado_em, None if intervalo is None else intervalo[0])
+        self._assinatura = assinatura
+        self.erro = None
+
+    def _carregar_dataset(self, fingerprint, usuarios):
+        return REPOSITORIO_DATASETS.obter(
+            self.db_path, fingerprint, usuarios,
+            lambda: carregar_dados_base(self.db_path, *usuarios),
+            MOTIVOS_A_DESCONSIDERAR_PADRAO,
+            lambda logins: classificar_logins(logins, *usuarios),
+            lambda anterior: carregar_alteracoes_base(self.db_path, anterior, *usuarios),
+        )
+
+    # Dataset do snapshot para a configuração de usuários da sessão
+    def dataset(self, snapshot, usuarios):
+        with medir_etapa("carga_dataset") as etapa:
+            dataset = self._carregar_dataset(snapshot.fingerprint, tuple(tuple(lista) for lista in usuarios))
+            etapa.linhas = len(dataset.df)
+        return dataset
+
+
+# Monitor único do processo, compartilhado por todas as sessões do Streamlit
+MONITOR_DADOS = MonitorDados()
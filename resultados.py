@@ -0,0 +1,411 @@
+import pandas as pd
+
+# Os objetos abaixo guardam os números das análises (contagens inteiras e percentuais em float,
+# na escala 0-100, indexados por data). A formatação em texto só acontece em `formatar()`,
+# na hora de exibir; gráficos, exportação e comparações usam `tabela()` ou os atributos.
+
+
+def cabecalho_data(data):
+    return data.strftime("%d-%b").lower()
+
+
+def formatar_percentual(valor):
+    return f"{valor:.2f}%"
+
+
+def formatar_moeda(valor):
+    return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+# Diferença entre dois percentuais, em pontos percentuais com sinal
+def formatar_variacao(valor):
+    return f"{valor:+.2f} p.p."
+
+
+def _formatar_serie_percentual(serie, vazio):
+    return serie.map(formatar_percentual).where(serie.notna(), vazio)
+
+
+class ResumoRetencao:
+    __slots__ = (
+        "datas", "retido", "nao_retido", "nao_retido_desconsiderado",
+        "conversao_ecohouse", "conversao_faturamento",
+        "conversao_ecohouse_geral", "conversao_faturamento_geral",
+        "valor_por_intencao", "faixa_faturamento", "valor_fatura",
+    )
+
+    def __init__(self, datas, retido, nao_retido, nao_retido_desconsiderado,
+                 conversao_ecohouse, conversao_faturamento,
+                 conversao_ecohouse_geral, conversao_faturamento_geral,
+                 valor_por_intencao, faixa_faturamento, valor_fatura):
+        self.datas = datas
+        self.retido = retido
+        self.nao_retido = nao_retido
+        self.nao_retido_desconsiderado = nao_retido_desconsiderado
+        self.conversao_ecohouse = conversao_ecohouse
+        self.conversao_faturamento = conversao_faturamento
+        self.conversao_ecohouse_geral = conversao_ecohouse_geral
+        self.conversao_faturamento_geral = conversao_faturamento_geral
+        self.valor_por_intencao = valor_por_intencao
+        self.faixa_faturamento = faixa_faturamento
+        self.valor_fatura = valor_fatura
+
+    @property
+    def intencoes(self):
+        return self.retido + self.nao_retido
+
+    @property
+    def total_retido(self):
+        return self.retido.sum()
+
+    @property
+    def total_nao_retido(self):
+        return self.nao_retido.sum()
+
+    @property
+    def total_intencoes(self):
+        return self.intencoes.sum()
+
+    @property
+    def colunas(self):
+        return ["Métrica"] + [cabecalho_data(d) for d in self.datas] + ["Consolidado"]
+
+    # Linhas de percentual (sem consolidado, como na tabela exibida) seguidas das de contagem
+    def tabela(self):
+        sem_consolidado = float("nan")
+        linhas = [
+            ["Conversão Ecohouse"] + self.conversao_ecohouse.tolist() + [sem_consolidado],
+            ["Conversão Faturamento"] + self.conversao_faturamento.tolist() + [sem_consolidado],
+            ["Retido"] + self.retido.tolist() + [self.total_retido],
+            ["Não Retido"] + self.nao_retido.tolist() + [self.total_nao_retido],
+            ["Intenções de Cancelamento"] + self.intencoes.tolist() + [self.total_intencoes],
+        ]
+        return pd.DataFrame(linhas, columns=self.colunas)
+
+    def formatar(self):
+        linhas = [
+            ["Conversão Ecohouse"] + [formatar_percentual(v) for v in self.conversao_ecohouse],
+            ["Conversão Faturamento"] + [formatar_percentual(v) for v in self.conversao_faturamento],
+            ["Retido"] + self.retido.tolist() + [self.total_retido],
+            ["Não Retido"] + self.nao_retido.tolist() + [self.total_nao_retido],
+            ["Intenções de Cancelamento"] + self.intencoes.tolist() + [self.total_intencoes],
+        ]
+        return pd.DataFrame(linhas, columns=self.colunas)
+
+    # Formato antigo de calcular_resumo_retencao (tupla de 11 posições)
+    def como_tupla(self):
+        return self.formatar(), self.valor_fatura, self.faixa_faturamento, \
+               self.total_retido, self.total_nao_retido, self.total_intencoes, \
+               formatar_percentual(self.conversao_faturamento_geral), formatar_percentual(self.conversao_ecohouse_geral), \
+               self.retido.to_dict(), self.nao_retido.to_dict(), self.nao_retido_desconsiderado.to_dict()
+
+
+class DetalheStatus:
+    __slots__ = ("status", "datas", "contagens")
+
+    # `contagens`: índice (Operação, Login), uma coluna por data
+    def __init__(self, status, datas, contagens):
+        self.status = status
+        self.datas = datas
+        self.contagens = contagens
+
+    def tabela(self):
+        detalhe = self.contagens.reset_index()
+        detalhe["Consolidado"] = self.contagens.sum(axis=1).to_numpy()
+        soma_por_dia = self.contagens.sum(axis=0)
+        linha_total = pd.DataFrame(
+            [["", "Consolidado Dia"] + soma_por_dia.tolist() + [soma_por_dia.sum()]],
+            columns=["Operação", "Login"] + list(self.datas) + ["Consolidado"],
+        )
+        df_final = pd.concat([detalhe, linha_total], ignore_index=True)
+        return df_final.rename(columns={d: cabecalho_data(d) for d in self.datas})
+
+    formatar = tabela
+
+
+class ConversaoUsuario:
+    __slots__ = ("datas", "retido", "nao_retido", "percentual")
+
+    # `percentual`: índice (Operação, Login), uma coluna por data e "Consolidado"; NaN quando não
+    # houve intenção de cancelamento
+    def __init__(self, datas, retido, nao_retido, percentual):
+        self.datas = datas
+        self.retido = retido
+        self.nao_retido = nao_retido
+        self.percentual = percentual
+
+    def _com_cabecalhos(self, valores):
+        valores = valores.copy()
+        valores.columns = [cabecalho_data(d) for d in self.datas] + ["Consolidado"]
+        df = valores.reset_index()
+        df.columns = ["Operação", "Login"] + list(valores.columns)
+        return df
+
+    def tabela(self):
+        return self._com_cabecalhos(self.percentual)
+
+    def formatar(self):
+        return self._com_cabecalhos(self.percentual.apply(_formatar_serie_percentual, vazio="-"))
+
+
+class Distribuicao:
+    __slots__ = ("rotulo", "contagens", "mensagem", "outros", "categorias_outros")
+
+    # Contagem por categoria já ordenada; `mensagem` substitui a tabela quando não há dados.
+    # `outros` e `categorias_outros`: soma e número das categorias fora do top-k (linha "Outros")
+    def __init__(self, rotulo, contagens, mensagem=None, outros=0, categorias_outros=0):
+        self.rotulo = rotulo
+        self.contagens = contagens
+        self.mensagem = mensagem
+        self.outros = outros
+        self.categorias_outros = categorias_outros
+
+    @property
+    def total(self):
+        return self.contagens.sum() + self.outros
+
+    @property
+    def percentual(self):
+        return (self.contagens / self.total) * 100
+
+    @property
+    def colunas(self):
+        return [self.rotulo, "Quantidade", "Percentual"]
+
+    # Texto sobre a cauda agrupada em "Outros" (None quando todas as categorias aparecem)
+    def resumo_cauda(self):
+        if not self.categorias_outros:
+            return None
+        return (f"{self.categorias_outros} categorias de menor volume ({self.outros} registros, "
+                f"{formatar_percentual(self.outros / self.total * 100)}) agrupadas em 'Outros'.")
+
+    def tabela(self, com_total=True):
+        if self.mensagem:
+            return pd.DataFrame([[self.mensagem, None, None]], columns=self.colunas)
+        df = pd.DataFrame({
+            self.rotulo: self.contagens.index.astype(str),
+            "Quantidade": self.contagens.to_numpy(),
+            "Percentual": self.percentual.to_numpy(),
+        })
+        extras = []
+        if self.categorias_outros:
+            extras.append([f"Outros ({self.categorias_outros} categorias)", self.outros, self.outros / self.total * 100])
+        if com_total:
+            extras.append(["Total", self.total, 100.0])
+        if extras:
+            df = pd.concat([df, pd.DataFrame(extras, columns=self.colunas)], ignore_index=True)
+        return df
+
+    def formatar(self):
+        if self.mensagem:
+            return pd.DataFrame([[self.mensagem, "-", "-"]], columns=self.colunas)
+        df = self.tabela()
+        df["Percentual"] = df["Percentual"].map(formatar_percentual)
+        return df
+
+
+class Cruzamento:
+    __slots__ = ("rotulo_linhas", "rotulo_colunas", "contagens")
+
+    # `contagens`: uma linha por categoria de `rotulo_linhas` e uma coluna por categoria de
+    # `rotulo_colunas`, já cortadas no top-k de cada eixo (com "Outros" no fim)
+    def __init__(self, rotulo_linhas, rotulo_colunas, contagens):
+        self.rotulo_linhas = rotulo_linhas
+        self.rotulo_colunas = rotulo_colunas
+        self.contagens = contagens
+
+    @property
+    def empty(self):
+        return self.contagens.empty
+
+    def tabela(self):
+        tabela = self.contagens.copy()
+        tabela["Total"] = tabela.sum(axis=1)
+        tabela.loc["Total"] = tabela.sum(axis=0)
+        tabela.columns = [str(coluna) for coluna in tabela.columns]
+        return tabela.rename_axis(self.rotulo_linhas).reset_index()
+
+    formatar = tabela
+
+
+def cabecalho_mes(mes):
+    return f"{mes.month:02d}/{mes.year}"
+
+
+class EvolucaoMensal:
+    __slots__ = ("meses", "resumos")
+
+    # `resumos`: um ResumoRetencao por mês (Timestamp do primeiro dia), na ordem de `meses`
+    def __init__(self, meses, resumos):
+        self.meses = meses
+        self.resumos = resumos
+
+    # Uma linha por mês; as variações são em relação ao mês anterior (pontos percentuais)
+    def tabela(self):
+        tabela = pd.DataFrame({
+            "Mês": [cabecalho_mes(mes) for mes in self.meses],
+            "Retido": [resumo.total_retido for resumo in self.resumos],
+            "Não Retido": [resumo.total_nao_retido for resumo in self.resumos],
+            "Intenções de Cancelamento": [resumo.total_intencoes for resumo in self.resumos],
+            "Conversão Ecohouse": [resumo.conversao_ecohouse_geral for resumo in self.resumos],
+            "Conversão Faturamento": [resumo.conversao_faturamento_geral for resumo in self.resumos],
+            "Valor Fatura": [resumo.valor_fatura for resumo in self.resumos],
+        })
+        tabela["Variação Conversão Ecohouse"] = tabela["Conversão Ecohouse"].diff()
+        tabela["Variação Conversão Faturamento"] = tabela["Conversão Faturamento"].diff()
+        return tabela
+
+    def formatar(self):
+        tabela = self.tabela()
+        for coluna in ("Conversão Ecohouse", "Conversão Faturamento"):
+            tabela[coluna] = tabela[coluna].map(formatar_percentual)
+        for coluna in ("Variação Conversão Ecohouse", "Variação Conversão Faturamento"):
+            tabela[coluna] = tabela[coluna].map(formatar_variacao).where(tabela[coluna].notna(), "-")
+        tabela["Valor Fatura"] = tabela["Valor Fatura"].map(formatar_moeda)
+        return tabela
+
+
+class SimulacaoFaixas:
+    __slots__ = ("cenarios", "entidades", "valores", "faixas")
+
+    # `entidades`: uma linha por (Nível, Entidade) com a conversão e as intenções ajustadas;
+    # `valores` e `faixas`: matrizes cenário x entidade com o valor por intenção e o nome da faixa
+    def __init__(self, cenarios, entidades, valores, faixas):
+        self.cenarios = cenarios
+        self.entidades = entidades
+        self.valores = valores
+        self.faixas = faixas
+
+    # Formato longo: uma linha por cenário e entidade
+    def tabela(self):
+        partes = []
+        for c, cenario in enumerate(self.cenarios):
+            parte = self.entidades.assign(Cenário=cenario, Faixa=self.faixas[c], **{"Valor por Intenção": self.valores[c]})
+            parte["Valor Fatura"] = parte["Intenções Ajustadas"] * parte["Valor por Intenção"]
+            partes.append(parte)
+        colunas = ["Cenário", "Nível", "Entidade", "Conversão Faturamento", "Intenções Ajustadas", "Faixa", "Valor por Intenção", "Valor Fatura"]
+        return pd.concat(partes, ignore_index=True)[colunas]
+
+    # Valor Fatura de cada entidade de um nível, um cenário por coluna
+    def por_nivel(self, nivel):
+        tabela = self.tabela()
+        tabela = tabela[tabela["Nível"] == nivel]
+        comparacao = tabela.pivot(index="Entidade", columns="Cenário", values="Valor Fatura")
+        return comparacao.reindex(index=tabela["Entidade"].unique(), columns=self.cenarios).reset_index()
+
+    # Consolidado de cada cenário e a diferença para o primeiro (o cenário de referência)
+    def comparativo(self):
+        tabela = self.tabela()
+        consolidado = tabela[tabela["Nível"] == "Consolidado"].reset_index(drop=True)
+        consolidado["Diferença"] = consolidado["Valor Fatura"] - consolidado["Valor Fatura"].iloc[0]
+        return consolidado[["Cenário", "Conversão Faturamento", "Intenções Ajustadas", "Faixa", "Valor por Intenção", "Valor Fatura", "Diferença"]]
+
+    def formatar(self):
+        comparativo = self.comparativo()
+        comparativo["Conversão Faturamento"] = comparativo["Conversão Faturamento"].map(formatar_percentual)
+        for coluna in ("Valor por Intenção", "Valor Fatura", "Diferença"):
+            comparativo[coluna] = comparativo[coluna].map(formatar_moeda)
+        return comparativo
+
+
+def rotulo_periodo(periodo, granularidade):
+    if granularidade == "Mês":
+        return cabecalho_mes(periodo)
+    if granularidade == "Semana":
+        return f"Semana de {periodo:%d/%m/%Y}"
+    return f"{periodo:%d/%m/%Y}"
+
+
+# Conversões de um frame com Retido, Não Retido e Desconsiderado (mesmas regras do resumo);
+# NaN quando não houve intenção de cancelamento
+def _com_conversoes(contagens):
+    retido = contagens["Retido"]
+    intencoes = retido + contagens["Não Retido"]
+    faturamento = retido + (contagens["Não Retido"] - contagens["Desconsiderado"]).clip(lower=0)
+    return contagens.assign(**{
+        "Intenções de Cancelamento": intencoes,
+        "Conversão Ecohouse": retido / intencoes.where(intencoes > 0) * 100,
+        "Conversão Faturamento": retido / faturamento.where(faturamento > 0) * 100,
+    })
+
+
+class TendenciaRetencao:
+    __slots__ = ("granularidade", "contagens")
+
+    # `contagens`: índice (Período, Operação, Login) com Retido, Não Retido e Desconsiderado
+    def __init__(self, granularidade, contagens):
+        self.granularidade = granularidade
+        self.contagens = contagens
+
+    @property
+    def empty(self):
+        return self.contagens.empty
+
+    # Uma linha por período (índice: primeiro dia do período) com as contagens e as conversões
+    def totais(self):
+        return _com_conversoes(self.contagens.groupby(level="Período").sum())
+
+    # Conversão Faturamento dos últimos `dias` dias corridos até cada dia (só no nível diário)
+    def conversao_movel(self, dias=7):
+        totais = self.contagens.groupby(level="Período").sum()
+        if totais.empty:
+            return pd.Series(dtype=float, name=f"Conversão Faturamento ({dias} dias)")
+        calendario = pd.date_range(totais.index.min(), totais.index.max(), freq="D")
+        janela = totais.reindex(calendario, fill_value=0).rolling(dias, min_periods=1).sum()
+        movel = _com_conversoes(janela)["Conversão Faturamento"].reindex(totais.index)
+        return movel.rename(f"Conversão Faturamento ({dias} dias)")
+
+    # Conversão Faturamento por período (linhas) e login (colunas)
+    def por_login(self, logins=None):
+        por_login = self.contagens.groupby(level=["Período", "Login"]).sum()
+        if logins is not None:
+            por_login = por_login[por_login.index.get_level_values("Login").isin(logins)]
+        return _com_conversoes(por_login)["Conversão Faturamento"].unstack("Login")
+
+    def tabela(self):
+        totais = self.totais()
+        tabela = totais.reset_index(drop=True)
+        tabela.insert(0, "Período", [rotulo_periodo(p, self.granularidade) for p in totais.index])
+        return tabela
+
+    def formatar(self):
+        tabela = self.tabela()
+        for coluna in ("Conversão Ecohouse", "Conversão Faturamento"):
+            tabela[coluna] = _formatar_serie_percentual(tabela[coluna], "-")
+        return tabela.drop(columns="Desconsiderado")
+
+
+class DetalheLogin:
+    __slots__ = ("login", "operacao", "diario", "motivos")
+
+    # `diario`: índice de datas com Retido, Não Retido e Desconsiderado do login; `motivos`:
+    # Distribuicao dos motivos dos não retidos dele
+    def __init__(self, login, operacao, diario, motivos):
+        self.login = login
+        self.operacao = operacao
+        self.diario = diario
+        self.motivos = motivos
+
+    @property
+    def empty(self):
+        return self.diario.empty
+
+    # Contagens e conversões do período inteiro (mesmas regras do resumo)
+    def consolidado(self):
+        return _com_conversoes(self.diario.sum().to_frame().T).iloc[0]
+
+    # Uma linha por dia, com as conversões do dia
+    def serie(self):
+        return _com_conversoes(self.diario)
+
+    def tabela(self):
+        serie = self.serie()
+        tabela = serie.reset_index(drop=True)
+        tabela.insert(0, "Data", [f"{data:%d/%m/%Y}" for data in serie.index])
+        return tabela
+
+    def formatar(self):
+        tabela = self.tabela()
+        for coluna in ("Conversão Ecohouse", "Conversão Faturamento"):
+            tabela[coluna] = _formatar_serie_percentual(tabela[coluna], "-")
+        return tabela.drop(columns="Desconsiderado")
@@ -1,28 +1,52 @@
 import streamlit as st
 import pandas as pd
-from datetime import date, datetime
+from datetime import datetime
 import json
+import multiprocessing
 import os
-import calendar 
-
-# --- VALORES DE CONFIGURAÇÃO PADRÃO ---
-DEFAULT_USUARIOS_OFICIAIS = ['DEJESF5', 'EDUARM11', 'LEMESAM', 'MARTIE90', 'CHRISA13', 'SILVAJ49', 'AFONSS1', 'LARAQA', 'ALVESM30', 'VITORJ11']
-DEFAULT_USUARIOS_BACKUP = ['HENRIM12', 'BARBOC20', 'ROBERE16', 'CAROLA12', 'FERNAM40']
-DEFAULT_USUARIOS_STAFF = ['OLIVEA34', 'SSILVA']
-
-DEFAULT_RETENTION_BANDS = [
-    (0.00, 0.55, 27.59),
-    (0.5501, 0.59, 31.58),
-    (0.5901, 0.65, 36.12),
-    (0.6501, 1.00, 41.54)
-]
-# --- FIM DOS VALORES DE CONFIGURAÇÃO PADRÃO ---
-
-# Caminhos relativos para os arquivos dentro do repositório
-CONFIG_FILE = "config.json"
-EXCEL_FILE_PATH = "Retenção - Macro.xlsx"
-
-MOTIVOS_A_DESCONSIDERAR_PADRAO = ["FALECIMENTO DO TITULAR", "AQUISIÇÃO DE BBLEND"]
+from concurrent.futures import ThreadPoolExecutor
+
+# As regras de negócio ficam em analise.py
+from analise import (
+    CONFIG_FILE, DIMENSOES_CRUZAMENTO, EXCEL_FILE_PATH, GRUPOS_OPERACAO, PERIODO_PERSONALIZADO, PERIODO_PLANILHA,
+    PERIODOS_PREDEFINIDOS, TOP_K_PADRAO, apurar_cruzamento, apurar_detalhe_login, apurar_resumo_grupos,
+    apurar_resumos_grupos, apurar_simulacao_faixas, config_padrao, gravar_config, intervalo_periodo, periodo_planilha,
+    tabelas_abas,
+)
+from dataset_compartilhado import REPOSITORIO_DATASETS
+from exportacao import gerar_planilha_analise, nome_arquivo
+from exportacao_lote import DIMENSOES_LOTE, gerar_zip_lote, novo_caminho_lote
+from faixas import nome_faixa
+from historico import PASTA_HISTORICO, apurar_evolucao_mensal, carregar_historico, planilhas_historico
+from inicializacao import PARTIDA_FRIA, config_em_cache, imagem_base64
+from instrumentacao import ARQUIVO_LOG, finalizar_coleta, iniciar_coleta, medir_etapa, obter_medido, registrar_etapa
+from memoizacao import CACHE_CALCULOS, ChavesPainel
+from monitoramento import MONITOR_DADOS
+from resultados import formatar_moeda, formatar_percentual
+from tendencias import GRANULARIDADES, apurar_rollup
+
+# Threads usadas para calcular as tabelas que ainda não estão em cache na exportação
+MAX_THREADS_EXPORTACAO = 4
+# Processos filhos criados pelo painel (histórico e exportação em lote) partem de um interpretador
+# novo: o processo do Streamlit tem várias threads e um fork no meio delas pode herdar um lock
+# preso e travar o filho. O CLI continua com o padrão da plataforma.
+CONTEXTO_PROCESSOS = multiprocessing.get_context("spawn")
+
+# (título, subtítulo, descrição) das abas de análise, pelo nome da tabela em analise.tabelas_abas
+TEXTOS_ABAS = {
+    "detalhe_nao_retido": ("❌ Não Retidos", "Detalhes de Não Retidos por Usuário e Dia",
+                           "Mostra a contagem de 'Não Retidos' por usuário e por dia para os grupos selecionados."),
+    "detalhe_retido": ("✅ Retidos", "Detalhes de Retidos por Usuário e Dia",
+                       "Mostra a contagem de 'Retidos' por usuário e por dia para os grupos selecionados."),
+    "conversao_usuario": ("📈 Conversão por Usuário", "Percentual de Conversão por Usuário",
+                          "Calcula o percentual de contratos 'Retidos' em relação ao total de intenções de cancelamento por usuário."),
+    "motivos": ("🚫 Motivos de Cancelamento", "Análise dos Motivos de Cancelamento (Não Retidos)",
+                "Distribuição dos motivos pelos quais os contratos não foram retidos."),
+    "tipos_retido": ("🏷️ Tipos de Retido", "Análise dos Tipos de Retido",
+                     "Detalhes sobre os tipos específicos de retenção para os contratos 'Retidos'."),
+    "franquias": ("🏢 Franquias (Não Retido)", "Análise de Franquias (Não Retido)",
+                  "Distribuição dos contratos 'Não Retidos' por franquia."),
+}
 
 # Nomes dos meses em português
 MESES_PORTUGUES = [
@@ -33,348 +57,54 @@ MESES_PORTUGUES = [
 # Function to load configuration (adapted for Streamlit)
 def load_config():
     try:
-        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-            config_data = json.load(f)
-            usuarios_oficiais = config_data.get('usuarios_oficiais', DEFAULT_USUARIOS_OFICIAIS)
-            usuarios_backup = config_data.get('usuarios_backup', DEFAULT_USUARIOS_BACKUP)
-            usuarios_staff = config_data.get('usuarios_staff', DEFAULT_USUARIOS_STAFF)
-            loaded_bands = config_data.get('retention_bands', DEFAULT_RETENTION_BANDS)
-            retention_bands = [(float(b[0]), float(b[1]), float(b[2])) for b in loaded_bands]
-            return usuarios_oficiais, usuarios_backup, usuarios_staff, retention_bands
-    except FileNotFoundError:
-        return list(DEFAULT_USUARIOS_OFICIAIS), list(DEFAULT_USUARIOS_BACKUP), \
-               list(DEFAULT_USUARIOS_STAFF), [list(band) for band in DEFAULT_RETENTION_BANDS]
+        return config_em_cache(CONFIG_FILE)
     except json.JSONDecodeError:
         st.warning("Arquivo de configuração corrompido ou inválido. Usando valores padrão.")
-        return list(DEFAULT_USUARIOS_OFICIAIS), list(DEFAULT_USUARIOS_BACKUP), \
-               list(DEFAULT_USUARIOS_STAFF), [list(band) for band in DEFAULT_RETENTION_BANDS]
+        return config_padrao()
 
 # Function to save configuration (adapted for Streamlit)
 def save_config(usuarios_oficiais, usuarios_backup, usuarios_staff, retention_bands):
-    serializable_retention_bands = [list(band) for band in retention_bands]
-    config_data = {
-        'usuarios_oficiais': usuarios_oficiais,
-        'usuarios_backup': usuarios_backup,
-        'usuarios_staff': usuarios_staff,
-        'retention_bands': serializable_retention_bands
-    }
     try:
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(config_data, f, indent=4)
+        gravar_config(usuarios_oficiais, usuarios_backup, usuarios_staff, retention_bands, CONFIG_FILE)
         st.success("Configurações salvas com sucesso!")
     except Exception as e:
         st.error(f"Não foi possível salvar as configurações: {e}")
 
-# Data processing functions (minimal changes needed)
-def process_data(df, usuarios_oficiais, usuarios_backup, usuarios_staff):
-    df.columns = df.columns.str.strip()
-    df = df.rename(columns={
-        df.columns[1]: "Login",
-        df.columns[7]: "Status",
-        df.columns[8]: "DataCriacao",
-        df.columns[16]: "Categoria2Motivo",
-        df.columns[4]: "TipoRetido",
-        df.columns[11]: "Franquia"
-    })
-
-    df["Login"] = df["Login"].astype(str).str.strip().str.upper()
-    df["DataCriacao"] = pd.to_datetime(df["DataCriacao"], errors='coerce').dt.date
-    df = df.dropna(subset=["DataCriacao"])
-
-    if "Categoria2Motivo" not in df.columns:
-        df["Categoria2Motivo"] = ""
-    else:
-        df["Categoria2Motivo"] = df["Categoria2Motivo"].astype(str).str.strip().str.upper()
-
-    if "TipoRetido" not in df.columns:
-        df["TipoRetido"] = ""
-    else:
-        df["TipoRetido"] = df["TipoRetido"].astype(str).str.strip()
-
-    if "Franquia" not in df.columns:
-        df["Franquia"] = ""
-    else:
-        df["Franquia"] = df["Franquia"].astype(str).str.strip().str.upper()
-
-    def classificar_grupo(login):
-        if login in usuarios_oficiais:
-            return "Retenção"
-        elif login in usuarios_backup:
-            return "Backup"
-        elif login in usuarios_staff:
-            return "Supervisão"
-        else:
-            return "Demais Operações"
-
-    df["Operacao"] = df["Login"].apply(classificar_grupo)
-    df.rename(columns={"Operacao": "Operação"}, inplace=True)
-    return df
-
-def _get_value_for_conversion_rate(conversion_rate, retention_bands):
-    conversion_rate_decimal = conversion_rate / 100.0
-    retention_band_names = [
-        "0,00% a 55,00%",
-        "55,01% a 59,00%",
-        "59,01% a 65,00%",
-        "65,01% a Acima"
+# Tabela editável da simulação: as faixas atuais e uma cópia delas como ponto de partida da proposta
+def tabela_cenarios_faixas(retention_bands):
+    linhas = [
+        {"Cenário": cenario, "Limite Inferior (%)": lower * 100, "Limite Superior (%)": upper * 100, "Valor R$": value}
+        for cenario in ("Atual", "Proposta") for lower, upper, value in retention_bands
     ]
-    for i, (lower, upper, value) in enumerate(retention_bands):
-        # Ajuste para garantir que o limite superior seja inclusivo
-        if lower <= conversion_rate_decimal <= (upper + 1e-9):
-            return value, retention_band_names[i]
-    return 0.00, "N/A"
-
-def calcular_resumo_retencao(df_filtrado, retention_bands):
-    all_dates = sorted(df_filtrado["DataCriacao"].unique())
-    date_headers = [d.strftime("%d-%b").lower() for d in all_dates]
-
-    col_names = ["Métrica"] + date_headers + ["Consolidado"]
-
-    agrupado_por_data_status = df_filtrado.groupby(["DataCriacao", "Status"]).size().unstack(fill_value=0).reset_index()
-
-    retido_diario = {d: 0 for d in all_dates}
-    nao_retido_diario = {d: 0 for d in all_dates}
-
-    for _, row in agrupado_por_data_status.iterrows():
-        data = row["DataCriacao"]
-        retido_diario[data] = row.get("Retido", 0)
-        nao_retido_diario[data] = row.get("Não Retido", 0)
-
-    total_retido_geral_abs = sum(retido_diario.values())
-    total_nao_retido_geral_abs = sum(nao_retido_diario.values())
-
-    intencoes_cancelamento_diario_calculado = {
-        d: retido_diario.get(d, 0) + nao_retido_diario.get(d, 0)
-        for d in all_dates
-    }
-    total_intencoes_cancelamento_calculado_geral = sum(intencoes_cancelamento_diario_calculado.values())
-
-    conversao_ecohouse_diaria_values = ["Conversão Ecohouse"]
-    for d in all_dates:
-        retido_count = retido_diario.get(d, 0)
-        nao_retido_count = nao_retido_diario.get(d, 0)
-        denominador_conversao_dia = retido_count + nao_retido_count
-        if denominador_conversao_dia > 0:
-            percent_conversao_dia = (retido_count / denominador_conversao_dia) * 100
-            conversao_ecohouse_diaria_values.append(f"{percent_conversao_dia:.2f}%")
-        else:
-            conversao_ecohouse_diaria_values.append("0.00%")
+    return pd.DataFrame(linhas, columns=["Cenário", "Limite Inferior (%)", "Limite Superior (%)", "Valor R$"])
 
-    denominador_conversao_geral = total_retido_geral_abs + total_nao_retido_geral_abs
-    if denominador_conversao_geral > 0:
-        percent_conversao_geral_sum = (total_retido_geral_abs / denominador_conversao_geral) * 100
-    else:
-        percent_conversao_geral_sum = 0.00
-
-    nao_retido_a_desconsiderar_diario = {d: 0 for d in all_dates}
-    if "Categoria2Motivo" in df_filtrado.columns:
-        df_nao_retido_excluir = df_filtrado[(df_filtrado["Status"] == "Não Retido") &
-                                             (df_filtrado["Categoria2Motivo"].isin(MOTIVOS_A_DESCONSIDERAR_PADRAO))]
-        nao_retido_excluido_por_data = df_nao_retido_excluir.groupby("DataCriacao").size()
-        for d in all_dates:
-            nao_retido_a_desconsiderar_diario[d] = nao_retido_excluido_por_data.get(d, 0)
-
-    conversao_faturamento_values = ["Conversão Faturamento"]
-    faturamento_percent_diario = {}
-    for d in all_dates:
-        retido_count = retido_diario.get(d, 0)
-        nao_retido_total_dia = nao_retido_diario.get(d, 0)
-        nao_retido_excluido_dia = nao_retido_a_desconsiderar_diario.get(d, 0)
-
-        nao_retido_ajustado_dia = max(0, nao_retido_total_dia - nao_retido_excluido_dia)
-
-        denominador_faturamento_dia = retido_count + nao_retido_ajustado_dia
-        if denominador_faturamento_dia > 0:
-            percent_faturamento_dia = (retido_count / denominador_faturamento_dia) * 100
-            conversao_faturamento_values.append(f"{percent_faturamento_dia:.2f}%")
-            faturamento_percent_diario[d] = percent_faturamento_dia
-        else:
-            conversao_faturamento_values.append("0.00%")
-            faturamento_percent_diario[d] = 0.00
-
-    total_nao_retido_geral_ajustado = max(0, total_nao_retido_geral_abs - sum(nao_retido_a_desconsiderar_diario.values()))
-    denominador_faturamento_geral = total_retido_geral_abs + total_nao_retido_geral_ajustado
-    if denominador_faturamento_geral > 0:
-        consolidado_faturamento_percent = (total_retido_geral_abs / denominador_faturamento_geral) * 100
-    else:
-        consolidado_faturamento_percent = 0.00
-
-    consolidated_value_per_intent, consolidated_band_name = _get_value_for_conversion_rate(consolidado_faturamento_percent, retention_bands)
-    intencoes_cancelamento_ajustado_diario = {
-        d: intencoes_cancelamento_diario_calculado.get(d, 0) - nao_retido_a_desconsiderar_diario.get(d, 0)
-        for d in all_dates
-    }
-    total_intencoes_cancelamento_ajustado_geral = max(0, sum(intencoes_cancelamento_ajustado_diario.values()))
-    final_total_payment_consolidado = total_intencoes_cancelamento_ajustado_geral * consolidated_value_per_intent
-
-    retido_row_values = ["Retido"] + [retido_diario.get(d, 0) for d in all_dates] + [total_retido_geral_abs]
-    nao_retido_row_values = ["Não Retido"] + [nao_retido_diario.get(d, 0) for d in all_dates] + [total_nao_retido_geral_abs]
-    intencoes_cancelamento_row_values = ["Intenções de Cancelamento"] + [intencoes_cancelamento_diario_calculado.get(d, 0) for d in all_dates] + [total_intencoes_cancelamento_calculado_geral]
-
-    data_for_export = []
-    data_for_export.append(conversao_ecohouse_diaria_values)
-    data_for_export.append(conversao_faturamento_values)
-    data_for_export.append(retido_row_values)
-    data_for_export.append(nao_retido_row_values)
-    data_for_export.append(intencoes_cancelamento_row_values)
-
-    df_resumo = pd.DataFrame(data_for_export, columns=col_names)
-
-    # Retornar também os valores consolidados brutos para os indicadores de performance
-    return df_resumo, final_total_payment_consolidado, consolidated_band_name, \
-           total_retido_geral_abs, total_nao_retido_geral_abs, total_intencoes_cancelamento_calculado_geral, \
-           f"{consolidado_faturamento_percent:.2f}%", f"{percent_conversao_geral_sum:.2f}%", \
-           retido_diario, nao_retido_diario, nao_retido_a_desconsiderar_diario
-
-def calcular_detalhe_por_status(df_filtrado, status_filter):
-    df_filtered = df_filtrado[df_filtrado["Status"] == status_filter]
-    all_dates_detalhe = sorted(df_filtrado["DataCriacao"].unique())
-
-    agrupado = df_filtered.groupby(["Operação", "Login", "DataCriacao"]).size().unstack(fill_value=0)
-
-    if isinstance(agrupado.index, pd.MultiIndex):
-        detalhe_para_exibir = agrupado.reset_index()
-    else:
-        detalhe_para_exibir = agrupado.copy()
-
-    for dt in all_dates_detalhe:
-        if dt not in detalhe_para_exibir.columns:
-            detalhe_para_exibir[dt] = 0
-
-    detalhe_para_exibir.columns = [col if not isinstance(col, datetime) else col.date() for col in detalhe_para_exibir.columns]
-    cols_ordered = ["Operação", "Login"] + sorted([col for col in all_dates_detalhe])
-    detalhe_para_exibir = detalhe_para_exibir[cols_ordered]
-
-    detalhe_para_exibir["Consolidado"] = detalhe_para_exibir[[col for col in all_dates_detalhe]].sum(axis=1)
-
-    soma_por_dia = df_filtered.groupby("DataCriacao").size()
-    soma_detalhe_row_values = ["", "Consolidado Dia"]
-    for dt in all_dates_detalhe:
-        soma_detalhe_row_values.append(soma_por_dia.get(dt, 0))
-    soma_detalhe_row_values.append(sum(soma_por_dia.values))
-    
-    soma_df_row = pd.DataFrame([soma_detalhe_row_values], columns=["Operação", "Login"] + all_dates_detalhe + ["Consolidado"])
-    df_final = pd.concat([detalhe_para_exibir, soma_df_row], ignore_index=True)
-    
-    # Format date columns to string
-    df_final = df_final.rename(columns={col: col.strftime("%d-%b").lower() for col in all_dates_detalhe})
-
-    return df_final
-
-def calcular_conversao_por_usuario(df_filtrado):
-    agrupado_usuario_dia_status = df_filtrado.groupby(["Operação", "Login", "DataCriacao", "Status"]).size().unstack(fill_value=0)
-    unique_operacoes_logins = df_filtrado[["Operação", "Login"]].drop_duplicates().sort_values(by=["Operação", "Login"]).values
-    all_dates_conversao = sorted(df_filtrado["DataCriacao"].unique())
-    date_headers_conversao = [d.strftime("%d-%b").lower() for d in all_dates_conversao]
-    colunas_conversao = ["Operação", "Login"] + date_headers_conversao + ["Consolidado"]
-    data_for_display_export = []
-
-    for operacao, login in unique_operacoes_logins:
-        user_row_values = [operacao, login]
-        user_data_for_conversion = agrupado_usuario_dia_status.loc[(operacao, login), :] if (operacao, login) in agrupado_usuario_dia_status.index else pd.DataFrame(columns=['Retido', 'Não Retido'])
-
-        total_retido_user = user_data_for_conversion.get("Retido", pd.Series([0])).sum()
-        total_nao_retido_user = user_data_for_conversion.get("Não Retido", pd.Series([0])).sum()
-
-        for d in all_dates_conversao:
-            retido_day = user_data_for_conversion.loc[d, "Retido"] if d in user_data_for_conversion.index and "Retido" in user_data_for_conversion.columns else 0
-            nao_retido_day = user_data_for_conversion.loc[d, "Não Retido"] if d in user_data_for_conversion.index and "Não Retido" in user_data_for_conversion.columns else 0
-
-            denominador_day = retido_day + nao_retido_day
-            if denominador_day > 0:
-                percent_day = (retido_day / denominador_day) * 100
-                user_row_values.append(f"{percent_day:.2f}%")
-            else:
-                user_row_values.append("-")
-
-        denominador_consolidado_user = total_retido_user + total_nao_retido_user
-        if denominador_consolidado_user > 0:
-            consolidado_percent_user = (total_retido_user / denominador_consolidado_user) * 100
-            user_row_values.append(f"{consolidado_percent_user:.2f}%")
-        else:
-            user_row_values.append("-")
-
-        data_for_display_export.append(user_row_values)
-    
-    df_conversao = pd.DataFrame(data_for_display_export, columns=colunas_conversao)
-    return df_conversao
-
-def calcular_motivos_cancelamento(df_filtrado):
-    colunas_display = ["Motivo", "Quantidade", "Percentual"]
-    if "Categoria2Motivo" not in df_filtrado.columns:
-        return pd.DataFrame([["Coluna 'Categoria 2' não encontrada.", "-", "-"]], columns=colunas_display)
-
-    df_nao_retido = df_filtrado[df_filtrado["Status"] == "Não Retido"]
-    if df_nao_retido.empty:
-        return pd.DataFrame([["Nenhum 'Não Retido' encontrado.", "-", "-"]], columns=colunas_display)
-
-    motivos_contagem = df_nao_retido["Categoria2Motivo"].value_counts().reset_index()
-    motivos_contagem.columns = ["Motivo", "Quantidade"]
-    total_nao_retido_motivos = motivos_contagem["Quantidade"].sum()
-    motivos_contagem["Percentual"] = (motivos_contagem["Quantidade"] / total_nao_retido_motivos) * 100
-    motivos_contagem["Percentual"] = motivos_contagem["Percentual"].map("{:.2f}%".format)
-    
-    # Add total row
-    total_row = pd.DataFrame([["Total", total_nao_retido_motivos, "100.00%"]], columns=colunas_display)
-    df_motivos = pd.concat([motivos_contagem, total_row], ignore_index=True)
-    return df_motivos
-
-def calcular_tipos_retido(df_filtrado):
-    colunas_display = ["Tipo de Retido", "Quantidade", "Percentual"]
-    if "TipoRetido" not in df_filtrado.columns:
-        return pd.DataFrame([["Coluna 'Tipo de Retido' não encontrada.", "-", "-"]], columns=colunas_display)
-
-    df_retido_filtrado_tipo = df_filtrado[(df_filtrado["Status"] == "Retido") &
-                                          (df_filtrado["TipoRetido"].astype(str).str.startswith("Retido"))]
-    if df_retido_filtrado_tipo.empty:
-        return pd.DataFrame([["Nenhum 'Retido' com tipo específico encontrado.", "-", "-"]], columns=colunas_display)
-
-    tipos_retido_contagem = df_retido_filtrado_tipo["TipoRetido"].value_counts().reset_index()
-    tipos_retido_contagem.columns = ["Tipo de Retido", "Quantidade"]
-    total_retido_tipo = tipos_retido_contagem["Quantidade"].sum()
-    tipos_retido_contagem["Percentual"] = (tipos_retido_contagem["Quantidade"] / total_retido_tipo) * 100
-    tipos_retido_contagem["Percentual"] = tipos_retido_contagem["Percentual"].map("{:.2f}%".format)
-
-    # Add total row
-    total_row = pd.DataFrame([["Total", total_retido_tipo, "100.00%"]], columns=colunas_display)
-    df_tipos = pd.concat([tipos_retido_contagem, total_row], ignore_index=True)
-    return df_tipos
-
-def calcular_franquias_nao_retido(df_filtrado):
-    colunas_display = ["Franquia", "Quantidade", "Percentual"]
-    if "Franquia" not in df_filtrado.columns:
-        return pd.DataFrame([["Coluna 'Franquias' não encontrada.", "-", "-"]], columns=colunas_display)
-
-    df_nao_retido_franquia = df_filtrado[df_filtrado["Status"] == "Não Retido"]
-    if df_nao_retido_franquia.empty:
-        return pd.DataFrame([["Nenhum 'Não Retido' por franquia encontrado.", "-", "-"]], columns=colunas_display)
-
-    franquias_contagem = df_nao_retido_franquia["Franquia"].value_counts().reset_index()
-    franquias_contagem.columns = ["Franquia", "Quantidade"]
-    total_franquias = franquias_contagem["Quantidade"].sum()
-    franquias_contagem["Percentual"] = (franquias_contagem["Quantidade"] / total_franquias) * 100
-    franquias_contagem["Percentual"] = franquias_contagem["Percentual"].map("{:.2f}%".format)
-
-    # Add total row
-    total_row = pd.DataFrame([["Total", total_franquias, "100.00%"]], columns=colunas_display)
-    df_franquias = pd.concat([franquias_contagem, total_row], ignore_index=True)
-    return df_franquias
+# {cenário: faixas (decimal)} na ordem em que os cenários aparecem; linhas incompletas são ignoradas
+def cenarios_da_tabela(tabela):
+    cenarios = {}
+    for linha in tabela.dropna().itertuples(index=False):
+        cenario, lower, upper, value = linha
+        if str(cenario).strip():
+            cenarios.setdefault(str(cenario).strip(), []).append((lower / 100.0, upper / 100.0, float(value)))
+    return cenarios
 
 # Helper function to convert image to base64 for embedding in HTML (for better alignment control)
-import base64
+# O base64 fica em cache por mtime (inicializacao.imagem_base64), então reruns não releem o arquivo
 def get_img_as_base64(file_path):
     # Verifica se o arquivo existe antes de tentar abrir
-    if not os.path.exists(file_path):
+    data = imagem_base64(file_path)
+    if data is None:
         st.error(f"Erro: Imagem '{file_path}' não encontrada. Verifique o caminho.")
         return "" # Retorna string vazia para evitar erro no HTML
-    with open(file_path, "rb") as f:
-        data = f.read()
-    return base64.b64encode(data).decode()
+    return data
 
 # Streamlit App
 def main():
     st.set_page_config(layout="wide", page_title="Acompanhamento Retenção 📊")
 
+    # Na primeira execução do processo, carrega os dados e os agregados da seleção padrão numa thread
+    # enquanto o cabeçalho e a sidebar são montados
+    PARTIDA_FRIA.iniciar_preaquecimento(CONFIG_FILE)
+
     # Load initial configuration
     if 'usuarios_oficiais' not in st.session_state:
         st.session_state.usuarios_oficiais, \
@@ -421,6 +151,21 @@ def main():
         
         # Converte os nomes selecionados de volta para os valores usados no DataFrame
         grupos_selecionados = [grupos_disponiveis[nome] for nome in grupos_selecionados_nomes]
+
+        # Preenchido depois da carga, quando as datas disponíveis são conhecidas
+        filtro_periodo = st.container()
+
+        modo_historico = st.checkbox("Histórico mensal", value=False,
+                                     help=f"Compara os meses das exportações guardadas na pasta '{PASTA_HISTORICO}' (uma por mês).")
+
+        # Com esta opção as abas viram um seletor e só a visualização escolhida é calculada
+        abas_sob_demanda = st.checkbox("Calcular abas sob demanda", value=False,
+                                       help="Calcula apenas a tabela da aba selecionada, na primeira vez em que ela for aberta.")
+        diagnostico_ativo = st.checkbox("Diagnóstico de desempenho", value=False,
+                                        help=f"Mede o tempo, a memória e o uso de cache de cada etapa e grava as medições em '{ARQUIVO_LOG}'.")
+        top_k = st.number_input("Categorias por distribuição:", min_value=0, value=TOP_K_PADRAO, step=5,
+                                help="Motivos, tipos de retido e franquias mostram (e exportam) só as categorias mais frequentes; "
+                                     "as demais são somadas em 'Outros'. 0 mostra todas.")
         st.write("---")
 
         st.subheader("👥 Configurar Grupos de Usuários")
@@ -444,11 +189,7 @@ def main():
         if password == "Ecohouse1010":
             new_retention_bands = []
             for i, (lower, upper, value) in enumerate(st.session_state.retention_bands):
-                band_name = ""
-                if i == 0: band_name = "0,00% a 55,00%"
-                elif i == 1: band_name = "55,01% a 59,00%"
-                elif i == 2: band_name = "59,01% a 65,00%"
-                elif i == 3: band_name = "65,01% a Acima"
+                band_name = nome_faixa(lower, upper, ultima=i == len(st.session_state.retention_bands) - 1)
 
                 st.markdown(f"**Faixa {i+1}:** {band_name}")
                 col1_band, col2_band = st.columns(2) # Colunas dentro do expander
@@ -469,60 +210,121 @@ def main():
         st.markdown("Desenvolvido por **Pedro Otávio Fregulhe Siqueira**")
 
 
-    # Carregar o arquivo Excel diretamente do caminho fixo
+    # A planilha (e as exportações da pasta de importações) são importadas para a base local pelo
+    # monitor de dados, que as observa em segundo plano: quando mudam, a base e o dataset novos são
+    # preparados enquanto as sessões continuam usando o snapshot anterior. O frame processado fica no
+    # repositório do processo e é o mesmo objeto para todas as sessões (nada de cópia por sessão).
+    dataset = None
+    coleta = iniciar_coleta(diagnostico_ativo)
     try:
-        if not os.path.exists(EXCEL_FILE_PATH):
+        usuarios = (st.session_state.usuarios_oficiais, st.session_state.usuarios_backup, st.session_state.usuarios_staff)
+        snapshot = MONITOR_DADOS.obter(usuarios)
+        if not snapshot.arquivos:
             st.error(f"Erro: O arquivo não foi encontrado no caminho especificado: `{EXCEL_FILE_PATH}`")
             st.info("Por favor, verifique se o arquivo 'Retenção - Macro.xlsx' está na mesma pasta do script no repositório.")
-            st.session_state.df_original = None
         else:
-            df_original = pd.read_excel(EXCEL_FILE_PATH)
-            st.session_state.df_original = process_data(df_original.copy(), st.session_state.usuarios_oficiais, st.session_state.usuarios_backup, st.session_state.usuarios_staff)
+            fingerprint = snapshot.fingerprint
+            dataset = MONITOR_DADOS.dataset(snapshot, usuarios)
+            st.sidebar.caption(f"Dados compartilhados em memória: {REPOSITORIO_DATASETS.memoria_bytes / 1024 ** 2:.1f} MB")
             
-            # Obter e exibir a data de última atualização do arquivo (apenas data no formato desejado)
-            last_modified_timestamp = os.path.getmtime(EXCEL_FILE_PATH)
-            last_modified_datetime = datetime.fromtimestamp(last_modified_timestamp)
+            # Data de última atualização dos arquivos do snapshot servido (apenas data no formato desejado)
+            last_modified_datetime = datetime.fromtimestamp(snapshot.modificado_em)
             
             dia = last_modified_datetime.day
             mes = MESES_PORTUGUES[last_modified_datetime.month - 1] # -1 pois a lista é base 0
             ano = last_modified_datetime.year
             
             st.markdown(f"**Última atualização dos dados:** {dia} de {mes} de {ano} 🗓️")
+            versao = f"Versão {fingerprint}, publicada às {datetime.fromtimestamp(snapshot.publicado_em):%H:%M:%S}"
+            if MONITOR_DADOS.atualizando:
+                versao += " · nova versão dos dados em preparação"
+            elif MONITOR_DADOS.erro is not None:
+                versao += f" · falha ao atualizar: {MONITOR_DADOS.erro}"
+            st.caption(versao)
 
     except Exception as e:
         st.error(f"Erro ao carregar ou processar o arquivo: {e}")
-        st.session_state.df_original = None
-
-    if 'df_original' in st.session_state and st.session_state.df_original is not None:
-        
-        # Filtra o DataFrame original com base nos grupos selecionados na sidebar
-        df_filtrado = st.session_state.df_original[st.session_state.df_original["Operação"].isin(grupos_selecionados)].copy()
-
-        if df_filtrado.empty:
-            st.warning("Nenhum dado encontrado para os filtros selecionados. Ajuste os filtros de usuários ou verifique o arquivo de dados.")
+        dataset = None
+
+    if dataset is not None:
+
+        data_inicial, data_final = dataset.intervalo_datas
+        periodo = (None, None)
+        if data_final is not None:
+            with filtro_periodo:
+                st.subheader("Período")
+                # A base acumula as exportações de todos os meses importados; se ela tem datas
+                # anteriores à planilha principal, o padrão é o período da planilha principal
+                periodo_atual = periodo_planilha(snapshot.inicio_planilha, data_inicial)
+                opcoes_periodo = PERIODOS_PREDEFINIDOS
+                ajuda_periodo = f"Períodos contados a partir da data mais recente dos dados ({data_final:%d/%m/%Y})."
+                if periodo_atual != (None, None):
+                    opcoes_periodo = [PERIODO_PLANILHA] + PERIODOS_PREDEFINIDOS
+                    ajuda_periodo += (f" \"{PERIODO_PLANILHA}\" vai de {periodo_atual[0]:%d/%m/%Y}, primeira data da planilha"
+                                      f" principal, em diante; \"{PERIODOS_PREDEFINIDOS[0]}\" inclui os meses anteriores"
+                                      f" guardados na base local desde {data_inicial:%d/%m/%Y}.")
+                periodo_nome = st.selectbox("Datas de criação:", opcoes_periodo, help=ajuda_periodo)
+                if periodo_nome == PERIODO_PLANILHA:
+                    periodo = periodo_atual
+                elif periodo_nome == PERIODO_PERSONALIZADO:
+                    datas_escolhidas = st.date_input("Intervalo:", value=(data_inicial, data_final),
+                                                     min_value=data_inicial, max_value=data_final, format="DD/MM/YYYY")
+                    if len(datas_escolhidas) == 2:
+                        periodo = tuple(datas_escolhidas)
+                    elif datas_escolhidas:
+                        periodo = (datas_escolhidas[0], datas_escolhidas[0])
+                else:
+                    periodo = intervalo_periodo(periodo_nome, data_final)
+
+        # Chaves de memoização (as mesmas do preaquecimento; ver memoizacao.ChavesPainel). A versão
+        # de cada grupo selecionado substitui a configuração de usuários inteira, então salvar uma
+        # mudança que não mexe nesses grupos mantém os resultados em cache.
+        chaves = ChavesPainel(fingerprint, dataset.chave_grupos(grupos_selecionados), dataset.chave_grupos(GRUPOS_OPERACAO),
+                              periodo, top_k, st.session_state.retention_bands)
+        chave_filtro, chave_faixas, chave_distribuicoes = chaves.filtro, chaves.faixas, chaves.distribuicoes
+
+        def memo(chave, nome, calcular, contar_linhas=None):
+            return obter_medido(CACHE_CALCULOS, chave + (nome,), nome, calcular, contar_linhas)
+
+        # Cubo dos grupos e do período selecionados na sidebar, montado a partir dos cubos parciais de
+        # cada grupo já recortados no período (sem varrer nem copiar o frame); todas as abas e a
+        # exportação saem deste cubo
+        cubo = obter_medido(CACHE_CALCULOS, chaves.cubo, "cubo", lambda: dataset.cubo_grupos(grupos_selecionados, periodo),
+                            lambda cubo: cubo.total_linhas)
+
+        if cubo.empty:
+            st.warning("Nenhum dado encontrado para os filtros selecionados. Ajuste os filtros de usuários e de período ou verifique o arquivo de dados.")
+            mostrar_diagnostico(coleta)
             return
 
         st.markdown("---") # Esta barra permanece para separar a seção de dados da seção de KPIs
         # --- Seção de Indicadores de Performance ---
         st.header("Indicadores de Performance Retenção") # Título alterado
 
-        # Recalcular resumo para pegar os valores consolidados e os diários
-        df_resumo, valor_fatura, faixa_faturamento, \
-        total_retido_geral_abs, total_nao_retido_geral_abs, total_intencoes_cancelamento_calculado_geral, \
-        percent_faturamento_geral_sum_str, percent_conversao_geral_sum_str, \
-        retido_diario, nao_retido_diario, nao_retido_a_desconsiderar_diario = calcular_resumo_retencao(df_filtrado, st.session_state.retention_bands)
+        # Resumo numérico; a formatação em texto só acontece abaixo, na exibição. Sai das visões
+        # materializadas na carga do dataset: no período inteiro o resumo de todas as combinações
+        # de grupos é montado de uma vez por configuração de faixas e a seleção é só uma consulta
+        # ao dicionário; com um período, as contagens diárias da combinação são recortadas nas datas.
+        visoes = dataset.visoes_grupos
+        if periodo == (None, None):
+            resumos = obter_medido(CACHE_CALCULOS, chaves.resumos_grupos, "resumos_grupos",
+                                   lambda: apurar_resumos_grupos(visoes, st.session_state.retention_bands), len)
+            resumo = resumos[visoes.chave(grupos_selecionados)]
+        else:
+            resumo = obter_medido(CACHE_CALCULOS, chaves.resumo, "resumo",
+                                  lambda: apurar_resumo_grupos(visoes, grupos_selecionados, st.session_state.retention_bands, periodo))
 
         col_kpi1, col_kpi2, col_kpi3, col_kpi4, col_kpi5 = st.columns(5) # Voltando para 5 colunas
         with col_kpi1:
-            st.metric(label="✅ Retidos", value=f"{total_retido_geral_abs}") 
+            st.metric(label="✅ Retidos", value=f"{resumo.total_retido}") 
         with col_kpi2:
-            st.metric(label="❌ Não Retidos", value=f"{total_nao_retido_geral_abs}") 
+            st.metric(label="❌ Não Retidos", value=f"{resumo.total_nao_retido}") 
         with col_kpi3:
-            st.metric(label="📝 Intenções de Cancelamento", value=f"{total_intencoes_cancelamento_calculado_geral}") 
+            st.metric(label="📝 Intenções de Cancelamento", value=f"{resumo.total_intencoes}") 
         with col_kpi4:
-            st.metric(label="📈 Conversão Faturamento", value=f"{percent_faturamento_geral_sum_str}") 
+            st.metric(label="📈 Conversão Faturamento", value=formatar_percentual(resumo.conversao_faturamento_geral)) 
         with col_kpi5:
-            st.metric(label="📈 Conversão Ecohouse", value=f"{percent_conversao_geral_sum_str}") 
+            st.metric(label="📈 Conversão Ecohouse", value=formatar_percentual(resumo.conversao_ecohouse_geral)) 
             
         st.markdown("---")
         # --- Fim da Seção de Indicadores de Performance ---
@@ -530,122 +332,247 @@ def main():
         st.subheader("📅 Resumo Diário de Retenção")
         col_metric1, col_metric2 = st.columns(2)
         with col_metric1:
-            st.metric("💰 Valor Fatura Estimado", f"R$ {valor_fatura:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")) 
+            st.metric("💰 Valor Fatura Estimado", formatar_moeda(resumo.valor_fatura)) 
         with col_metric2:
-            st.metric("📊 Faixa de Faturamento", faixa_faturamento) 
-        st.dataframe(df_resumo, hide_index=True, use_container_width=True)
+            st.metric("📊 Faixa de Faturamento", resumo.faixa_faturamento) 
+        st.dataframe(resumo.formatar(), hide_index=True, use_container_width=True)
+
+        # Compara propostas de faixas com as atuais sobre os mesmos dados filtrados; todos os
+        # cenários são avaliados juntos, no consolidado e por dia, grupo e login
+        with st.expander("🧮 Simulação de Faixas de Conversão"):
+            st.caption("Cada nome de cenário forma uma tabela de faixas (edite, acrescente ou remova linhas). "
+                       "O primeiro cenário é a referência da coluna Diferença.")
+            faixas_editadas = st.data_editor(tabela_cenarios_faixas(st.session_state.retention_bands), num_rows="dynamic",
+                                             hide_index=True, use_container_width=True, key="simulacao_faixas")
+            cenarios = cenarios_da_tabela(faixas_editadas)
+            if cenarios:
+                chave_cenarios = tuple((nome, tuple(faixas)) for nome, faixas in cenarios.items())
+                simulacao = memo(chave_filtro + (chave_cenarios,), "simulacao_faixas", lambda: apurar_simulacao_faixas(cubo, cenarios))
+                st.dataframe(simulacao.formatar(), hide_index=True, use_container_width=True)
+                nivel = st.radio("Valor Fatura por", ["Dia", "Grupo", "Login"], horizontal=True, key="simulacao_nivel")
+                por_nivel = simulacao.por_nivel(nivel)
+                for cenario in simulacao.cenarios:
+                    por_nivel[cenario] = por_nivel[cenario].map(formatar_moeda)
+                st.dataframe(por_nivel, hide_index=True, use_container_width=True)
 
         st.markdown("---")
 
-        # Create tabs for different analytical views
-        tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
-            "❌ Não Retidos",
-            "✅ Retidos",
-            "📈 Conversão por Usuário",
-            "🚫 Motivos de Cancelamento",
-            "🏷️ Tipos de Retido",
-            "🏢 Franquias (Não Retido)"
-        ])
-
-        with tab1:
-            st.subheader("Detalhes de Não Retidos por Usuário e Dia")
-            st.info("Mostra a contagem de 'Não Retidos' por usuário e por dia para os grupos selecionados.")
-            df_nao_retido = calcular_detalhe_por_status(df_filtrado, "Não Retido")
-            st.dataframe(df_nao_retido, hide_index=True, use_container_width=True)
-
-        with tab2:
-            st.subheader("Detalhes de Retidos por Usuário e Dia")
-            st.info("Mostra a contagem de 'Retidos' por usuário e por dia para os grupos selecionados.")
-            df_retido = calcular_detalhe_por_status(df_filtrado, "Retido")
-            st.dataframe(df_retido, hide_index=True, use_container_width=True)
-
-        with tab3:
-            st.subheader("Percentual de Conversão por Usuário")
-            st.info("Calcula o percentual de contratos 'Retidos' em relação ao total de intenções de cancelamento por usuário.")
-            df_conversao_usuario = calcular_conversao_por_usuario(df_filtrado)
-            st.dataframe(df_conversao_usuario, hide_index=True, use_container_width=True)
-
-        with tab4:
-            st.subheader("Análise dos Motivos de Cancelamento (Não Retidos)")
-            st.info("Distribuição dos motivos pelos quais os contratos não foram retidos.")
-            df_motivos = calcular_motivos_cancelamento(df_filtrado)
-            st.dataframe(df_motivos, hide_index=True, use_container_width=True)
-
-        with tab5:
-            st.subheader("Análise dos Tipos de Retido")
-            st.info("Detalhes sobre os tipos específicos de retenção para os contratos 'Retidos'.")
-            df_tipos_retido = calcular_tipos_retido(df_filtrado)
-            st.dataframe(df_tipos_retido, hide_index=True, use_container_width=True)
-
-        with tab6:
-            st.subheader("Análise de Franquias (Não Retido)")
-            st.info("Distribuição dos contratos 'Não Retidos' por franquia.")
-            df_franquias_nao_retido = calcular_franquias_nao_retido(df_filtrado)
-            st.dataframe(df_franquias_nao_retido, hide_index=True, use_container_width=True)
+        # Abas de análise: (título, subtítulo, descrição) de cada tabela de analise.tabelas_abas,
+        # com a chave e o cálculo dela
+        abas = [
+            (*TEXTOS_ABAS[nome], chaves.tabela(nome, usa_top_k), nome, calcular)
+            for nome, usa_top_k, calcular in tabelas_abas(cubo, top_k)
+        ]
+
+        def mostrar_aba(subtitulo, descricao, chave, nome, calcular):
+            st.subheader(subtitulo)
+            st.info(descricao)
+            tabela = obter_medido(CACHE_CALCULOS, chave, nome, calcular)
+            st.dataframe(tabela.formatar(), hide_index=True, use_container_width=True)
+            cauda = getattr(tabela, "resumo_cauda", lambda: None)()
+            if cauda:
+                st.caption(cauda)
+
+        if abas_sob_demanda:
+            titulos = [aba[0] for aba in abas]
+            titulo_escolhido = st.radio("Visualização", titulos, horizontal=True, label_visibility="collapsed")
+            mostrar_aba(*abas[titulos.index(titulo_escolhido)][1:])
+        else:
+            # Create tabs for different analytical views
+            for tab, aba in zip(st.tabs([aba[0] for aba in abas]), abas):
+                with tab:
+                    mostrar_aba(*aba[1:])
+
+        # Cruzamento de duas dimensões, lido do cubo de contagens (top-k em cada eixo)
+        with st.expander("🔀 Cruzamento de distribuições"):
+            dimensoes = list(DIMENSOES_CRUZAMENTO)
+            col_linhas, col_colunas, col_status = st.columns(3)
+            with col_linhas:
+                dimensao_linhas = st.selectbox("Linhas:", dimensoes, index=dimensoes.index("Motivo"), key="cruzamento_linhas")
+            with col_colunas:
+                dimensao_colunas = st.selectbox("Colunas:", dimensoes, index=dimensoes.index("Franquia"), key="cruzamento_colunas")
+            with col_status:
+                status_cruzamento = st.selectbox("Status:", ["Não Retido", "Retido"], key="cruzamento_status")
+            if dimensao_linhas == dimensao_colunas:
+                st.info("Escolha dimensões diferentes para linhas e colunas.")
+            else:
+                cruzamento = memo(chave_distribuicoes + (dimensao_linhas, dimensao_colunas, status_cruzamento), "cruzamento",
+                                  lambda: apurar_cruzamento(cubo, dimensao_linhas, dimensao_colunas, status_cruzamento, top_k))
+                if cruzamento.empty:
+                    st.info(f"Nenhum '{status_cruzamento}' para os filtros selecionados.")
+                else:
+                    st.dataframe(cruzamento.formatar(), hide_index=True, use_container_width=True)
+
+        # Tendências: rollups diário, semanal e mensal por login, montados a partir das séries
+        # diárias por login do dataset (numa carga incremental, só os dias alterados e as semanas
+        # e os meses deles são refeitos); os gráficos saem desses rollups, nunca das linhas
+        st.markdown("---")
+        st.header("📈 Tendências")
+        rollup = memo(chave_filtro, "rollup_tendencias",
+                      lambda: apurar_rollup(dataset, grupos_selecionados, periodo))
+        granularidade = st.radio("Agrupar por:", GRANULARIDADES, horizontal=True, key="tendencia_granularidade")
+        tendencia = rollup.tendencia(granularidade)
+        totais = tendencia.totais()
+        conversoes = totais[["Conversão Ecohouse", "Conversão Faturamento"]]
+        if granularidade == "Dia":
+            conversoes = conversoes.assign(**{"Conversão Faturamento (7 dias)": tendencia.conversao_movel(7)})
+        col_conversao, col_contagens = st.columns(2)
+        with col_conversao:
+            st.caption("Conversão (%)")
+            st.line_chart(conversoes)
+        with col_contagens:
+            st.caption("Intenções de cancelamento")
+            st.bar_chart(pd.DataFrame({
+                "Retido": totais["Retido"],
+                "Não Retido": totais["Não Retido"] - totais["Desconsiderado"],
+                "Não Retido (motivos desconsiderados)": totais["Desconsiderado"],
+            }))
+        logins_tendencia = st.multiselect("Conversão Faturamento por login:", sorted(tendencia.contagens.index.unique("Login")),
+                                          key="tendencia_logins")
+        if logins_tendencia:
+            st.line_chart(tendencia.por_login(logins_tendencia))
+        with st.expander("Tabela de tendências"):
+            st.dataframe(tendencia.formatar(), hide_index=True, use_container_width=True)
+
+        # Detalhe de um operador: a série diária vem do índice por login montado na carga do
+        # dataset e os motivos só leem as linhas dele, sem reagrupar as tabelas de todos os logins
+        st.markdown("---")
+        st.header("🔎 Detalhe por Login")
+        login_escolhido = st.selectbox("Login:", dataset.logins(grupos_selecionados), index=None,
+                                       placeholder="Digite ou escolha um login", key="detalhe_login")
+        if login_escolhido:
+            detalhe = memo(chave_filtro + (login_escolhido, top_k), "detalhe_login",
+                           lambda: apurar_detalhe_login(dataset, login_escolhido, periodo, top_k))
+            if detalhe.empty:
+                st.info(f"Nenhum atendimento de {login_escolhido} no período selecionado.")
+            else:
+                consolidado = detalhe.consolidado()
+                col_grupo, col_retido, col_nao_retido, col_conversao = st.columns(4)
+                col_grupo.metric("👤 Grupo", detalhe.operacao or "-")
+                col_retido.metric("✅ Retidos", int(consolidado["Retido"]))
+                col_nao_retido.metric("❌ Não Retidos", int(consolidado["Não Retido"]))
+                col_conversao.metric("📈 Conversão Faturamento", formatar_percentual(consolidado["Conversão Faturamento"])
+                                     if pd.notna(consolidado["Conversão Faturamento"]) else "-")
+                col_curva, col_motivos = st.columns(2)
+                with col_curva:
+                    st.caption("Conversão por dia (%)")
+                    st.line_chart(detalhe.serie()[["Conversão Ecohouse", "Conversão Faturamento"]])
+                with col_motivos:
+                    st.caption("Motivos dos não retidos")
+                    st.dataframe(detalhe.motivos.formatar(), hide_index=True, use_container_width=True)
+                with st.expander(f"Histórico diário de {login_escolhido}"):
+                    st.dataframe(detalhe.formatar(), hide_index=True, use_container_width=True)
+
+        # Comparação mês a mês: cada planilha do histórico é lida uma vez (em paralelo) e cada mês
+        # é resumido à parte, então trocar só a planilha do mês atual não refaz os outros meses
+        if modo_historico:
+            st.markdown("---")
+            st.header("📆 Histórico Mensal")
+            planilhas = planilhas_historico()
+            if not planilhas:
+                st.info(f"Coloque uma exportação por mês na pasta '{PASTA_HISTORICO}' para comparar os meses.")
+            else:
+                with medir_etapa("historico_carga") as etapa:
+                    historico = carregar_historico(planilhas, contexto=CONTEXTO_PROCESSOS)
+                    etapa.linhas = sum(len(particao) for particao in historico.particoes.values())
+                with medir_etapa("historico_resumos"):
+                    evolucao = apurar_evolucao_mensal(historico, usuarios, grupos_selecionados, st.session_state.retention_bands)
+                st.dataframe(evolucao.formatar(), hide_index=True, use_container_width=True)
+                st.line_chart(evolucao.tabela().set_index("Mês")[["Conversão Ecohouse", "Conversão Faturamento"]])
 
         st.markdown("---")
         # Export functionality
         st.subheader("📥 Exportar Análise Completa")
         st.info("Clique no botão abaixo para gerar um arquivo Excel com todas as tabelas da análise.")
         
+        # Tabelas que faltam no cache são calculadas em paralelo (cada uma só lê o cubo)
+        def gerar_exportacao():
+            with ThreadPoolExecutor(max_workers=MAX_THREADS_EXPORTACAO) as executor:
+                futuros = {
+                    nome: executor.submit(obter_medido, CACHE_CALCULOS, chave, nome, calcular)
+                    for _, _, _, chave, nome, calcular in abas
+                }
+                tabelas = {nome: futuro.result() for nome, futuro in futuros.items()}
+            return gerar_planilha_analise(
+                resumo,
+                tabelas["detalhe_nao_retido"],
+                tabelas["detalhe_retido"],
+                tabelas["conversao_usuario"],
+                tabelas["motivos"],
+                tabelas["tipos_retido"],
+                tabelas["franquias"],
+            ).getvalue()
+
         if st.button("Gerar Arquivo de Exportação (.xlsx) 📥"):
-            # Recalculate all DFs with current filters for export
-            df_resumo_export, _, _, _, _, _, _, _, _, _, _ = calcular_resumo_retencao(df_filtrado, st.session_state.retention_bands)
-            
-            df_nao_retido_export = calcular_detalhe_por_status(df_filtrado, "Não Retido")
-            df_retido_export = calcular_detalhe_por_status(df_filtrado, "Retido")
-            
-            df_conversao_usuario_export = calcular_conversao_por_usuario(df_filtrado)
-            df_motivos_export = calcular_motivos_cancelamento(df_filtrado)
-            df_tipos_retido_export = calcular_tipos_retido(df_filtrado)
-            df_franquias_nao_retido_export = calcular_franquias_nao_retido(df_filtrado)
-
-            import io
-            excel_buffer = io.BytesIO()
-
-            with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as output:
-                if df_resumo_export is not None:
-                    df_resumo_export.to_excel(output, sheet_name='Resumo de Retenção', index=False)
-                if df_nao_retido_export is not None:
-                    df_nao_retido_export.to_excel(output, sheet_name='Nao Retidos', index=False)
-                if df_retido_export is not None:
-                    df_retido_export.to_excel(output, sheet_name='Retidos', index=False)
-                if df_conversao_usuario_export is not None:
-                    df_conversao_usuario_export.to_excel(output, sheet_name='Conversao', index=False)
-                if df_motivos_export is not None:
-                    # Remove 'Total' row before exporting if it exists
-                    if 'Motivo' in df_motivos_export.columns and 'Total' in df_motivos_export['Motivo'].values:
-                        df_export_motivos = df_motivos_export[df_motivos_export['Motivo'] != 'Total'].copy()
-                    else:
-                        df_export_motivos = df_motivos_export.copy()
-                    df_export_motivos.to_excel(output, sheet_name='Motivos Cancelamento', index=False)
-                if df_tipos_retido_export is not None:
-                    # Remove 'Total' row before exporting if it exists
-                    if 'Tipo de Retido' in df_tipos_retido_export.columns and 'Total' in df_tipos_retido_export['Tipo de Retido'].values:
-                        df_export_tipos = df_tipos_retido_export[df_tipos_retido_export['Tipo de Retido'] != 'Total'].copy()
-                    else:
-                        df_export_tipos = df_tipos_retido_export.copy()
-                    df_export_tipos.to_excel(output, sheet_name='Tipos Retido', index=False)
-                if df_franquias_nao_retido_export is not None:
-                    # Remove 'Total' row before exporting if it exists
-                    if 'Franquia' in df_franquias_nao_retido_export.columns and 'Total' in df_franquias_nao_retido_export['Franquia'].values:
-                        df_export_franquias = df_franquias_nao_retido_export[df_franquias_nao_retido_export['Franquia'] != 'Total'].copy()
-                    else:
-                        df_export_franquias = df_franquias_nao_retido_export.copy()
-                    df_export_franquias.to_excel(output, sheet_name='Franquias Nao Retido', index=False)
-
-            excel_buffer.seek(0) # Volta ao início do buffer para leitura
+            # O arquivo pronto fica no cache compartilhado: outro clique (ou outra sessão) com os
+            # mesmos dados e filtros recebe os mesmos bytes sem gerar de novo
+            excel_bytes = memo(chave_faixas + (top_k,), "exportacao_xlsx", gerar_exportacao)
 
             st.download_button(
                 label="Download Excel da Análise ✅",
-                data=excel_buffer,
+                data=excel_bytes,
                 file_name="analise_retencao_completa.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
             )
             st.success("Arquivo 'analise_retencao_completa.xlsx' gerado e pronto para download!")
+
+        # Uma planilha (as mesmas abas do botão acima) por grupo, franquia ou login dos dados
+        # filtrados, montadas em paralelo e gravadas direto num ZIP em disco
+        with st.expander("📦 Exportação em lote (um arquivo por entidade)"):
+            dimensao_lote = st.selectbox("Um arquivo por:", list(DIMENSOES_LOTE), key="dimensao_lote")
+            if st.button("Gerar ZIP 📦"):
+                barra = st.progress(0.0, text="Gerando planilhas...")
+
+                def gerar_lote():
+                    return gerar_zip_lote(
+                        cubo, dimensao_lote, st.session_state.retention_bands, novo_caminho_lote(dimensao_lote), top_k,
+                        progresso=lambda feitas, total: barra.progress(feitas / total, text=f"{feitas} de {total} planilhas"),
+                        contexto=CONTEXTO_PROCESSOS,
+                    )
+
+                chave_lote = chave_faixas + (top_k, dimensao_lote)
+                caminho_zip, quantidade = memo(chave_lote, "exportacao_lote", gerar_lote)
+                if not os.path.exists(caminho_zip):
+                    CACHE_CALCULOS.invalidar(lambda chave: chave == chave_lote + ("exportacao_lote",))
+                    caminho_zip, quantidade = memo(chave_lote, "exportacao_lote", gerar_lote)
+                barra.progress(1.0, text=f"{quantidade} planilhas")
+                with open(caminho_zip, "rb") as arquivo_zip:
+                    st.download_button(
+                        label="Download ZIP ✅",
+                        data=arquivo_zip,
+                        file_name=f"analise_retencao_por_{nome_arquivo(dimensao_lote)}.zip",
+                        mime="application/zip",
+                    )
     else:
         st.info("Por favor, verifique o caminho do arquivo Excel e os dados para iniciar a análise.")
 
+    mostrar_diagnostico(coleta)
+
+
+# Tabela das medições desta execução no fim da sidebar, gravadas também no log JSON lines. A
+# partida a frio (preaquecimento e primeira execução do processo) entra nas medições uma vez.
+def mostrar_diagnostico(coleta):
+    primeira_execucao = PARTIDA_FRIA.registrar_execucao()
+    if coleta is None:
+        return
+    if primeira_execucao:
+        if PARTIDA_FRIA.preaquecimento is not None:
+            registrar_etapa("preaquecimento", PARTIDA_FRIA.preaquecimento)
+        registrar_etapa("partida_fria", PARTIDA_FRIA.primeira_execucao)
+    finalizar_coleta(coleta)
+    with st.sidebar.expander("⏱️ Diagnóstico de desempenho", expanded=True):
+        st.dataframe(coleta.registros(), hide_index=True, use_container_width=True)
+        taxa_acerto = CACHE_CALCULOS.acertos / max(1, CACHE_CALCULOS.acertos + CACHE_CALCULOS.falhas) * 100
+        st.caption(f"Cache de cálculos: {len(CACHE_CALCULOS)} entradas, {CACHE_CALCULOS.acertos} acertos, "
+                   f"{CACHE_CALCULOS.falhas} falhas ({taxa_acerto:.0f}% de acerto) desde o início do processo.")
+        partida = f"Partida a frio: primeira página pronta {PARTIDA_FRIA.primeira_execucao:.2f} s após o início do processo"
+        if PARTIDA_FRIA.preaquecimento is not None:
+            partida += f", preaquecimento em {PARTIDA_FRIA.preaquecimento:.2f} s"
+        if PARTIDA_FRIA.erro is not None:
+            partida += f" (falha no preaquecimento: {PARTIDA_FRIA.erro})"
+        st.caption(partida + ".")
+        st.caption(f"Medições gravadas em `{ARQUIVO_LOG}`.")
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,144 @@
+# Geração da análise completa sem o navegador (ex.: agendada no cron), para uma ou mais planilhas.
+# Não importa o Streamlit; cada planilha é processada num processo separado.
+#
+#   python retencao_cli.py "Retenção - Macro.xlsx" --grupos oficiais backup --periodo "Este mês"
+#   python retencao_cli.py exportacoes/*.xlsx --formato parquet --saida relatorios --processos 4
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from agregacao import montar_cubo
+from analise import (
+    CONFIG_FILE, EXCEL_FILE_PATH, MOTIVOS_A_DESCONSIDERAR_PADRAO, PERIODO_PERSONALIZADO, PERIODOS_PREDEFINIDOS,
+    TOP_K_PADRAO, apurar_analise_completa, carregar_dados, config_padrao, intervalo_periodo, ler_config,
+)
+from exportacao import gerar_planilha_analise, nome_arquivo, tabelas_exportacao
+
+# Mesmos nomes de grupo da sidebar do painel
+GRUPOS_CLI = {
+    "oficiais": "Retenção",
+    "backup": "Backup",
+    "staff": "Supervisão",
+    "demais": "Demais Operações",
+}
+FORMATOS_SAIDA = ("xlsx", "csv", "parquet")
+
+
+def _data(texto):
+    try:
+        return date.fromisoformat(texto)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"data inválida (use AAAA-MM-DD): {texto}")
+
+
+# Prefixo dos arquivos de saída de cada planilha: o nome dela, mais o nome da pasta quando outra
+# planilha da lista tem o mesmo nome (ex.: exportações mensais "junho/Retenção - Macro.xlsx" e
+# "julho/Retenção - Macro.xlsx") e um número se ainda assim coincidirem, para dois processos nunca
+# gravarem no mesmo caminho
+def prefixos_saida(arquivos):
+    nomes = [os.path.splitext(os.path.basename(arquivo))[0] for arquivo in arquivos]
+    repetidos = {nome.casefold() for nome in nomes if sum(outro.casefold() == nome.casefold() for outro in nomes) > 1}
+    prefixos, usados = [], set()
+    for arquivo, nome in zip(arquivos, nomes):
+        pasta = os.path.basename(os.path.dirname(os.path.abspath(arquivo)))
+        if nome.casefold() in repetidos and pasta:
+            nome = f"{pasta}_{nome}"
+        prefixo, sufixo = nome, 2
+        while prefixo.casefold() in usados:
+            prefixo, sufixo = f"{nome}_{sufixo}", sufixo + 1
+        usados.add(prefixo.casefold())
+        prefixos.append(prefixo)
+    return prefixos
+
+
+# Processa uma planilha e grava a análise em `pasta_saida`; devolve os caminhos gravados. Os
+# arquivos começam com `prefixo` (padrão: o nome da planilha; ver prefixos_saida).
+def gerar_relatorio(file_path, usuarios, retention_bands, grupos, periodo, inicio, fim, formato, pasta_saida, top_k=TOP_K_PADRAO,
+                    prefixo=None):
+    df = carregar_dados(file_path, *usuarios)
+    df = df[df["Operação"].isin(grupos)]
+    if periodo != PERIODOS_PREDEFINIDOS[0] and not df.empty:
+        inicio, fim = intervalo_periodo(periodo, df["DataCriacao"].max().date())
+    cubo = montar_cubo(df, MOTIVOS_A_DESCONSIDERAR_PADRAO).recortar_periodo(inicio, fim)
+    if cubo.empty:
+        raise ValueError(f"nenhum dado para os grupos e o período selecionados em {file_path}")
+
+    tabelas = apurar_analise_completa(cubo, retention_bands, top_k)
+    base = os.path.join(pasta_saida, prefixo or os.path.splitext(os.path.basename(file_path))[0])
+    if formato == "xlsx":
+        caminho = f"{base}_analise.xlsx"
+        with open(caminho, "wb") as f:
+            f.write(gerar_planilha_analise(*tabelas).getvalue())
+        return [caminho]
+
+    caminhos = []
+    for nome_aba, tabela, _ in tabelas_exportacao(*tabelas):
+        caminho = f"{base}_{nome_arquivo(nome_aba)}.{formato}"
+        if formato == "csv":
+            tabela.to_csv(caminho, index=False, encoding="utf-8-sig")
+        else:
+            tabela.to_parquet(caminho, index=False)
+        caminhos.append(caminho)
+    return caminhos
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(description="Gera a análise de retenção (a mesma da exportação do painel) sem o Streamlit.")
+    parser.add_argument("arquivos", nargs="*", default=[EXCEL_FILE_PATH],
+                        help=f"planilhas exportadas (padrão: '{EXCEL_FILE_PATH}')")
+    parser.add_argument("--config", default=CONFIG_FILE, help="arquivo de configuração de usuários e faixas (padrão: %(default)s)")
+    parser.add_argument("--grupos", nargs="+", choices=list(GRUPOS_CLI), default=list(GRUPOS_CLI),
+                        help="grupos de usuários incluídos (padrão: todos)")
+    parser.add_argument("--periodo", choices=[p for p in PERIODOS_PREDEFINIDOS if p != PERIODO_PERSONALIZADO],
+                        help=f"período contado a partir da data mais recente de cada planilha (padrão: {PERIODOS_PREDEFINIDOS[0]}); "
+                             "não pode ser combinado com --inicio/--fim")
+    parser.add_argument("--inicio", type=_data, help="primeira data incluída (AAAA-MM-DD)")
+    parser.add_argument("--fim", type=_data, help="última data incluída (AAAA-MM-DD)")
+    parser.add_argument("--formato", choices=FORMATOS_SAIDA, default="xlsx",
+                        help="xlsx (uma planilha com todas as abas) ou uma tabela por arquivo em csv/parquet")
+    parser.add_argument("--saida", default=".", help="pasta de destino (padrão: pasta atual)")
+    parser.add_argument("--top-k", type=int, default=TOP_K_PADRAO,
+                        help="categorias por distribuição (motivos, tipos de retido, franquias); as demais vão para 'Outros', 0 = todas (padrão: %(default)s)")
+    parser.add_argument("--processos", type=int, default=1, help="planilhas processadas em paralelo (padrão: %(default)s)")
+    return parser
+
+
+def main(argv=None):
+    parser = criar_parser()
+    args = parser.parse_args(argv)
+    if args.periodo is not None and (args.inicio is not None or args.fim is not None):
+        parser.error("--periodo não pode ser combinado com --inicio/--fim")
+    periodo = args.periodo or PERIODOS_PREDEFINIDOS[0]
+    try:
+        usuarios_oficiais, usuarios_backup, usuarios_staff, retention_bands = ler_config(args.config)
+    except json.JSONDecodeError:
+        print(f"Aviso: '{args.config}' corrompido ou inválido. Usando valores padrão.", file=sys.stderr)
+        usuarios_oficiais, usuarios_backup, usuarios_staff, retention_bands = config_padrao()
+
+    os.makedirs(args.saida, exist_ok=True)
+    parametros = (
+        (usuarios_oficiais, usuarios_backup, usuarios_staff), retention_bands,
+        [GRUPOS_CLI[g] for g in args.grupos], periodo, args.inicio, args.fim, args.formato, args.saida, args.top_k,
+    )
+
+    falhas = 0
+    with ProcessPoolExecutor(max_workers=max(1, min(args.processos, len(args.arquivos)))) as executor:
+        futuros = [
+            (arquivo, executor.submit(gerar_relatorio, arquivo, *parametros, prefixo))
+            for arquivo, prefixo in zip(args.arquivos, prefixos_saida(args.arquivos))
+        ]
+        for arquivo, futuro in futuros:
+            try:
+                for caminho in futuro.result():
+                    print(caminho)
+            except Exception as e:
+                falhas += 1
+                print(f"Erro ao processar '{arquivo}': {e}", file=sys.stderr)
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
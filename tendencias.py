@@ -0,0 +1,103 @@
+import pandas as pd
+
+from memoizacao import CacheLRU
+from resultados import TendenciaRetencao
+
+# Granularidades dos rollups, da mais fina para a mais grossa
+GRANULARIDADES = ["Dia", "Semana", "Mês"]
+COLUNAS_ROLLUP = ["Retido", "Não Retido", "Desconsiderado"]
+INDICE_ROLLUP = ["Período", "Operação", "Login"]
+
+# Último rollup de cada seleção (planilha, usuários, grupos e período) com o fingerprint dos dados
+# de que saiu: quando a próxima versão vem de uma carga incremental, só os dias alterados e as
+# semanas e os meses deles são refeitos
+_rollups_anteriores = CacheLRU(16)
+
+
+# Primeiro dia do período de cada data: a própria data, a segunda-feira da semana ou o dia 1 do mês
+def inicio_periodo(datas, granularidade):
+    datas = pd.DatetimeIndex(datas).normalize()
+    if granularidade == "Semana":
+        return datas - pd.to_timedelta(datas.dayofweek, unit="D")
+    if granularidade == "Mês":
+        return datas.to_period("M").to_timestamp()
+    return datas
+
+
+# Contagens diárias por login (Retido, Não Retido e Não Retido desconsiderado) dos grupos no
+# período, só nos `dias` se dados. Saem das séries por login que o dataset monta na carga (e
+# atualiza junto com os cubos numa carga incremental), então nenhuma linha nem o cubo são
+# reagrupados aqui.
+def _rollup_diario(dataset, grupos, periodo, dias=None):
+    series = dataset.series_grupos(grupos, periodo, dias).rename(columns={"DataCriacao": "Período"})
+    return series.set_index(INDICE_ROLLUP)[COLUNAS_ROLLUP].sort_index()
+
+
+def _agregar(diario, granularidade):
+    if granularidade == "Dia":
+        return diario
+    periodos = inicio_periodo(diario.index.get_level_values("Período"), granularidade)
+    chaves = [periodos, diario.index.get_level_values("Operação"), diario.index.get_level_values("Login")]
+    agregado = diario.groupby(chaves, sort=True).sum()
+    agregado.index.names = INDICE_ROLLUP
+    return agregado
+
+
+# Rollups diário, semanal e mensal por login; os níveis semanal e mensal são somas do diário.
+# `periodos_refeitos` diz quantos períodos de cada nível foram agregados para montar este rollup.
+class RollupRetencao:
+    __slots__ = ("niveis", "periodos_refeitos")
+
+    def __init__(self, niveis, periodos_refeitos):
+        self.niveis = niveis
+        self.periodos_refeitos = periodos_refeitos
+
+    # Rollup da próxima versão dos dados: `dias` são os dias alterados e `diario_dias` as contagens
+    # novas deles. Esses dias são trocados no nível diário, e só as semanas e os meses que os
+    # contêm são reagregados; os outros períodos vêm deste rollup.
+    def atualizar(self, diario_dias, dias):
+        dias = pd.DatetimeIndex(dias)
+        anterior = self.niveis["Dia"]
+        mantidos = anterior[~anterior.index.get_level_values("Período").isin(dias)]
+        diario = pd.concat([mantidos, diario_dias]).sort_index()
+        niveis, refeitos = {"Dia": diario}, {"Dia": len(dias)}
+        dias_diario = diario.index.unique("Período")
+        for granularidade in GRANULARIDADES[1:]:
+            baldes = inicio_periodo(dias, granularidade).unique()
+            anterior = self.niveis[granularidade]
+            mantidos = anterior[~anterior.index.get_level_values("Período").isin(baldes)]
+            dias_baldes = dias_diario[inicio_periodo(dias_diario, granularidade).isin(baldes)]
+            afetados = diario[diario.index.get_level_values("Período").isin(dias_baldes)]
+            niveis[granularidade] = pd.concat([mantidos, _agregar(afetados, granularidade)]).sort_index()
+            refeitos[granularidade] = len(baldes)
+        return RollupRetencao(niveis, refeitos)
+
+    def tendencia(self, granularidade):
+        return TendenciaRetencao(granularidade, self.niveis[granularidade])
+
+
+def montar_rollup(diario):
+    niveis = {granularidade: _agregar(diario, granularidade) for granularidade in GRANULARIDADES}
+    return RollupRetencao(niveis, {granularidade: len(nivel.index.unique("Período")) for granularidade, nivel in niveis.items()})
+
+
+# Rollup dos grupos no período. Se o dataset veio de uma carga incremental sobre a versão do último
+# rollup da mesma seleção (ver DatasetCompartilhado.dias_alterados), ele é atualizado em vez de
+# refeito.
+def apurar_rollup(dataset, grupos, periodo=(None, None)):
+    chave = (dataset.file_path, dataset.usuarios, tuple(sorted(grupos)), tuple(periodo))
+    anterior = _rollups_anteriores.consultar(chave)
+    if anterior is not None and anterior[0] == dataset.fingerprint:
+        return anterior[1]
+    if anterior is not None and dataset.dias_alterados is not None and anterior[0] == dataset.dias_alterados[0]:
+        dias = pd.DatetimeIndex(dataset.dias_alterados[1])
+        inicio, fim = periodo
+        if inicio is not None:
+            dias = dias[dias >= pd.Timestamp(inicio)]
+        if fim is not None:
+            dias = dias[dias <= pd.Timestamp(fim)]
+        rollup = anterior[1].atualizar(_rollup_diario(dataset, grupos, periodo, dias), dias)
+    else:
+        rollup = montar_rollup(_rollup_diario(dataset, grupos, periodo))
+    _rollups_anteriores.guardar(chave, (dataset.fingerprint, rollup))
+    return rollup
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Os módulos do painel ficam na raiz do repositório
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
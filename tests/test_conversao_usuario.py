@@ -0,0 +1,85 @@
+# Regressão da tabela de conversão por usuário: a versão vetorizada tem de dar,
+# célula a célula, o mesmo resultado do laço original do painel, guardado abaixo sem alterações
+import os
+
+import pandas as pd
+import pytest
+
+from analise import (
+    DEFAULT_USUARIOS_BACKUP, DEFAULT_USUARIOS_OFICIAIS, DEFAULT_USUARIOS_STAFF, EXCEL_FILE_PATH,
+    calcular_conversao_por_usuario, process_data,
+)
+from conftest import RAIZ
+
+
+# Cópia congelada de calcular_conversao_por_usuario antes da vetorização
+def conversao_por_usuario_original(df_filtrado):
+    agrupado_usuario_dia_status = df_filtrado.groupby(["Operação", "Login", "DataCriacao", "Status"]).size().unstack(fill_value=0)
+    unique_operacoes_logins = df_filtrado[["Operação", "Login"]].drop_duplicates().sort_values(by=["Operação", "Login"]).values
+    all_dates_conversao = sorted(df_filtrado["DataCriacao"].unique())
+    date_headers_conversao = [d.strftime("%d-%b").lower() for d in all_dates_conversao]
+    colunas_conversao = ["Operação", "Login"] + date_headers_conversao + ["Consolidado"]
+    data_for_display_export = []
+
+    for operacao, login in unique_operacoes_logins:
+        user_row_values = [operacao, login]
+        user_data_for_conversion = agrupado_usuario_dia_status.loc[(operacao, login), :] if (operacao, login) in agrupado_usuario_dia_status.index else pd.DataFrame(columns=['Retido', 'Não Retido'])
+
+        total_retido_user = user_data_for_conversion.get("Retido", pd.Series([0])).sum()
+        total_nao_retido_user = user_data_for_conversion.get("Não Retido", pd.Series([0])).sum()
+
+        for d in all_dates_conversao:
+            retido_day = user_data_for_conversion.loc[d, "Retido"] if d in user_data_for_conversion.index and "Retido" in user_data_for_conversion.columns else 0
+            nao_retido_day = user_data_for_conversion.loc[d, "Não Retido"] if d in user_data_for_conversion.index and "Não Retido" in user_data_for_conversion.columns else 0
+
+            denominador_day = retido_day + nao_retido_day
+            if denominador_day > 0:
+                percent_day = (retido_day / denominador_day) * 100
+                user_row_values.append(f"{percent_day:.2f}%")
+            else:
+                user_row_values.append("-")
+
+        denominador_consolidado_user = total_retido_user + total_nao_retido_user
+        if denominador_consolidado_user > 0:
+            consolidado_percent_user = (total_retido_user / denominador_consolidado_user) * 100
+            user_row_values.append(f"{consolidado_percent_user:.2f}%")
+        else:
+            user_row_values.append("-")
+
+        data_for_display_export.append(user_row_values)
+
+    df_conversao = pd.DataFrame(data_for_display_export, columns=colunas_conversao)
+    return df_conversao
+
+
+@pytest.fixture(scope="module")
+def df_planilha():
+    caminho = os.path.join(RAIZ, EXCEL_FILE_PATH)
+    if not os.path.exists(caminho):
+        pytest.skip("planilha de exemplo ausente")
+    return process_data(pd.read_excel(caminho), DEFAULT_USUARIOS_OFICIAIS, DEFAULT_USUARIOS_BACKUP, DEFAULT_USUARIOS_STAFF)
+
+
+# O laço original recebia as colunas como texto, não como categóricas
+def _como_texto(df):
+    return df.astype({coluna: str for coluna in df.columns if isinstance(df[coluna].dtype, pd.CategoricalDtype)})
+
+
+SUBCONJUNTOS = {
+    "planilha": lambda df: df,
+    "so_retido": lambda df: df[df["Status"] == "Retido"],
+    "so_nao_retido": lambda df: df[df["Status"] == "Não Retido"],
+    "um_login": lambda df: df[df["Login"] == df["Login"].value_counts().index[0]],
+}
+
+
+@pytest.mark.parametrize("subconjunto", SUBCONJUNTOS)
+def test_conversao_por_usuario_igual_ao_laco_original(df_planilha, subconjunto):
+    df = SUBCONJUNTOS[subconjunto](df_planilha)
+    assert not df.empty
+
+    atual = calcular_conversao_por_usuario(df)
+    esperado = conversao_por_usuario_original(_como_texto(df))
+
+    assert list(atual.columns) == list(esperado.columns)
+    assert atual.astype(str).values.tolist() == esperado.astype(str).values.tolist()
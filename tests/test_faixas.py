@@ -0,0 +1,49 @@
+# Regressão da busca de faixas: a versão vetorizada tem de escolher, como o laço original do
+# painel, a primeira faixa da lista que contém a taxa (inclusive com faixas sobrepostas)
+import numpy as np
+import pytest
+
+from faixas import FAIXA_AUSENTE, TabelaFaixas, localizar_em_lote
+
+
+# Cópia congelada da busca de _get_value_for_conversion_rate antes da vetorização (só o valor)
+def valor_original(conversion_rate, retention_bands):
+    conversion_rate_decimal = conversion_rate / 100.0
+    for lower, upper, value in retention_bands:
+        if lower <= conversion_rate_decimal <= (upper + 1e-9):
+            return value
+    return 0.00
+
+
+CENARIOS = [
+    [(0.00, 0.55, 27.59), (0.5501, 0.59, 31.58), (0.5901, 0.65, 36.12), (0.6501, 1.00, 41.54)],
+    [(0.0, 1.0, 10.0), (0.5, 0.6, 20.0)],
+    [(0.5, 0.6, 20.0), (0.0, 1.0, 10.0)],
+    [(0.0, 0.55, 1.0), (0.55, 0.7, 2.0), (0.6, 1.0, 3.0)],
+    [(0.7, 1.0, 4.0), (0.0, 0.3, 5.0)],
+    [],
+]
+TAXAS = np.concatenate([np.linspace(0, 100, 2001), [55.0, 55.005, 59.0, 65.0, 65.01, 70.0, 100.0]])
+
+
+def test_faixa_sobreposta_primeira_da_lista():
+    valores, nomes = TabelaFaixas([(0.0, 1.0, 10.0), (0.5, 0.6, 20.0)]).localizar([70.0, 55.0])
+    assert list(valores) == [10.0, 10.0]
+    assert list(nomes) == ["0,00% a Acima", "0,00% a Acima"]
+
+
+@pytest.mark.parametrize("faixas", CENARIOS)
+def test_igual_ao_laco_original(faixas):
+    valores, nomes = TabelaFaixas(faixas).localizar(TAXAS)
+    esperado = [valor_original(taxa, faixas) for taxa in TAXAS]
+    assert list(valores) == esperado
+    assert all((nome == FAIXA_AUSENTE) == (valor == 0.0) for nome, valor in zip(nomes, esperado))
+
+
+def test_lote_igual_a_cada_cenario():
+    tabelas = [TabelaFaixas(faixas) for faixas in CENARIOS]
+    valores, nomes = localizar_em_lote(tabelas, TAXAS)
+    for c, tabela in enumerate(tabelas):
+        sozinho_valores, sozinho_nomes = tabela.localizar(TAXAS)
+        assert list(valores[c]) == list(sozinho_valores)
+        assert list(nomes[c]) == list(sozinho_nomes)
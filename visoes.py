@@ -0,0 +1,80 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+# Contagens diárias guardadas por combinação de grupos, nesta ordem
+CONTAGENS_VISAO = ["Linhas", "Retido", "Não Retido", "Desconsiderado"]
+
+
+# Contagens diárias (linhas, retidos, não retidos e não retidos desconsiderados) de um cubo,
+# alinhadas a `datas`
+def _contagens_diarias(cubo, datas):
+    contagens = cubo.contagens
+    quantidade = contagens["Quantidade"].to_numpy()
+    nao_retido = (contagens["Status"] == "Não Retido").to_numpy()
+    colunas = np.stack([
+        quantidade,
+        np.where((contagens["Status"] == "Retido").to_numpy(), quantidade, 0),
+        np.where(nao_retido, quantidade, 0),
+        np.where(nao_retido & contagens["Desconsiderado"].to_numpy(), quantidade, 0),
+    ])
+    posicoes = datas.get_indexer(contagens["DataCriacao"])
+    diarias = np.zeros((len(CONTAGENS_VISAO), len(datas)), dtype=np.int64)
+    for i, coluna in enumerate(colunas):
+        np.add.at(diarias[i], posicoes, coluna)
+    return diarias
+
+
+# Visões materializadas do resumo: as contagens diárias de cada uma das combinações não vazias de
+# grupos (no máximo 15 com os quatro grupos), montadas na carga somando as contagens dos cubos
+# parciais. Cada combinação é a de uma combinação menor mais um grupo, então o custo total é uma
+# soma de vetores por combinação. Qualquer seleção de grupos e período vira uma consulta ao
+# dicionário e um recorte nas datas.
+class VisoesGrupos:
+    __slots__ = ("datas", "contagens")
+
+    def __init__(self, cubos_por_grupo):
+        cubos = {grupo: cubo for grupo, cubo in cubos_por_grupo.items() if not cubo.empty}
+        datas = pd.DatetimeIndex(sorted(set().union(*(cubo.contagens["DataCriacao"].unique() for cubo in cubos.values()))))
+        por_grupo = {grupo: _contagens_diarias(cubo, datas) for grupo, cubo in cubos.items()}
+
+        contagens = {}
+        grupos = sorted(por_grupo)
+        for tamanho in range(1, len(grupos) + 1):
+            for combinacao in itertools.combinations(grupos, tamanho):
+                anterior = contagens.get(frozenset(combinacao[:-1]))
+                ultimo = por_grupo[combinacao[-1]]
+                contagens[frozenset(combinacao)] = ultimo if anterior is None else anterior + ultimo
+        self.datas = datas
+        self.contagens = contagens
+
+    @property
+    def combinacoes(self):
+        return list(self.contagens)
+
+    # Chave da seleção: só os grupos que têm linhas
+    def chave(self, grupos):
+        return frozenset(grupos) & frozenset().union(*self.contagens) if self.contagens else frozenset()
+
+    # (datas, retido, não retido, não retido desconsiderado) por dia da seleção, só com os dias
+    # que têm linhas, entre `inicio` e `fim` (inclusive; None = sem limite)
+    def consultar(self, grupos, inicio=None, fim=None):
+        contagens = self.contagens.get(self.chave(grupos))
+        if contagens is None:
+            contagens = np.zeros((len(CONTAGENS_VISAO), len(self.datas)), dtype=np.int64)
+        de = 0 if inicio is None else self.datas.searchsorted(pd.Timestamp(inicio), side="left")
+        ate = len(self.datas) if fim is None else self.datas.searchsorted(pd.Timestamp(fim), side="right")
+        contagens = contagens[:, de:ate]
+        com_linhas = contagens[0] > 0
+        datas = self.datas[de:ate][com_linhas]
+        linhas, retido, nao_retido, desconsiderado = contagens[:, com_linhas]
+        indice = pd.Index(list(datas))
+        return (
+            list(datas), pd.Series(retido, index=indice), pd.Series(nao_retido, index=indice),
+            pd.Series(desconsiderado, index=indice),
+        )
+
+    @property
+    def memoria_bytes(self):
+        return sum(contagens.nbytes for contagens in self.contagens.values())